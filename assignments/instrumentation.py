@@ -0,0 +1,319 @@
+"""
+Opt-in call metrics for the public functions of the fb_post and movies assignment utils.
+
+With UTIL_INSTRUMENTATION on, the apps' ready() replaces every public function of their assignment_*_utils
+modules with a wrapper that records, per call, the wall time, the number of SQL queries, the rows fetched and
+the time spent in SQL. With it off nothing is wrapped, so the functions run exactly as written. The
+raise_exception_if_* validators are left alone: they run inside the utils that call them, which record them. A
+util that returns a generator is recorded once the generator is exhausted, closed or fails, with the queries it
+runs while being iterated; its wall time includes what the caller does between items.
+
+Calls are counted into per-minute windows of fixed-bucket histograms, of which the last
+UTIL_INSTRUMENTATION_WINDOWS are kept. Every process writes its windows to a JSON file of its own in
+UTIL_INSTRUMENTATION_DIRECTORY at most every UTIL_INSTRUMENTATION_FLUSH_SECONDS and when it exits;
+`python manage.py dump_util_metrics` merges the files.
+
+Queries are counted on the default database. A util calling another util of its own module records the full
+cost of the call, that of the inner util included; utils imported from other modules were bound before the
+wrapping and are not recorded separately.
+"""
+import atexit
+import importlib
+import inspect
+import json
+import os
+import pkgutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.db import connection
+
+WINDOW_SECONDS = 60
+# metric: upper bounds of its histogram buckets, the last bucket takes everything above
+HISTOGRAM_BUCKETS = {
+    "wall_ms": (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000),
+    "sql_ms": (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000),
+    "queries": (0, 1, 2, 3, 4, 5, 10, 20, 50, 100, 200, 500, 1000),
+    "rows": (0, 1, 10, 100, 1000, 10000, 100000, 1000000),
+}
+
+active_recordings = ContextVar("active_recordings", default=())
+windows = {}
+windows_lock = threading.Lock()
+last_flushed_at = time.monotonic()
+
+
+class CallRecording:
+    __slots__ = ("queries", "rows", "sql_seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.rows = 0
+        self.sql_seconds = 0.0
+
+
+def is_instrumentation_enabled():
+    return getattr(settings, "UTIL_INSTRUMENTATION", False)
+
+
+def get_metrics_directory():
+    return getattr(settings, "UTIL_INSTRUMENTATION_DIRECTORY",
+                   os.path.join(tempfile.gettempdir(), "assignments-util-metrics"))
+
+
+# region Recording
+
+def count_fetched_rows(rows):
+    for recording in active_recordings.get():
+        recording.rows += rows
+
+
+def count_rows_fetched_from(cursor):
+    # Rows are fetched after execute() has returned, so the cursor's fetch methods are wrapped once per cursor
+    if cursor.__dict__.get("counts_fetched_rows"):
+        return
+    fetchone, fetchmany, fetchall = cursor.fetchone, cursor.fetchmany, cursor.fetchall
+
+    def counted_fetchone():
+        row = fetchone()
+        if row is not None:
+            count_fetched_rows(1)
+        return row
+
+    def counted_fetchmany(*args, **kwargs):
+        rows = fetchmany(*args, **kwargs)
+        count_fetched_rows(len(rows))
+        return rows
+
+    def counted_fetchall():
+        rows = fetchall()
+        count_fetched_rows(len(rows))
+        return rows
+
+    cursor.fetchone, cursor.fetchmany, cursor.fetchall = counted_fetchone, counted_fetchmany, counted_fetchall
+    cursor.counts_fetched_rows = True
+
+
+def record_query(execute, sql, params, many, context):
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        sql_seconds = time.perf_counter() - started
+        for recording in active_recordings.get():
+            recording.queries += 1
+            recording.sql_seconds += sql_seconds
+        try:
+            count_rows_fetched_from(context["cursor"].cursor)
+        except (AttributeError, TypeError):
+            # Cursors of C extension types take no new attributes; their rows go uncounted
+            pass
+
+
+def get_bucket_index(metric, value):
+    for index, upper_bound in enumerate(HISTOGRAM_BUCKETS[metric]):
+        if value <= upper_bound:
+            return index
+    return len(HISTOGRAM_BUCKETS[metric])
+
+
+def get_empty_function_metrics():
+    metrics = {"calls": 0, "errors": 0}
+    for metric, upper_bounds in HISTOGRAM_BUCKETS.items():
+        metrics[metric] = {"sum": 0, "max": 0, "buckets": [0] * (len(upper_bounds) + 1)}
+    return metrics
+
+
+def record_call(function_name, values, failed):
+    window_start = int(time.time()) // WINDOW_SECONDS * WINDOW_SECONDS
+    with windows_lock:
+        window = windows.setdefault(window_start, {})
+        function_metrics = window.get(function_name)
+        if function_metrics is None:
+            function_metrics = window[function_name] = get_empty_function_metrics()
+
+        function_metrics["calls"] += 1
+        function_metrics["errors"] += failed
+        for metric, value in values.items():
+            histogram = function_metrics[metric]
+            histogram["sum"] += value
+            histogram["max"] = max(histogram["max"], value)
+            histogram["buckets"][get_bucket_index(metric, value)] += 1
+
+        kept_windows = getattr(settings, "UTIL_INSTRUMENTATION_WINDOWS", 60)
+        for expired_window_start in sorted(windows)[:-kept_windows]:
+            del windows[expired_window_start]
+
+    if time.monotonic() - last_flushed_at >= getattr(settings, "UTIL_INSTRUMENTATION_FLUSH_SECONDS", 10):
+        flush_metrics()
+
+
+@contextmanager
+def recording_queries(recording):
+    outer_recordings = active_recordings.get()
+    token = active_recordings.set(outer_recordings + (recording,))
+    try:
+        if outer_recordings:
+            yield
+        else:
+            with connection.execute_wrapper(record_query):
+                yield
+    finally:
+        active_recordings.reset(token)
+
+
+def record_recording(function_name, recording, started, failed):
+    wall_seconds = time.perf_counter() - started
+    record_call(function_name, {"wall_ms": wall_seconds * 1000, "sql_ms": recording.sql_seconds * 1000,
+                                "queries": recording.queries, "rows": recording.rows}, failed)
+
+
+def iterate_recorded(generator, function_name, recording, started):
+    failed = True
+    try:
+        while True:
+            with recording_queries(recording):
+                try:
+                    item = next(generator)
+                except StopIteration:
+                    failed = False
+                    return
+            try:
+                yield item
+            except GeneratorExit:
+                failed = False  # the caller stopped early
+                raise
+    finally:
+        generator.close()
+        record_recording(function_name, recording, started, failed)
+
+
+def instrument(function, function_name):
+    @wraps(function)
+    def instrumented(*args, **kwargs):
+        recording = CallRecording()
+        started = time.perf_counter()
+        try:
+            with recording_queries(recording):
+                result = function(*args, **kwargs)
+        except BaseException:
+            record_recording(function_name, recording, started, True)
+            raise
+
+        if inspect.isgenerator(result):
+            return iterate_recorded(result, function_name, recording, started)
+        record_recording(function_name, recording, started, False)
+        return result
+
+    instrumented.instrumented_function = function
+    return instrumented
+
+
+def is_instrumented_util(module, name, function):
+    return not name.startswith("_") and not name.startswith("raise_exception_if_") \
+        and inspect.isfunction(function) and function.__module__ == module.__name__ \
+        and not hasattr(function, "instrumented_function")
+
+
+def instrument_utils(package_name):
+    """Wraps the public functions, validators aside, of every assignment_*_utils module of `package_name`."""
+    package = importlib.import_module(package_name)
+    for module_info in pkgutil.iter_modules(package.__path__):
+        if not (module_info.name.startswith("assignment_") and module_info.name.endswith("_utils")):
+            continue
+        module = importlib.import_module("{}.{}".format(package_name, module_info.name))
+        for name, function in list(vars(module).items()):
+            if is_instrumented_util(module, name, function):
+                setattr(module, name, instrument(function, "{}.{}".format(module.__name__, name)))
+
+
+# endregion
+
+
+# region Export
+
+def get_metrics_path(directory, pid):
+    return os.path.join(directory, "{}.json".format(pid))
+
+
+def flush_metrics():
+    global last_flushed_at
+    last_flushed_at = time.monotonic()
+    with windows_lock:
+        snapshot = json.dumps({str(window_start): window for window_start, window in windows.items()})
+
+    directory = get_metrics_directory()
+    os.makedirs(directory, exist_ok=True)
+    path = get_metrics_path(directory, os.getpid())
+    # Written aside and renamed, so readers never see half a file
+    with open(path + ".tmp", "w") as metrics_file:
+        metrics_file.write(snapshot)
+    os.replace(path + ".tmp", path)
+
+
+def flush_metrics_at_exit():
+    if windows:
+        flush_metrics()
+
+
+atexit.register(flush_metrics_at_exit)
+
+
+def merge_function_metrics(merged_metrics, function_metrics):
+    merged_metrics["calls"] += function_metrics["calls"]
+    merged_metrics["errors"] += function_metrics["errors"]
+    for metric in HISTOGRAM_BUCKETS:
+        merged_histogram, histogram = merged_metrics[metric], function_metrics[metric]
+        merged_histogram["sum"] += histogram["sum"]
+        merged_histogram["max"] = max(merged_histogram["max"], histogram["max"])
+        merged_histogram["buckets"] = [merged_count + count for merged_count, count
+                                       in zip(merged_histogram["buckets"], histogram["buckets"])]
+
+
+def load_metrics(since, directory=None):
+    """Metrics per function of every process, merged over the windows that started at or after `since`."""
+    directory = directory or get_metrics_directory()
+    merged = {}
+    paths = [] if not os.path.isdir(directory) else \
+        [os.path.join(directory, name) for name in os.listdir(directory) if name.endswith(".json")]
+    for path in paths:
+        with open(path) as metrics_file:
+            process_windows = json.load(metrics_file)
+        for window_start, window in process_windows.items():
+            if int(window_start) < since:
+                continue
+            for function_name, function_metrics in window.items():
+                merge_function_metrics(merged.setdefault(function_name, get_empty_function_metrics()),
+                                       function_metrics)
+    return merged
+
+
+def get_percentile(metric, histogram, percentile):
+    """Upper bound of the bucket holding the percentile; the maximum seen for the open last bucket."""
+    total = sum(histogram["buckets"])
+    if total == 0:
+        return 0
+    seen = 0
+    for index, count in enumerate(histogram["buckets"]):
+        seen += count
+        if seen >= total * percentile / 100:
+            upper_bounds = HISTOGRAM_BUCKETS[metric]
+            return min(upper_bounds[index], histogram["max"]) if index < len(upper_bounds) else histogram["max"]
+    return histogram["max"]
+
+
+def reset_metrics(directory=None):
+    with windows_lock:
+        windows.clear()
+    directory = directory or get_metrics_directory()
+    if os.path.isdir(directory):
+        for name in os.listdir(directory):
+            if name.endswith(".json"):
+                os.remove(os.path.join(directory, name))
+
+# endregion
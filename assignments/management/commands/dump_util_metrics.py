@@ -0,0 +1,35 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+
+from assignments.instrumentation import get_percentile, load_metrics
+
+
+class Command(BaseCommand):
+    help = "Prints the call metrics of the fb_post and movies assignment utils recorded with UTIL_INSTRUMENTATION on"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--minutes", type=int, default=60, help="only count calls of the last this many minutes")
+        parser.add_argument("--directory", help="metrics directory (default: UTIL_INSTRUMENTATION_DIRECTORY)")
+        parser.add_argument("--json", action="store_true", help="print the merged histograms as JSON")
+
+    def handle(self, *args, **options):
+        metrics = load_metrics(time.time() - options["minutes"] * 60, options["directory"])
+        if options["json"]:
+            self.stdout.write(json.dumps(metrics, indent=2, sort_keys=True))
+            return
+        if not metrics:
+            self.stdout.write("No calls recorded")
+            return
+
+        width = max(len(function_name) for function_name in metrics)
+        self.stdout.write("{:<{}} {:>7} {:>6} {:>9} {:>9} {:>9} {:>9} {:>9} {:>9}".format(
+            "function", width, "calls", "errors", "p50 ms", "p95 ms", "p99 ms", "queries", "rows", "sql ms"))
+        by_total_time = sorted(metrics.items(), key=lambda item: item[1]["wall_ms"]["sum"], reverse=True)
+        for function_name, function_metrics in by_total_time:
+            calls = function_metrics["calls"]
+            self.stdout.write("{:<{}} {:>7} {:>6} {:>9.2f} {:>9.2f} {:>9.2f} {:>9.1f} {:>9.1f} {:>9.2f}".format(
+                function_name, width, calls, function_metrics["errors"],
+                *(get_percentile("wall_ms", function_metrics["wall_ms"], percentile) for percentile in (50, 95, 99)),
+                *(function_metrics[metric]["sum"] / calls for metric in ("queries", "rows", "sql_ms"))))
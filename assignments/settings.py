@@ -33,6 +33,8 @@ ALLOWED_HOSTS = []
 INSTALLED_APPS = [
     'movies.apps.MoviesConfig',
     'fb_post.apps.FbPostConfig',
+    # For the project-wide management commands, such as dump_util_metrics
+    'assignments',
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -49,6 +51,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'fb_post.validation_cache.ValidationScopeMiddleware',
 ]
 
 ROOT_URLCONF = 'assignments.urls'
@@ -79,6 +82,11 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # A file rather than the default shared-cache in-memory database, so tests that write from several
+        # threads wait on SQLite's busy timeout instead of failing with "database table is locked"
+        'TEST': {
+            'NAME': os.path.join(BASE_DIR, 'test_db.sqlite3'),
+        },
     }
 }
 
@@ -120,3 +128,38 @@ USE_TZ = False
 # https://docs.djangoproject.com/en/3.0/howto/static-files/
 
 STATIC_URL = '/static/'
+
+
+# Record wall time, SQL queries, rows fetched and SQL time of every call to the public functions of the fb_post
+# and movies assignment utils, see assignments/instrumentation.py. Dump the metrics with
+# `python manage.py dump_util_metrics`. Off, the functions are left unwrapped and cost nothing extra.
+UTIL_INSTRUMENTATION = False
+UTIL_INSTRUMENTATION_WINDOWS = 60
+UTIL_INSTRUMENTATION_FLUSH_SECONDS = 10
+
+
+# fb_post
+
+# Serve group feeds from pre-rendered GroupFeedEntry rows kept up to date by the write paths. Posts written while
+# it was off have no entries, so run `python manage.py rebuild_group_feed` after switching it on: until then only
+# groups without any entry fall back to the live query, and a group with new posts shows just those.
+FB_POST_MATERIALIZED_GROUP_FEED = False
+
+# Rendered post details are cached per post version in an in-process LRU of this many posts and, when
+# FB_POST_DETAILS_CACHE names a cache alias, in that cache too so that every process shares them.
+FB_POST_DETAILS_LRU_SIZE = 1000
+FB_POST_DETAILS_CACHE = None
+FB_POST_DETAILS_CACHE_TIMEOUT = 60 * 60
+
+# Threads that run the reads of fb_post.async_reads. With SQLite more than a couple only contend for the GIL;
+# against a database server more overlap more of its round trips.
+FB_POST_ASYNC_READ_THREADS = 2
+
+
+# movies
+
+# Cache alias for the catalog analytics of movies/assignment_4_utils.py. The local-memory default only suits a
+# single process; with several, point it at a cache they share (memcached, redis or the database cache) so that
+# a write in one process invalidates the analytics cached by all of them.
+MOVIES_ANALYTICS_CACHE = 'default'
+MOVIES_ANALYTICS_CACHE_TIMEOUT = 60 * 60 * 24
@@ -0,0 +1,24 @@
+"""
+Standalone benchmarks for the fb_post and movies apps.
+
+Run a module from the project root with `python -m benchmarks.<module> --help`. Every benchmark works against
+its own SQLite file, so db.sqlite3 is never touched.
+"""
+import os
+import tempfile
+
+import django
+
+
+def setup_django(database_path=None):
+    """Points the default database at `database_path` (a fresh temporary file by default) and sets Django up."""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'assignments.settings')
+
+    if database_path is None:
+        database_path = os.path.join(tempfile.mkdtemp(prefix="benchmarks-"), "benchmark.sqlite3")
+
+    from django.conf import settings
+    settings.DATABASES['default']['NAME'] = database_path
+    django.setup()
+
+    return database_path
@@ -0,0 +1,145 @@
+"""
+Throughput of the fb_post read APIs under many concurrent readers on one event loop, sync against async.
+
+    python -m benchmarks.fb_post_async --users 10000 --posts 20000 --readers 1000 --reads 5
+
+Every reader awaits --reads requests one after the other, alternating between a group feed page and a post. The
+paths compared are:
+
+    sync          the sync APIs through sync_to_async, as Django 3.0's ASGI handler runs sync views: every call
+                  queues for the one thread that serves sync code
+    async         the fb_post.async_reads APIs, spread over FB_POST_ASYNC_READ_THREADS threads (--threads)
+
+The shipped settings apply, so with CONN_MAX_AGE 0 every request of either path opens and closes its connection,
+as Django does at the start and end of a request. SQLite answers from inside the process, where the paths only
+compete for the GIL; --query-latency-ms adds a sleep to every query to stand in for the round trip to a database
+server, the wait that reads running side by side overlap.
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from . import setup_django
+from .generators import seed_social_graph
+from .suite import get_percentile
+
+FEED_PAGE_SIZE = 10
+
+
+def get_requests(number_of_requests, seed):
+    from fb_post.models import Membership, Post
+
+    random_generator = random.Random(seed)
+    memberships = list(Membership.objects.order_by('id').values_list('member_id', 'group_id'))
+    post_ids = list(Post.objects.order_by('id').values_list('id', flat=True))
+    requests = []
+    for index in range(number_of_requests):
+        if index % 2 == 0:
+            user_id, group_id = random_generator.choice(memberships)
+            requests.append(("get_group_feed", (user_id, group_id, 0, FEED_PAGE_SIZE)))
+        else:
+            requests.append(("get_post", (random_generator.choice(post_ids),)))
+    return requests
+
+
+def add_query_latency(latency_ms):
+    from django.db.backends.signals import connection_created
+
+    def sleep_before_query(execute, sql, params, many, context):
+        time.sleep(latency_ms / 1000)
+        return execute(sql, params, many, context)
+
+    # Every executor thread opens a connection of its own, and reconnects its wrapper after CONN_MAX_AGE
+    def add_to_connection(sender, connection, **kwargs):
+        if sleep_before_query not in connection.execute_wrappers:
+            connection.execute_wrappers.append(sleep_before_query)
+
+    connection_created.connect(add_to_connection, weak=False)
+
+
+def as_request(function):
+    from django.db import close_old_connections
+
+    # What the request_started and request_finished signals do around a view
+    def run_as_request(*args):
+        close_old_connections()
+        try:
+            return function(*args)
+        finally:
+            close_old_connections()
+
+    return run_as_request
+
+
+def get_paths():
+    from asgiref.sync import sync_to_async
+    from fb_post.assignment_6_utils import get_post
+    from fb_post.assignment_7_utils import get_group_feed
+    from fb_post.async_reads import get_group_feed_async, get_post_async
+
+    return {
+        "sync": {"get_group_feed": sync_to_async(as_request(get_group_feed)),
+                 "get_post": sync_to_async(as_request(get_post))},
+        "async": {"get_group_feed": get_group_feed_async, "get_post": get_post_async},
+    }
+
+
+async def run_readers(functions, requests, number_of_readers):
+    latencies = []
+
+    async def read(reader_requests):
+        for name, arguments in reader_requests:
+            started = time.perf_counter()
+            await functions[name](*arguments)
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(read(requests[reader::number_of_readers]) for reader in range(number_of_readers)))
+    return time.perf_counter() - started, sorted(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database", help="SQLite file to seed (default: a new temporary file)")
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--posts", type=int, default=20000)
+    parser.add_argument("--readers", type=int, default=1000, help="concurrent readers")
+    parser.add_argument("--reads", type=int, default=5, help="requests per reader")
+    parser.add_argument("--threads", type=int, help="FB_POST_ASYNC_READ_THREADS (default: the setting)")
+    parser.add_argument("--paths", nargs="+", choices=["sync", "async"], default=["sync", "async"])
+    parser.add_argument("--query-latency-ms", type=float, default=0, help="sleep added to every query")
+    parser.add_argument("--seed", type=int, default=0)
+    options = parser.parse_args()
+
+    database_path = setup_django(options.database)
+    from django.conf import settings
+    from django.core.management import call_command
+    from django.db import connection
+    from fb_post.post_cache import reset_post_details_cache
+
+    print("Seeding {}".format(database_path))
+    call_command('migrate', verbosity=0)
+    seed_social_graph(options.users, options.posts, seed=options.seed)
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE")
+
+    requests = get_requests(options.readers * options.reads, options.seed)
+    if options.query_latency_ms:
+        connection.close()
+        add_query_latency(options.query_latency_ms)
+    if options.threads:
+        # Read when fb_post.async_reads is first imported, by get_paths
+        settings.FB_POST_ASYNC_READ_THREADS = options.threads
+    paths = get_paths()
+    for path in options.paths:
+        # Every path starts from an empty post details cache, so they all render the same posts
+        reset_post_details_cache()
+        seconds, latencies = asyncio.run(run_readers(paths[path], requests, options.readers))
+        print("{:<12} {:>8.0f} requests/s  p50 {:9.1f} ms  p95 {:9.1f} ms  p99 {:9.1f} ms".format(
+            path, len(requests) / seconds, get_percentile(latencies, 50), get_percentile(latencies, 95),
+            get_percentile(latencies, 99)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+"""
+Query plans and lookup latency for the fb_post write-path lookups, before and after the composite/unique indexes
+of migration 0006_reaction_membership_constraints.
+
+    python -m benchmarks.fb_post_indexes --users 100000 --posts 500000 --comments 1000000 --reactions 2000000
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from . import setup_django
+
+BEFORE_MIGRATION = '0005_post_group_posted_at_index'
+AFTER_MIGRATION = '0006_reaction_membership_constraints'
+BATCH_SIZE = 50000
+
+
+def insert_rows(cursor, table, columns, rows):
+    sql = "INSERT INTO {} ({}) VALUES ({})".format(table, ", ".join(columns), ", ".join(["%s"] * len(columns)))
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == BATCH_SIZE:
+            cursor.executemany(sql, batch)
+            batch = []
+    if batch:
+        cursor.executemany(sql, batch)
+
+
+def seed(options):
+    from django.db import connection, transaction
+    from fb_post.constants import ReactionTypeEnum
+
+    users, groups, posts, comments, reactions = options.users, options.groups, options.posts, options.comments, \
+        options.reactions
+    started_at = datetime(2023, 1, 1)
+    reaction_types = [str(reaction_type) for reaction_type in ReactionTypeEnum]
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        insert_rows(cursor, "fb_post_user", ["id", "name", "profile_pic"],
+                    ((user_id, "User {}".format(user_id), "https://pics.example.com/{}.png".format(user_id))
+                     for user_id in range(1, users + 1)))
+        insert_rows(cursor, "fb_post_group", ["id", "name"],
+                    ((group_id, "Group {}".format(group_id)) for group_id in range(1, groups + 1)))
+        # Every user joins two consecutive groups, so (group, member) pairs never repeat
+        insert_rows(cursor, "fb_post_membership", ["group_id", "member_id", "is_admin"],
+                    ((((user_id + offset) % groups) + 1, user_id, offset == 0)
+                     for user_id in range(1, users + 1) for offset in (0, 1)))
+        insert_rows(cursor, "fb_post_post",
+                    ["id", "content", "posted_at", "posted_by_id", "group_id", "reaction_count", "comment_count"],
+                    ((post_id, "Post", started_at + timedelta(seconds=post_id), (post_id * 31) % users + 1,
+                      post_id % groups + 1, 0, 0)
+                     for post_id in range(1, posts + 1)))
+        # Every fifth comment replies to the comment before it on the same post
+        insert_rows(cursor, "fb_post_comment",
+                    ["id", "content", "commented_at", "commented_by_id", "post_id", "parent_comment_id",
+                     "reaction_count", "reply_count"],
+                    ((comment_id, "Comment", started_at + timedelta(seconds=comment_id), (comment_id * 17) % users + 1,
+                      (comment_id // 5) % posts + 1, comment_id - 1 if comment_id % 5 == 4 else None, 0, 0)
+                     for comment_id in range(1, comments + 1)))
+        # Reaction i goes to post i % posts from a user that is unique for that post
+        insert_rows(cursor, "fb_post_reaction", ["reaction_type", "post_id", "reacted_at", "reacted_by_id"],
+                    ((reaction_types[index % len(reaction_types)], index % posts + 1,
+                      started_at + timedelta(seconds=index), (index // posts + (index % posts) * 7919) % users + 1)
+                     for index in range(reactions)))
+        insert_rows(cursor, "fb_post_reaction", ["reaction_type", "comment_id", "reacted_at", "reacted_by_id"],
+                    ((reaction_types[index % len(reaction_types)], index % comments + 1,
+                      started_at + timedelta(seconds=index),
+                      (index // comments + (index % comments) * 104729) % users + 1)
+                     for index in range(reactions // 2)))
+
+
+def get_lookups(options):
+    from django.db.models import Count
+    from fb_post.models import Comment, Membership, Post, Reaction
+
+    random_generator = random.Random(options.seed)
+
+    # Only the id is selected: the lookups also run at BEFORE_MIGRATION, whose tables lack columns the current
+    # models have
+    def random_id(upper_bound):
+        return random_generator.randint(1, upper_bound)
+
+    return [
+        ("reaction by user on post",
+         lambda: Reaction.objects.filter(reacted_by_id=random_id(options.users), post_id=random_id(options.posts))
+         .values('id')),
+        ("reaction by user on comment",
+         lambda: Reaction.objects.filter(reacted_by_id=random_id(options.users),
+                                         comment_id=random_id(options.comments)).values('id')),
+        ("membership of user in group",
+         lambda: Membership.objects.filter(group_id=random_id(options.groups), member_id=random_id(options.users))
+         .values('id')),
+        ("replies to comment",
+         lambda: Comment.objects.filter(parent_comment_id=random_id(options.comments)).values('id')),
+        ("posts by user, newest first",
+         lambda: Post.objects.filter(posted_by_id=random_id(options.users)).order_by('-posted_at', '-id')
+         .values('id')),
+        ("reaction metrics of post",
+         lambda: Reaction.objects.filter(post_id=random_id(options.posts)).values('reaction_type')
+         .annotate(count=Count('id'))),
+    ]
+
+
+def measure(options):
+    results = {}
+    for name, build_queryset in get_lookups(options):
+        plan = build_queryset().explain()
+
+        started = time.perf_counter()
+        for _ in range(options.lookups):
+            list(build_queryset())
+        mean_ms = (time.perf_counter() - started) * 1000 / options.lookups
+
+        results[name] = (plan, mean_ms)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database", help="SQLite file to seed (default: a new temporary file)")
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--groups", type=int, default=1000)
+    parser.add_argument("--posts", type=int, default=500000)
+    parser.add_argument("--comments", type=int, default=1000000)
+    parser.add_argument("--reactions", type=int, default=2000000)
+    parser.add_argument("--lookups", type=int, default=1000, help="timed lookups per access pattern")
+    parser.add_argument("--seed", type=int, default=0)
+    options = parser.parse_args()
+
+    database_path = setup_django(options.database)
+    from django.core.management import call_command
+
+    print("Seeding {}".format(database_path))
+    call_command('migrate', 'fb_post', BEFORE_MIGRATION, verbosity=0)
+    seed(options)
+    before = measure(options)
+
+    print("Applying {}".format(AFTER_MIGRATION))
+    call_command('migrate', 'fb_post', AFTER_MIGRATION, verbosity=0)
+    after = measure(options)
+
+    for name in before:
+        print("\n== {} ==".format(name))
+        print("before ({:.3f} ms): {}".format(before[name][1], before[name][0]))
+        print("after  ({:.3f} ms): {}".format(after[name][1], after[name][0]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""
+Event replay throughput of fb_post.reactions.react_bulk.
+
+    python -m benchmarks.fb_post_reactions --users 10000 --posts 20000 --events 100000 --batch-size 10000
+
+The events go to the posts and comments of a seeded social graph, skewed towards a few hot ones, so that a share of
+them toggles or switches reactions that already exist or that earlier events of the replay added. After the replay
+the reaction counters and hourly rollups are compared with what `rebuild_counters` recomputes from the rows.
+"""
+import argparse
+import random
+import time
+from datetime import timedelta
+from io import StringIO
+
+from . import setup_django
+from .generators import STARTED_AT, get_shuffled_ids, get_skewed_index, seed_social_graph
+
+COMMENT_EVENT_SHARE = 0.3
+
+
+def generate_events(number_of_events, social_graph, seed):
+    from fb_post.constants import ReactionTargetEnum, ReactionTypeEnum
+
+    random_generator = random.Random(seed)
+    reaction_types = list(ReactionTypeEnum)
+    posts_by_heat = get_shuffled_ids(random_generator, social_graph["posts"])
+    comments_by_heat = get_shuffled_ids(random_generator, social_graph["comments"])
+    for index in range(number_of_events):
+        if random_generator.random() < COMMENT_EVENT_SHARE:
+            target = (ReactionTargetEnum.COMMENT, comments_by_heat[get_skewed_index(random_generator,
+                                                                                   len(comments_by_heat))])
+        else:
+            target = (ReactionTargetEnum.POST, posts_by_heat[get_skewed_index(random_generator, len(posts_by_heat))])
+        # Three reaction types only, so a repeated (user, target) pair often toggles the reaction off
+        yield (random_generator.randint(1, social_graph["users"]), target, random_generator.choice(reaction_types[:3]),
+               STARTED_AT + timedelta(days=400, seconds=index))
+
+
+def get_counters():
+    from fb_post.models import Comment, Post, ReactionRollup
+
+    return (list(Post.objects.order_by('id').values_list('id', 'reaction_count')),
+            list(Comment.objects.order_by('id').values_list('id', 'reaction_count')),
+            list(ReactionRollup.objects.filter(count__gt=0)
+                 .order_by('post_id', 'comment_id', 'reaction_type', 'hour')
+                 .values_list('post_id', 'comment_id', 'reaction_type', 'hour', 'count')))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database", help="SQLite file to seed (default: a new temporary file)")
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--posts", type=int, default=20000)
+    parser.add_argument("--events", type=int, default=100000)
+    parser.add_argument("--batch-size", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=0)
+    options = parser.parse_args()
+
+    database_path = setup_django(options.database)
+    from django.core.management import call_command
+    from django.db import connection
+    from fb_post.reactions import react_bulk
+
+    print("Seeding {}".format(database_path))
+    call_command('migrate', verbosity=0)
+    social_graph = seed_social_graph(options.users, options.posts, seed=options.seed)
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE")
+
+    events = list(generate_events(options.events, social_graph, options.seed))
+    started = time.perf_counter()
+    react_bulk(events, batch_size=options.batch_size)
+    seconds = time.perf_counter() - started
+    print("{} events in {:.2f} s, {:.0f} events/s".format(options.events, seconds, options.events / seconds))
+
+    counters = get_counters()
+    call_command('rebuild_counters', stdout=StringIO())
+    print("counters and rollups {} rebuild_counters".format("match" if counters == get_counters() else "DIFFER FROM"))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,245 @@
+"""
+Deterministic synthetic data for the benchmarks: a social graph for fb_post and a movie catalog for movies.
+
+The same arguments and seed always produce the same rows, so results of different commits are comparable. Activity
+is skewed the way real traffic is: a few large groups and many small ones, a few prolific posters, a few hot posts
+drawing most comments and reactions, a few star actors cast in many movies and a few movies drawing most votes.
+Rows are written with plain INSERTs; the fb_post counters and rollups are then rebuilt by `rebuild_counters`, and
+the catalog search index is filled by its triggers.
+"""
+import random
+from datetime import date, datetime, timedelta
+from io import StringIO
+
+from .fb_post_indexes import insert_rows
+from .movies_search import generate_name
+
+STARTED_AT = datetime(2023, 1, 1)
+REPLY_SHARE = 0.3
+POST_REACTION_SHARE = 0.7
+GROUP_POST_SHARE = 0.7
+RELEASED_FROM = date(1950, 1, 1)
+RELEASED_DAYS = 27000
+
+
+def get_skewed_index(random_generator, upper_bound):
+    """Index below `upper_bound`, log-uniformly: index i comes up about as often as 1 / (i + 1), like Zipf's law."""
+    return int(upper_bound ** random_generator.random()) - 1
+
+
+def get_shuffled_ids(random_generator, number_of_ids):
+    """Ids 1..number_of_ids in random order, so the ids that skewed picks favour are spread over the table."""
+    ids = list(range(1, number_of_ids + 1))
+    random_generator.shuffle(ids)
+    return ids
+
+
+# region Social graph
+
+def generate_memberships(random_generator, number_of_users, number_of_groups):
+    """Member ids of every group, its admin first."""
+    members_by_group = {}
+    for group_id in range(1, number_of_groups + 1):
+        group_size = min(int(random_generator.paretovariate(1.1) * 5), number_of_users)
+        members_by_group[group_id] = random_generator.sample(range(1, number_of_users + 1), group_size)
+    return members_by_group
+
+
+def generate_posts(random_generator, number_of_posts, users_by_activity, groups_by_activity, members_by_group):
+    """(id, posted_at, author id, group id or None) of every post, oldest first."""
+    posted_at = STARTED_AT
+    for post_id in range(1, number_of_posts + 1):
+        posted_at += timedelta(seconds=random_generator.randint(1, 600))
+        if random_generator.random() < GROUP_POST_SHARE:
+            group_id = groups_by_activity[get_skewed_index(random_generator, len(groups_by_activity))]
+            members = members_by_group[group_id]
+            author_id = members[get_skewed_index(random_generator, len(members))]
+        else:
+            group_id = None
+            author_id = users_by_activity[get_skewed_index(random_generator, len(users_by_activity))]
+        yield post_id, posted_at, author_id, group_id
+
+
+def generate_comments(random_generator, number_of_comments, posted_at_by_post, posts_by_heat, number_of_users):
+    """(id, commented_at, author id, post id, parent comment id or None) of every comment; replies are one deep."""
+    top_level_comments_by_post = {}
+    for comment_id in range(1, number_of_comments + 1):
+        post_id = posts_by_heat[get_skewed_index(random_generator, len(posts_by_heat))]
+        top_level_comments = top_level_comments_by_post.setdefault(post_id, [])
+        parent_comment_id = None
+        if top_level_comments and random_generator.random() < REPLY_SHARE:
+            parent_comment_id = random_generator.choice(top_level_comments)
+        else:
+            top_level_comments.append(comment_id)
+        commented_at = posted_at_by_post[post_id] + timedelta(seconds=random_generator.randint(1, 7 * 24 * 3600))
+        yield comment_id, commented_at, random_generator.randint(1, number_of_users), post_id, parent_comment_id
+
+
+def generate_reactions(random_generator, number_of_reactions, posts_by_heat, number_of_comments, number_of_users):
+    """(reaction type, post id, comment id, reacted_at, user id) of every reaction, at most one per user and target."""
+    from fb_post.constants import ReactionTypeEnum
+
+    reaction_types = [str(reaction_type) for reaction_type in ReactionTypeEnum]
+    comments_by_heat = get_shuffled_ids(random_generator, number_of_comments)
+    reacted = set()
+    while len(reacted) < number_of_reactions:
+        user_id = random_generator.randint(1, number_of_users)
+        if not comments_by_heat or random_generator.random() < POST_REACTION_SHARE:
+            target = ("post", posts_by_heat[get_skewed_index(random_generator, len(posts_by_heat))])
+        else:
+            target = ("comment", comments_by_heat[get_skewed_index(random_generator, len(comments_by_heat))])
+        if (user_id, target) in reacted:
+            continue
+        reacted.add((user_id, target))
+        reaction_type = reaction_types[get_skewed_index(random_generator, len(reaction_types))]
+        reacted_at = STARTED_AT + timedelta(seconds=random_generator.randint(0, 365 * 24 * 3600))
+        yield (reaction_type, target[1] if target[0] == "post" else None,
+               target[1] if target[0] == "comment" else None, reacted_at, user_id)
+
+
+def seed_social_graph(number_of_users, number_of_posts, comments_per_post=5, reactions_per_post=10, seed=0):
+    """
+    Seeds fb_post with `number_of_users` users in one group per hundred of them and `number_of_posts` posts, and
+    returns the ids the benchmark scenarios work on.
+    """
+    from django.core.management import call_command
+    from django.db import connection, transaction
+
+    random_generator = random.Random(seed)
+    number_of_groups = max(number_of_users // 100, 1)
+    number_of_comments = number_of_posts * comments_per_post
+    number_of_reactions = min(number_of_posts * reactions_per_post,
+                              number_of_users * (number_of_posts + number_of_comments) // 2)
+
+    members_by_group = generate_memberships(random_generator, number_of_users, number_of_groups)
+    users_by_activity = get_shuffled_ids(random_generator, number_of_users)
+    groups_by_activity = get_shuffled_ids(random_generator, number_of_groups)
+    posts = list(generate_posts(random_generator, number_of_posts, users_by_activity, groups_by_activity,
+                                members_by_group))
+    posted_at_by_post = {post_id: posted_at for post_id, posted_at, _, _ in posts}
+    posts_by_heat = get_shuffled_ids(random_generator, number_of_posts)
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        insert_rows(cursor, "fb_post_user", ["id", "name", "profile_pic"],
+                    ((user_id, generate_name(random_generator, 2), "https://pics.example.com/{}.png".format(user_id))
+                     for user_id in range(1, number_of_users + 1)))
+        insert_rows(cursor, "fb_post_group", ["id", "name"],
+                    ((group_id, generate_name(random_generator, 2)) for group_id in range(1, number_of_groups + 1)))
+        insert_rows(cursor, "fb_post_membership", ["group_id", "member_id", "is_admin"],
+                    ((group_id, member_id, index == 0) for group_id, members in members_by_group.items()
+                     for index, member_id in enumerate(members)))
+        insert_rows(cursor, "fb_post_post",
+                    ["id", "content", "posted_at", "posted_by_id", "group_id", "reaction_count", "comment_count",
+                     "version"],
+                    ((post_id, "Post {}".format(post_id), posted_at, author_id, group_id, 0, 0, 0)
+                     for post_id, posted_at, author_id, group_id in posts))
+        insert_rows(cursor, "fb_post_comment",
+                    ["id", "content", "commented_at", "commented_by_id", "post_id", "parent_comment_id",
+                     "reaction_count", "reply_count"],
+                    ((comment_id, "Comment {}".format(comment_id), commented_at, author_id, post_id, parent_id, 0, 0)
+                     for comment_id, commented_at, author_id, post_id, parent_id in generate_comments(
+                         random_generator, number_of_comments, posted_at_by_post, posts_by_heat, number_of_users)))
+        insert_rows(cursor, "fb_post_reaction", ["reaction_type", "post_id", "comment_id", "reacted_at",
+                                                 "reacted_by_id"],
+                    generate_reactions(random_generator, number_of_reactions, posts_by_heat, number_of_comments,
+                                       number_of_users))
+    call_command('rebuild_counters', stdout=StringIO())
+
+    largest_group_id = max(members_by_group, key=lambda group_id: len(members_by_group[group_id]))
+    return {
+        "users": number_of_users,
+        "groups": number_of_groups,
+        "posts": number_of_posts,
+        "comments": number_of_comments,
+        "reactions": number_of_reactions,
+        "largest_group_id": largest_group_id,
+        "largest_group_member_ids": members_by_group[largest_group_id],
+        "hottest_post_id": posts_by_heat[0],
+        "typical_post_id": posts_by_heat[len(posts_by_heat) // 2],
+    }
+
+# endregion
+
+
+# region Movie catalog
+
+def generate_unique_names(random_generator, number_of_names, words):
+    names = set()
+    while len(names) < number_of_names:
+        names.add(generate_name(random_generator, words))
+    return sorted(names)
+
+
+def generate_cast(random_generator, movies, actors_by_fame):
+    """(actor id, movie id, role, is_debut_movie) of two to eight actors per movie, movies given oldest first."""
+    debuted = set()
+    for movie_id, _ in movies:
+        cast_size = random_generator.randint(2, 8)
+        actor_ids = set()
+        while len(actor_ids) < min(cast_size, len(actors_by_fame)):
+            actor_ids.add(actors_by_fame[get_skewed_index(random_generator, len(actors_by_fame))])
+        for index, actor_id in enumerate(sorted(actor_ids)):
+            yield actor_id, movie_id, "hero" if index == 0 else "support", actor_id not in debuted
+            debuted.add(actor_id)
+
+
+def generate_ratings(random_generator, movies, movies_by_popularity):
+    """(movie id, one to five star counts, total, average) of every movie, votes going mostly to popular ones."""
+    from movies.models import get_rating_aggregates
+
+    popularity_by_movie = {movie_id: rank for rank, movie_id in enumerate(movies_by_popularity)}
+    for movie_id, _ in movies:
+        votes = int(10000 / (popularity_by_movie[movie_id] + 1) ** 0.8)
+        quality = random_generator.uniform(1, 5)
+        weights = [1 / (1 + abs(stars - quality)) ** 2 for stars in range(1, 6)]
+        star_counts = [int(votes * weight / sum(weights)) for weight in weights]
+        yield (movie_id, *star_counts, *get_rating_aggregates(*star_counts))
+
+
+def seed_movie_catalog(number_of_movies, seed=0):
+    """
+    Seeds movies with `number_of_movies` movies, one actor per four movies and one director per fifty, and returns
+    the names and ids the benchmark scenarios work on.
+    """
+    from django.db import connection, transaction
+
+    random_generator = random.Random(seed)
+    number_of_actors = max(number_of_movies // 4, 8)
+    number_of_directors = max(number_of_movies // 50, 1)
+
+    director_names = generate_unique_names(random_generator, number_of_directors, 3)
+    movie_names = [generate_name(random_generator, 3) for _ in range(number_of_movies)]
+    release_dates = sorted(RELEASED_FROM + timedelta(days=random_generator.randrange(RELEASED_DAYS))
+                           for _ in range(number_of_movies))
+    movies = [("movie_{}".format(index), release_date) for index, release_date in enumerate(release_dates)]
+    actors_by_fame = ["actor_{}".format(index) for index in range(number_of_actors)]
+    random_generator.shuffle(actors_by_fame)
+    directors_by_output = get_shuffled_ids(random_generator, number_of_directors)
+    movies_by_popularity = [movie_id for movie_id, _ in movies]
+    random_generator.shuffle(movies_by_popularity)
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        insert_rows(cursor, "movies_director", ["id", "name"], enumerate(director_names, start=1))
+        insert_rows(cursor, "movies_actor", ["actor_id", "name", "gender"],
+                    (("actor_{}".format(index), generate_name(random_generator, 2),
+                      random_generator.choice(["MALE", "FEMALE"])) for index in range(number_of_actors)))
+        insert_rows(cursor, "movies_movie",
+                    ["movie_id", "name", "release_date", "box_office_collection_in_crores", "director_id"],
+                    ((movie_id, name, release_date, round(random_generator.paretovariate(1.5) * 10, 2),
+                      directors_by_output[get_skewed_index(random_generator, number_of_directors)])
+                     for (movie_id, release_date), name in zip(movies, movie_names)))
+        insert_rows(cursor, "movies_cast", ["actor_id", "movie_id", "role", "is_debut_movie"],
+                    generate_cast(random_generator, movies, actors_by_fame))
+        insert_rows(cursor, "movies_rating",
+                    ["movie_id", "rating_one_count", "rating_two_count", "rating_three_count", "rating_four_count",
+                     "rating_five_count", "total_ratings", "average_rating"],
+                    generate_ratings(random_generator, movies, movies_by_popularity))
+
+    return {
+        "movies": number_of_movies,
+        "actors": number_of_actors,
+        "directors": number_of_directors,
+        "movie_names": random.Random(seed).sample(movie_names, min(20, number_of_movies)),
+    }
+
+# endregion
@@ -0,0 +1,101 @@
+"""
+Throughput of movies.assignment_2_utils.populate_database on synthetic catalogs.
+
+    python -m benchmarks.movies_loader --sizes 10000 100000 1000000 --batch-size 1000
+
+Every catalog has one actor per four movies, one director per fifty movies, three cast members and one rating
+row per movie. The catalog is generated lazily while it is loaded, so memory use is bounded by what the loader
+itself keeps.
+"""
+import argparse
+import time
+from datetime import date, timedelta
+
+from . import setup_django
+
+CAST_PER_MOVIE = 3
+RELEASED_FROM = date(1950, 1, 1)
+
+
+class Regenerated:
+    """An iterable that calls `generate` again on every pass, for loaders that read their input more than once."""
+
+    def __init__(self, generate, *arguments):
+        self.generate = generate
+        self.arguments = arguments
+
+    def __iter__(self):
+        return self.generate(*self.arguments)
+
+
+def generate_actors(number_of_actors):
+    for index in range(number_of_actors):
+        yield {"actor_id": "actor_{}".format(index), "name": "Actor {}".format(index),
+               "gender": "FEMALE" if index % 2 else "MALE"}
+
+
+def generate_directors(number_of_directors):
+    for index in range(number_of_directors):
+        yield "Director {}".format(index)
+
+
+def generate_movies(number_of_movies, number_of_actors, number_of_directors):
+    for index in range(number_of_movies):
+        yield {
+            "movie_id": "movie_{}".format(index),
+            "name": "Movie {}".format(index),
+            "actors": [{"actor_id": "actor_{}".format((index * 7 + offset) % number_of_actors),
+                        "role": "hero" if offset == 0 else "support",
+                        "is_debut_movie": offset == 0 and index < number_of_actors}
+                       for offset in range(CAST_PER_MOVIE)],
+            "box_office_collection_in_crores": str(index % 500 + 0.5),
+            "release_date": (RELEASED_FROM + timedelta(days=index % 25000)).isoformat(),
+            "director_name": "Director {}".format(index % number_of_directors),
+        }
+
+
+def generate_ratings(number_of_movies):
+    for index in range(number_of_movies):
+        yield {"movie_id": "movie_{}".format(index),
+               "rating_one_count": index % 5, "rating_two_count": index % 7, "rating_three_count": index % 11,
+               "rating_four_count": index % 13, "rating_five_count": index % 17}
+
+
+def load_catalog(number_of_movies, batch_size):
+    from movies.assignment_2_utils import populate_database
+
+    number_of_actors = max(number_of_movies // 4, CAST_PER_MOVIE)
+    number_of_directors = max(number_of_movies // 50, 1)
+    rows = number_of_actors + number_of_directors + number_of_movies * (2 + CAST_PER_MOVIE)
+
+    started = time.perf_counter()
+    populate_database(Regenerated(generate_actors, number_of_actors),
+                      Regenerated(generate_movies, number_of_movies, number_of_actors, number_of_directors),
+                      Regenerated(generate_directors, number_of_directors),
+                      Regenerated(generate_ratings, number_of_movies),
+                      batch_size=batch_size)
+    return rows, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database", help="SQLite file to load into (default: a new temporary file)")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000],
+                        help="number of movies per catalog")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    options = parser.parse_args()
+
+    database_path = setup_django(options.database)
+    from django.core.management import call_command
+
+    print("Loading into {}".format(database_path))
+    call_command('migrate', verbosity=0)
+    for number_of_movies in options.sizes:
+        call_command('flush', interactive=False, verbosity=0)
+        rows, seconds = load_catalog(number_of_movies, options.batch_size)
+        print("{:>9} movies: {:>10} rows in {:8.2f} s, {:>9.0f} rows/s".format(
+            number_of_movies, rows, seconds, rows / seconds))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+"""
+Vote ingestion throughput of movies.ratings.record_ratings.
+
+    python -m benchmarks.movies_ratings --movies 100000 --votes 1000000 --batch-size 10000
+
+Votes are spread over the movies with a skew towards a few popular ones, as real rating traffic is.
+"""
+import argparse
+import random
+import time
+
+from . import setup_django
+from .movies_loader import load_catalog
+
+
+def generate_votes(number_of_votes, number_of_movies, seed):
+    random_generator = random.Random(seed)
+    for _ in range(number_of_votes):
+        movie_index = min(int(random_generator.paretovariate(1.2)) - 1, number_of_movies - 1)
+        yield "movie_{}".format(movie_index), random_generator.randint(1, 5)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database", help="SQLite file to use (default: a new temporary file)")
+    parser.add_argument("--movies", type=int, default=100000)
+    parser.add_argument("--votes", type=int, default=1000000)
+    parser.add_argument("--batch-size", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=0)
+    options = parser.parse_args()
+
+    database_path = setup_django(options.database)
+    from django.core.management import call_command
+    from movies.ratings import record_ratings
+
+    print("Loading {} movies into {}".format(options.movies, database_path))
+    call_command('migrate', verbosity=0)
+    load_catalog(options.movies, batch_size=1000)
+
+    votes = list(generate_votes(options.votes, options.movies, options.seed))
+    started = time.perf_counter()
+    record_ratings(votes, batch_size=options.batch_size)
+    seconds = time.perf_counter() - started
+    print("{} votes in {:.2f} s, {:.0f} votes/s".format(options.votes, seconds, options.votes / seconds))
+
+
+if __name__ == '__main__':
+    main()
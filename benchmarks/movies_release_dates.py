@@ -0,0 +1,132 @@
+"""
+Query plans and latency of the movies release date filters, before and after they became date ranges over the
+index of migration 0005_movie_release_date_index, with the partial index of debut cast rows of migration
+0007_cast_debut_movie_index.
+
+    python -m benchmarks.movies_release_dates --movies 1000000 --repeat 20
+
+"Before" runs the former __year/__month lookups without the indexes, "after" runs the filters of
+movies.release_dates with them.
+"""
+import argparse
+import time
+from datetime import date, timedelta
+
+from . import setup_django
+from .fb_post_indexes import insert_rows
+
+BEFORE_MIGRATION = '0004_rating_aggregates'
+AFTER_MIGRATION = '0007_cast_debut_movie_index'
+RELEASED_FROM = date(1950, 1, 1)
+RELEASE_DAYS = 25000
+
+
+def seed(number_of_movies):
+    from django.db import connection, transaction
+
+    number_of_actors = max(number_of_movies // 4, 1)
+    number_of_directors = max(number_of_movies // 50, 1)
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        insert_rows(cursor, "movies_director", ["id", "name"],
+                    ((index + 1, "Director {}".format(index)) for index in range(number_of_directors)))
+        insert_rows(cursor, "movies_actor", ["actor_id", "name", "gender"],
+                    (("actor_{}".format(index), "Actor {}".format(index), "FEMALE" if index % 2 else "MALE")
+                     for index in range(number_of_actors)))
+        # Release dates are scattered over the movie ids, so no range of them is stored together by accident
+        insert_rows(cursor, "movies_movie",
+                    ["movie_id", "name", "release_date", "box_office_collection_in_crores", "director_id"],
+                    (("movie_{}".format(index), "Movie {}".format(index),
+                      RELEASED_FROM + timedelta(days=index * 7919 % RELEASE_DAYS), index % 500 + 0.5,
+                      index % number_of_directors + 1)
+                     for index in range(number_of_movies)))
+        insert_rows(cursor, "movies_cast", ["actor_id", "movie_id", "role", "is_debut_movie"],
+                    (("actor_{}".format((index + offset) % number_of_actors), "movie_{}".format(index),
+                      "hero" if offset == 0 else "support", offset == 0 and index < number_of_actors)
+                     for index in range(number_of_movies) for offset in (0, 1)))
+        insert_rows(cursor, "movies_rating",
+                    ["movie_id", "rating_one_count", "rating_two_count", "rating_three_count", "rating_four_count",
+                     "rating_five_count", "total_ratings", "average_rating"],
+                    (("movie_{}".format(index), 1, 0, 0, 0, 1, 2, 3.0) for index in range(number_of_movies)))
+
+
+def analyze():
+    # Without statistics SQLite takes any usable index, also for a range that covers most of the table
+    from django.db import connection
+
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE")
+
+
+def get_lookups():
+    from movies.models import Actor, Cast, Director, Movie, Rating
+    from movies.release_dates import get_release_date_range_q, get_release_months_q, \
+        get_wide_release_date_range_filters
+
+    # name: (former lookup, date range filter)
+    return {
+        "summer releases of 2005-2010": (
+            lambda: Movie.objects.filter(release_date__year__range=[2005, 2010], release_date__month__in=[5, 6, 7]),
+            lambda: Movie.objects.filter(get_release_months_q(2005, 2010, [5, 6, 7]))),
+        "directors of movies of 2000": (
+            lambda: Director.objects.filter(movie__release_date__year=2000).values_list('name', flat=True),
+            lambda: Director.objects.filter(get_release_date_range_q(2000, 2000, prefix="movie__"))
+            .values_list('name', flat=True)),
+        "actors debuted in 2001-2100": (
+            lambda: Actor.objects.filter(cast__is_debut_movie=True, movie__release_date__year__range=[2001, 2100])
+            .values_list('name', flat=True),
+            lambda: Cast.objects.filter(*get_wide_release_date_range_filters(2001, 2100, prefix="movie__"),
+                                        is_debut_movie=True).values_list('actor__name', flat=True)),
+        "ratings reset for 1990": (
+            lambda: Rating.objects.filter(movie__release_date__year=1990).values_list('id', flat=True),
+            lambda: Rating.objects.filter(get_release_date_range_q(1990, 1990, prefix="movie__"))
+            .values_list('id', flat=True)),
+    }
+
+
+def measure(lookups, form, repeat):
+    results = {}
+    for name, build_querysets in lookups.items():
+        build_queryset = build_querysets[form]
+        plan = build_queryset().explain()
+
+        started = time.perf_counter()
+        for _ in range(repeat):
+            rows = len(list(build_queryset()))
+        mean_ms = (time.perf_counter() - started) * 1000 / repeat
+
+        results[name] = (plan, mean_ms, rows)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database", help="SQLite file to seed (default: a new temporary file)")
+    parser.add_argument("--movies", type=int, default=1000000)
+    parser.add_argument("--repeat", type=int, default=20, help="timed runs per query")
+    options = parser.parse_args()
+
+    database_path = setup_django(options.database)
+    from django.core.management import call_command
+
+    print("Seeding {} movies into {}".format(options.movies, database_path))
+    call_command('migrate', verbosity=0)
+    call_command('migrate', 'movies', BEFORE_MIGRATION, verbosity=0)
+    seed(options.movies)
+    analyze()
+    lookups = get_lookups()
+    before = measure(lookups, 0, options.repeat)
+
+    print("Applying {}".format(AFTER_MIGRATION))
+    call_command('migrate', 'movies', AFTER_MIGRATION, verbosity=0)
+    analyze()
+    after = measure(lookups, 1, options.repeat)
+
+    for name in lookups:
+        print("\n== {} ==".format(name))
+        print("before ({:.3f} ms, {} rows): {}".format(before[name][1], before[name][2], before[name][0]))
+        print("after  ({:.3f} ms, {} rows): {}".format(after[name][1], after[name][2], after[name][0]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""
+Latency of movies.catalog_search.search_catalog against LIKE scans of the movie, actor and director tables.
+
+    python -m benchmarks.movies_search --movies 1000000 --queries 200
+
+Names are made of random syllables, so that like real names they share few trigrams. Queries are cut from
+names in the catalog: the start of a name for prefix searches, its end for suffix searches and a piece of its
+middle for substring searches.
+"""
+import argparse
+import random
+import time
+
+from . import setup_django
+from .fb_post_indexes import insert_rows
+
+SYLLABLES = [consonant + vowel for consonant in "bdfghklmnprstvz" for vowel in "aeiou"] + ["an", "el", "in", "or"]
+
+
+def generate_name(random_generator, words):
+    return " ".join("".join(random_generator.choice(SYLLABLES) for _ in range(random_generator.randint(2, 4)))
+                    .capitalize() for _ in range(words))
+
+
+def seed(number_of_movies, random_generator):
+    from django.db import connection, transaction
+
+    number_of_actors = max(number_of_movies // 4, 1)
+    number_of_directors = max(number_of_movies // 50, 1)
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        insert_rows(cursor, "movies_director", ["id", "name"],
+                    ((index + 1, generate_name(random_generator, 3)) for index in range(number_of_directors)))
+        insert_rows(cursor, "movies_actor", ["actor_id", "name", "gender"],
+                    (("actor_{}".format(index), generate_name(random_generator, 2), None)
+                     for index in range(number_of_actors)))
+        insert_rows(cursor, "movies_movie",
+                    ["movie_id", "name", "release_date", "box_office_collection_in_crores", "director_id"],
+                    (("movie_{}".format(index), generate_name(random_generator, 3), "2000-01-01", 1.0,
+                      index % number_of_directors + 1)
+                     for index in range(number_of_movies)))
+
+
+def get_queries(number_of_queries, random_generator):
+    from movies.catalog_search import PREFIX, SUBSTRING, SUFFIX
+    from movies.models import Movie
+
+    names = Movie.objects.order_by('?').values_list('name', flat=True)[:number_of_queries]
+    queries = []
+    for name in names:
+        length = random_generator.randint(8, 12)
+        start = random_generator.randint(0, len(name) - length)
+        queries += [(PREFIX, name[:length]), (SUFFIX, name[-length:]), (SUBSTRING, name[start:start + length])]
+    return queries
+
+
+def scan_catalog(query, limit, mode):
+    from movies.catalog_search import PREFIX, SUFFIX
+    from movies.models import Actor, Director, Movie
+
+    lookup = {PREFIX: "name__istartswith", SUFFIX: "name__iendswith"}.get(mode, "name__icontains")
+    matches = []
+    for model in (Movie, Actor, Director):
+        matches += list(model.objects.filter(**{lookup: query}).values_list('pk', 'name')[:limit - len(matches)])
+        if len(matches) == limit:
+            break
+    return matches
+
+
+def measure(search, queries, limit):
+    latencies = {}
+    for mode, query in queries:
+        started = time.perf_counter()
+        search(query, limit, mode)
+        latencies.setdefault(mode, []).append((time.perf_counter() - started) * 1000)
+    return {mode: (sum(mode_latencies) / len(mode_latencies), sorted(mode_latencies)[len(mode_latencies) * 99 // 100])
+            for mode, mode_latencies in latencies.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database", help="SQLite file to seed (default: a new temporary file)")
+    parser.add_argument("--movies", type=int, default=1000000)
+    parser.add_argument("--queries", type=int, default=200, help="names to cut queries from")
+    parser.add_argument("--scanned-queries", type=int, default=10, help="names to cut queries from for LIKE scans")
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    options = parser.parse_args()
+
+    database_path = setup_django(options.database)
+    from django.core.management import call_command
+    from movies.catalog_search import search_catalog
+
+    random_generator = random.Random(options.seed)
+    call_command('migrate', verbosity=0)
+    started = time.perf_counter()
+    seed(options.movies, random_generator)
+    print("Seeded and indexed {} movies into {} in {:.1f} s".format(options.movies, database_path,
+                                                                    time.perf_counter() - started))
+
+    queries = get_queries(options.queries, random_generator)
+    results = {
+        "search_catalog": measure(search_catalog, queries, options.limit),
+        "LIKE scan": measure(scan_catalog, queries[:options.scanned_queries * 3], options.limit),
+    }
+    for name, latencies in results.items():
+        for mode, (mean_ms, p99_ms) in latencies.items():
+            print("{:<15} {:<10} mean {:9.3f} ms  p99 {:9.3f} ms".format(name, mode, mean_ms, p99_ms))
+
+
+if __name__ == '__main__':
+    main()
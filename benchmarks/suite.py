@@ -0,0 +1,203 @@
+"""
+Latency percentiles, query counts and peak memory of the hot fb_post and movies functions at several data scales,
+written as JSON to compare across commits.
+
+    python -m benchmarks.suite --scales small medium --output results.json
+    python -m benchmarks.suite --scales small medium --compare results.json
+
+Every scale is seeded with benchmarks.generators from the same seed, so two runs at different commits measure the
+same data. Memory is the peak of Python allocations during one more call under tracemalloc, after the timed ones.
+"""
+import argparse
+import json
+import platform
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime
+
+from . import setup_django
+from .generators import seed_movie_catalog, seed_social_graph
+
+SCALES = {
+    "small": {"users": 1000, "posts": 2000, "movies": 2000},
+    "medium": {"users": 10000, "posts": 20000, "movies": 20000},
+    "large": {"users": 100000, "posts": 200000, "movies": 200000},
+}
+FEED_PAGE_SIZE = 20
+NEW_GROUP_SIZE = 50
+
+
+class Scenario:
+    """A function under benchmark: `prepare` runs untimed before every call of `run`, which gets the call's index."""
+
+    def __init__(self, name, run, prepare=None):
+        self.name = name
+        self.run = run
+        self.prepare = prepare or (lambda: None)
+
+
+def get_scenarios(social_graph, catalog):
+    from fb_post.assignment_6_utils import get_post
+    from fb_post.assignment_7_utils import create_group, get_group_feed
+    from fb_post.post_cache import reset_post_details_cache
+    from movies.assignment_3_utils import get_movies_by_given_movie_names
+
+    group_id = social_graph["largest_group_id"]
+    admin_id, *member_ids = social_graph["largest_group_member_ids"]
+    return [
+        Scenario("fb_post.get_group_feed", lambda _: get_group_feed(admin_id, group_id, 0, FEED_PAGE_SIZE)),
+        Scenario("fb_post.get_post hottest post", lambda _: get_post(social_graph["hottest_post_id"]),
+                 prepare=reset_post_details_cache),
+        Scenario("fb_post.get_post typical post", lambda _: get_post(social_graph["typical_post_id"]),
+                 prepare=reset_post_details_cache),
+        Scenario("fb_post.get_post hottest post cached", lambda _: get_post(social_graph["hottest_post_id"])),
+        Scenario("fb_post.get_post typical post cached", lambda _: get_post(social_graph["typical_post_id"])),
+        Scenario("fb_post.create_group",
+                 lambda index: create_group(admin_id, "Group {}".format(index), member_ids[:NEW_GROUP_SIZE])),
+        Scenario("movies.get_movies_by_given_movie_names",
+                 lambda _: get_movies_by_given_movie_names(catalog["movie_names"])),
+    ]
+
+
+def get_percentile(sorted_values, percentile):
+    """Nearest-rank percentile of a sorted, non-empty list."""
+    return sorted_values[max(-(-len(sorted_values) * percentile // 100) - 1, 0)]
+
+
+def measure(scenario, iterations, warmup):
+    from django.db import connection
+
+    query_count = 0
+
+    def count_query(execute, sql, params, many, context):
+        nonlocal query_count
+        query_count += 1
+        return execute(sql, params, many, context)
+
+    latencies, query_counts = [], []
+    with connection.execute_wrapper(count_query):
+        for index in range(warmup + iterations):
+            scenario.prepare()
+            query_count = 0
+            started = time.perf_counter()
+            scenario.run(index)
+            latency_ms = (time.perf_counter() - started) * 1000
+            if index >= warmup:
+                latencies.append(latency_ms)
+                query_counts.append(query_count)
+
+    scenario.prepare()
+    tracemalloc.start()
+    try:
+        scenario.run(warmup + iterations)
+        peak_memory = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    latencies.sort()
+    return {
+        "iterations": iterations,
+        "mean_ms": sum(latencies) / len(latencies),
+        "p50_ms": get_percentile(latencies, 50),
+        "p95_ms": get_percentile(latencies, 95),
+        "p99_ms": get_percentile(latencies, 99),
+        "max_ms": latencies[-1],
+        "queries": sorted(query_counts)[len(query_counts) // 2],
+        "max_queries": max(query_counts),
+        "peak_memory_kib": peak_memory / 1024,
+    }
+
+
+def run_scale(scale, seed, iterations, warmup):
+    from django.core.management import call_command
+    from django.db import connection
+    from fb_post.post_cache import reset_post_details_cache
+
+    call_command('flush', interactive=False, verbosity=0)
+    reset_post_details_cache()
+    started = time.perf_counter()
+    social_graph = seed_social_graph(SCALES[scale]["users"], SCALES[scale]["posts"], seed=seed)
+    catalog = seed_movie_catalog(SCALES[scale]["movies"], seed=seed)
+    # Without statistics SQLite guesses at index selectivity, which a freshly bulk loaded table misleads
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE")
+    print("{}: seeded in {:.1f} s".format(scale, time.perf_counter() - started))
+
+    scenarios = {}
+    for scenario in get_scenarios(social_graph, catalog):
+        scenarios[scenario.name] = measure(scenario, iterations, warmup)
+        print_result(scenario.name, scenarios[scenario.name])
+    data = {name: value for name, value in {**social_graph, **catalog}.items() if isinstance(value, int)}
+    return {"data": data, "scenarios": scenarios}
+
+
+def print_result(name, result, baseline=None):
+    line = "  {:<42} p50 {:9.3f} ms  p95 {:9.3f} ms  p99 {:9.3f} ms  {:>4} queries  {:9.1f} KiB".format(
+        name, result["p50_ms"], result["p95_ms"], result["p99_ms"], result["queries"], result["peak_memory_kib"])
+    if baseline is not None:
+        line += "  p50 {:+.1%} p95 {:+.1%} queries {:+d}".format(
+            result["p50_ms"] / baseline["p50_ms"] - 1, result["p95_ms"] / baseline["p95_ms"] - 1,
+            result["queries"] - baseline["queries"])
+    print(line)
+
+
+def print_comparison(results, baseline):
+    print("\nAgainst {} ({})".format(baseline["commit"], baseline["created_at"]))
+    for scale, scale_results in results["scales"].items():
+        baseline_scenarios = baseline["scales"].get(scale, {}).get("scenarios", {})
+        print("{}:".format(scale))
+        for name, result in scale_results["scenarios"].items():
+            print_result(name, result, baseline_scenarios.get(name))
+
+
+def get_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database", help="SQLite file to seed (default: a new temporary file)")
+    parser.add_argument("--scales", nargs="+", choices=SCALES, default=["small", "medium"])
+    parser.add_argument("--iterations", type=int, default=100, help="timed calls per scenario")
+    parser.add_argument("--warmup", type=int, default=5, help="untimed calls per scenario before the timed ones")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="JSON results of an earlier run to print the changes against")
+    options = parser.parse_args()
+
+    database_path = setup_django(options.database)
+    import django
+    from django.core.management import call_command
+    from django.db import connection
+
+    print("Seeding {}".format(database_path))
+    call_command('migrate', verbosity=0)
+    with connection.cursor():
+        sqlite_version = connection.connection.execute("SELECT sqlite_version()").fetchone()[0]
+
+    results = {
+        "commit": get_commit(),
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "django": django.get_version(),
+        "sqlite": sqlite_version,
+        "seed": options.seed,
+        "warmup": options.warmup,
+        "scales": {scale: run_scale(scale, options.seed, options.iterations, options.warmup)
+                   for scale in options.scales},
+    }
+
+    if options.output:
+        with open(options.output, "w") as output_file:
+            json.dump(results, output_file, indent=2)
+    if options.compare:
+        with open(options.compare) as baseline_file:
+            print_comparison(results, json.load(baseline_file))
+
+
+if __name__ == '__main__':
+    main()
@@ -3,3 +3,8 @@ from django.apps import AppConfig
 
 class FbPostConfig(AppConfig):
     name = 'fb_post'
+
+    def ready(self):
+        from assignments.instrumentation import instrument_utils, is_instrumentation_enabled
+        if is_instrumentation_enabled():
+            instrument_utils(self.name)
@@ -1,31 +1,43 @@
 from .constants import ReactionTypeEnum
-from .models import Post, Comment, Reaction, User, Group, Membership
-from django.db.models import Count, Q, F, Prefetch
-from datetime import datetime
+from .group_feed import refresh_group_feed_entries
+from .models import Post, Comment, Reaction, ReactionRollup, User, Group, Membership
+from .pagination import DEFAULT_CHUNK_SIZE, iter_pages_after_cursor
+from .post_cache import get_cached_post_details, forget_post_details
+from .reactions import toggle_reaction, get_hour_bucket
+from .serializers import get_post_details_list, get_reaction_dict
+from .validation_cache import validation_scope, get_or_fetch, get_remembered, remember, forget, \
+    forget_all
+from django.db import transaction
+from django.db.models import Q, F, Sum
+from django.db.models.functions import Coalesce
+from datetime import datetime, timedelta
 from .exceptions import InvalidUserException, InvalidPostException, InvalidCommentException, \
     InvalidReactionTypeException, InvalidPostContent, InvalidCommentContent, InvalidReplyContent, \
     UserCannotDeletePostException, InvalidGroupNameException, InvalidMemberException, InvalidGroupException, \
-    UserNotInGroupException, UserIsNotAdminException, InvalidOffSetValueException, InvalidLimitSetValueException
+    UserNotInGroupException, UserIsNotAdminException, InvalidOffSetValueException, InvalidLimitSetValueException, \
+    InvalidHoursValueException
 
 # region Validation Functions
 
 def raise_exception_if_invalid_user_id(user_id):
-    if not User.objects.filter(id=user_id).exists():
+    if get_or_fetch(User, user_id, lambda: User.objects.filter(id=user_id).first()) is None:
         raise InvalidUserException
 
 
 def raise_exception_if_invalid_post_id_else_return_post(post_id):
-    post = Post.objects.filter(id=post_id)
-    if not post.exists():
+    # Author and group come along so serializers can render the validated post without fetching it again
+    post = get_or_fetch(Post, post_id,
+                        lambda: Post.objects.select_related('posted_by', 'group').filter(id=post_id).first())
+    if post is None:
         raise InvalidPostException
-    return post[0]
+    return post
 
 
 def raise_exception_if_invalid_comment_id_else_return_comment(comment_id):
-    comment = Comment.objects.filter(id=comment_id)
-    if not comment.exists():
+    comment = get_or_fetch(Comment, comment_id, lambda: Comment.objects.filter(id=comment_id).first())
+    if comment is None:
         raise InvalidCommentException
-    return comment[00]
+    return comment
 
 
 def raise_exception_if_invalid_post_content(post_content):
@@ -58,20 +70,27 @@ def raise_exception_if_invalid_group_name(group_name):
 
 
 def raise_exception_if_invalid_member_ids(member_ids):
-    user_ids = list(User.objects.values_list("id", flat=True))
+    member_ids = {member_id for member_id in set(member_ids)
+                  if get_remembered(User, member_id) is None}
+    if not member_ids:
+        return
 
-    for member_id in member_ids:
-        if member_id not in user_ids:
-            raise InvalidMemberException
+    members = list(User.objects.filter(id__in=member_ids))
+    if len(members) != len(member_ids):
+        raise InvalidMemberException
+    for member in members:
+        remember(User, member.id, member)
 
 
 def raise_exception_if_invalid_group_id(group_id):
-    if not Group.objects.filter(id=group_id).exists():
+    if get_or_fetch(Group, group_id, lambda: Group.objects.filter(id=group_id).first()) is None:
         raise InvalidGroupException
 
 
 def raise_exception_if_user_not_in_group(user_id, group_id):
-    if not Membership.objects.filter(group_id=group_id, member_id=user_id).exists():
+    membership = get_or_fetch(Membership, (group_id, user_id),
+                              lambda: Membership.objects.filter(group_id=group_id, member_id=user_id).first())
+    if membership is None:
         raise UserNotInGroupException
 
 
@@ -81,6 +100,34 @@ def raise_exception_if_user_not_admin(user_id, group_id):
         raise UserIsNotAdminException
 
 
+def get_group_memberships_of_users(group_id, user_ids):
+    memberships = {}
+    user_ids_to_fetch = set()
+    for user_id in set(user_ids):
+        membership = get_remembered(Membership, (group_id, user_id))
+        if membership is None:
+            user_ids_to_fetch.add(user_id)
+        else:
+            memberships[user_id] = membership
+
+    if user_ids_to_fetch:
+        for membership in Membership.objects.filter(group_id=group_id, member_id__in=user_ids_to_fetch):
+            remember(Membership, (group_id, membership.member_id), membership)
+            memberships[membership.member_id] = membership
+    return memberships
+
+
+def raise_exception_if_user_not_in_group_else_return_membership(user_id, memberships):
+    if user_id not in memberships:
+        raise UserNotInGroupException
+    return memberships[user_id]
+
+
+def raise_exception_if_membership_not_admin(membership):
+    if not membership.is_admin:
+        raise UserIsNotAdminException
+
+
 def raise_exception_if_invalid_offset_value(offset):
     if offset < 0:
         raise InvalidOffSetValueException
@@ -91,11 +138,17 @@ def raise_exception_if_invalid_limit_value(limit):
         raise InvalidLimitSetValueException
 
 
+def raise_exception_if_invalid_hours_value(hours):
+    if hours <= 0:
+        raise InvalidHoursValueException
+
+
 
 # endregion
 
 
 # Task 2
+@validation_scope()
 def create_post(user_id, post_content, group_id=None):
     raise_exception_if_invalid_user_id(user_id)
     raise_exception_if_invalid_post_content(post_content)
@@ -110,27 +163,34 @@ def create_post(user_id, post_content, group_id=None):
         posted_by_id=user_id,
         group_id=group_id
     )
+    refresh_group_feed_entries([post.id])
 
     return post.id
 
 
 # Task 3
+@validation_scope()
 def create_comment(user_id, post_id, comment_content):
     raise_exception_if_invalid_user_id(user_id)
     raise_exception_if_invalid_post_id_else_return_post(post_id)
     raise_exception_if_invalid_comment_content(comment_content)
 
-    comment = Comment.objects.create(
-        content=comment_content,
-        commented_at=datetime.now(),
-        commented_by_id=user_id,
-        post_id=post_id,
-    )
+    with transaction.atomic():
+        comment = Comment.objects.create(
+            content=comment_content,
+            commented_at=datetime.now(),
+            commented_by_id=user_id,
+            post_id=post_id,
+        )
+        Post.objects.filter(id=post_id).update(comment_count=F('comment_count') + 1, version=F('version') + 1)
+    forget(Post, post_id)
+    refresh_group_feed_entries([post_id])
 
     return comment.id
 
 
 # Task 4
+@validation_scope()
 def reply_to_comment(user_id, comment_id, reply_content):
 
     raise_exception_if_invalid_user_id(user_id)
@@ -138,78 +198,96 @@ def reply_to_comment(user_id, comment_id, reply_content):
     raise_exception_if_invalid_reply_content(reply_content)
 
     if comment.parent_comment_id is not None:
-        comment_id = comment.parent_comment.id
-
-    reply = Comment.objects.create(
-        content=reply_content,
-        commented_at=datetime.now(),
-        commented_by_id=user_id,
-        post_id=comment.post.id,
-        parent_comment_id=comment_id
-    )
+        comment_id = comment.parent_comment_id
+
+    with transaction.atomic():
+        reply = Comment.objects.create(
+            content=reply_content,
+            commented_at=datetime.now(),
+            commented_by_id=user_id,
+            post_id=comment.post_id,
+            parent_comment_id=comment_id
+        )
+        Post.objects.filter(id=comment.post_id).update(comment_count=F('comment_count') + 1,
+                                                       version=F('version') + 1)
+        Comment.objects.filter(id=comment_id).update(reply_count=F('reply_count') + 1)
+    forget(Post, comment.post_id)
+    forget(Comment, comment_id)
+    refresh_group_feed_entries([comment.post_id])
 
     return reply
 
 
 # Task 5
+@validation_scope()
 def react_to_post(user_id, post_id, reaction_type):
     raise_exception_if_invalid_user_id(user_id)
     raise_exception_if_invalid_post_id_else_return_post(post_id)
     raise_exception_if_invalid_reaction_type(reaction_type)
 
-    try:
-        reaction = Reaction.objects.get(reacted_by_id=user_id, post_id=post_id)
-
-        if reaction.reaction_type == str(reaction_type):
-            reaction.delete()
-        else:
-            reaction.reaction_type = reaction_type
-            reaction.reacted_at = datetime.now()
-            reaction.save()
-    except:
-        Reaction.objects.create(reaction_type=reaction_type, post_id=post_id, reacted_at=datetime.now(),
-                                reacted_by_id=user_id)
+    toggle_reaction(user_id, reaction_type, post_id=post_id)
+    forget(Post, post_id)
+    refresh_group_feed_entries([post_id])
 
 
 # Task 6
+@validation_scope()
 def react_to_comment(user_id, comment_id, reaction_type):
     raise_exception_if_invalid_user_id(user_id)
-    raise_exception_if_invalid_comment_id_else_return_comment(comment_id)
+    comment = raise_exception_if_invalid_comment_id_else_return_comment(comment_id)
     raise_exception_if_invalid_reaction_type(reaction_type)
 
-    try:
-        reaction = Reaction.objects.get(reacted_by_id=user_id, comment_id=comment_id)
+    toggle_reaction(user_id, reaction_type, comment_id=comment_id)
+    forget(Comment, comment_id)
+    forget(Post, comment.post_id)
+    refresh_group_feed_entries([comment.post_id])
 
-        if reaction.reaction_type == str(reaction_type):
-            reaction.delete()
-        else:
-            reaction.reaction_type = reaction_type
-            reaction.reacted_at = datetime.now()
-            reaction.save()
-    except:
-        Reaction.objects.create(reaction_type=reaction_type, comment_id=comment_id, reacted_at=datetime.now(),
-                                reacted_by_id=user_id)
+
+# Reaction metrics are read from the hourly ReactionRollup rows kept up to date by the reaction write path,
+# never from the raw Reaction table.
+
+def get_reaction_counts_by_type(rollups):
+    return dict(rollups.values_list('reaction_type').annotate(total=Sum('count')).filter(total__gt=0)
+                .order_by())
 
 
 # Task 7
 def get_total_reaction_count():
-    return Reaction.objects.all().aggregate(count=Count('id'))
+    return ReactionRollup.objects.aggregate(count=Coalesce(Sum('count'), 0))
 
 
 # Task 8
+@validation_scope()
 def get_reaction_metrics(post_id):
     # Doubt Changing enum display in output?
     raise_exception_if_invalid_post_id_else_return_post(post_id)
-    return dict(Reaction.objects.values_list('reaction_type').annotate(Count('id')).filter(post_id=post_id))
+    return get_reaction_counts_by_type(ReactionRollup.objects.filter(post_id=post_id))
+
+
+@validation_scope()
+def get_reaction_metrics_for_last_hours(post_id, hours):
+    """
+    Reactions per type on the post that were made in the current hour or the `hours` - 1 before it. A reaction
+    counts in the hour it was last made or switched in.
+    """
+    raise_exception_if_invalid_post_id_else_return_post(post_id)
+    raise_exception_if_invalid_hours_value(hours)
+
+    since = get_hour_bucket(datetime.now()) - timedelta(hours=hours - 1)
+    return get_reaction_counts_by_type(ReactionRollup.objects.filter(post_id=post_id, hour__gte=since))
 
 
 # Task 9
+@validation_scope()
 def delete_post(user_id, post_id):
     raise_exception_if_invalid_user_id(user_id)
     post = raise_exception_if_invalid_post_id_else_return_post(post_id)
     raise_exception_if_user_cannot_delete_post(user_id, post)
 
     post.delete()
+    # Deleting cascades to comments and reactions, so nothing remembered about the post can be trusted
+    forget_all()
+    forget_post_details(post_id)
 
 
 # Task 10
@@ -218,152 +296,71 @@ def get_posts_with_more_positive_reactions():
                           ReactionTypeEnum.HAHA, ReactionTypeEnum.WOW]
     negative_reactions = [ReactionTypeEnum.THUMBS_DOWN, ReactionTypeEnum.SAD, ReactionTypeEnum.ANGRY]
 
-    return list(Post.objects.annotate(
-        positive_reaction_count=Count('reaction', filter=Q(reaction__reaction_type__in=positive_reactions)),
-        negative_reaction_count=Count('reaction', filter=Q(reaction__reaction_type__in=negative_reactions))).filter(
-        positive_reaction_count__gt=F('negative_reaction_count')).values_list('id', flat=True))
+    return list(ReactionRollup.objects.filter(post_id__isnull=False).values('post_id').annotate(
+        positive_reaction_count=Coalesce(Sum('count', filter=Q(reaction_type__in=positive_reactions)), 0),
+        negative_reaction_count=Coalesce(Sum('count', filter=Q(reaction_type__in=negative_reactions)), 0)).filter(
+        positive_reaction_count__gt=F('negative_reaction_count')).order_by().values_list('post_id', flat=True))
 
 
 # Task 11
+@validation_scope()
 def get_posts_reacted_by_user(user_id):
     raise_exception_if_invalid_user_id(user_id)
     return list(Reaction.objects.filter(user_id=user_id, post_id__isnull=False).value_list('post_id', flat=True))
 
 
 # Task 12
+@validation_scope()
 def get_reactions_to_post(post_id):
     raise_exception_if_invalid_post_id_else_return_post(post_id)
-    reactions = Reaction.objects.filter(post_id=post_id).select_related('reacted_by')
-
-    reaction_list = []
+    reactions = Reaction.objects.filter(post_id=post_id).select_related('reacted_by').order_by('id')
 
-    for reaction in reactions:
-        reaction_dict = {}
-        reaction_dict["user_id"] = reaction.reacted_by_id
-        reaction_dict["name"] = reaction.reacted_by.name
-        reaction_dict["profile_pic"] = reaction.reacted_by.profile_pic
-        reaction_dict["reaction"] = str(reaction.reaction_type.name)
-        reaction_list.append((reaction_dict))
-
-    return reaction_list
+    return [get_reaction_dict(reaction) for reaction in reactions]
 
 
 # Task 13
-
-def get_comment_reply_details(comment):
-
-    replies_list = []
-    for reply in comment.replies.all():
-        reply_dict = {
-            "comment_id": reply.id,
-            "commenter": {
-                "user_id": reply.commented_by_id,
-                "name": reply.commented_by.name,
-                "profile_pic": reply.commented_by.profile_pic
-            },
-            "commented_at": str(reply.commented_at),
-            "comment_content": reply.content,
-            "reactions": {
-                "count": reply.reaction_set.count(),
-                "type": reply.reaction_set.values_list("reaction_type", flat=True)
-            }
-        }
-        replies_list.append(reply_dict)
-
-    return replies_list
-
-def get_post_comment_details(post):
-
-    comments_details_list = []
-
-    for comment in post.comments.all():
-        comment_details_dict = {
-            "comment_id": comment.id,
-            "commenter": {
-                "user_id": comment.commented_by_id,
-                "name": comment.commented_by.name,
-                "profile_pic": comment.commented_by.profile_pic
-            },
-            "commented_at": str(comment.commented_at),
-            "comment_content": comment.content,
-            "reactions": {
-                "count": comment.reaction_set.count(),
-                "type": comment.reaction_set.values_list("reaction_type", flat=True)
-            },
-            "replies_count": comment.replies.count(),
-            "replies": get_comment_reply_details(comment),
-        }
-        comments_details_list.append(comment_details_dict)
-
-    return comments_details_list
-
 def get_post_details_object(post):
+    return get_cached_post_details(post)
 
-    post_details_dict = {
-        "post_id": post.id,
-        "posted_by": {
-            "name": post.posted_by.name,
-            "user_id": post.posted_by_id,
-            "profile_pic": post.posted_by.profile_pic
-        },
-        "posted_at": str(post.posted_at),
-        "posted_content": post.content,
-        "reactions": {
-            "count": post.reaction_set.count(),
-            "type": post.reaction_set.values_list("reaction_type", flat=True)
-        }
-    }
-
-    if post.group == None:
-        post_details_dict["group"] = None
-    else:
-        post_details_dict["group"] = {
-            "group_id": post.group.id,
-            "name": post.group.name
-        }
-
-    post_details_dict["comments"] = get_post_comment_details(post)
-    post_details_dict["comments_count"] = post.comments.count()
-
-    return post_details_dict
 
+@validation_scope()
 def get_post(post_id):
-    raise_exception_if_invalid_post_id_else_return_post(post_id)
+    post = raise_exception_if_invalid_post_id_else_return_post(post_id)
 
-    post = Post.objects.filter(id=post_id).select_related('posted_by', 'group')\
-        .prefetch_related("reaction_set",Prefetch("comments",
-                                                  queryset=Comment.objects.select_related("commented_by")\
-                                                  .prefetch_related("reaction_set", Prefetch("replies",
-                                                                                             queryset=Comment.objects.select_related("commented_by").prefetch_related("reaction_set"))))).first()
+    return get_cached_post_details(post)
 
-    return get_post_details_object(post)
-    # Doubt: In order to get reactions, its hitting database. Usage of List.
 
 # Task 14
+@validation_scope()
 def get_user_posts(user_id):
     raise_exception_if_invalid_user_id(user_id)
 
-    user_posts_details = []
-    posts = Post.objects.filter(posted_by_id=user_id) \
-        .select_related('posted_by', 'group') \
-        .prefetch_related("reaction_set",
-                          Prefetch("comments",
-                                   queryset=Comment.objects.select_related(
-                                       "commented_by").prefetch_related(
-                                       "reaction_set",
-                                       Prefetch(
-                                           "replies",
-                                           queryset=Comment.objects.select_related(
-                                               "commented_by", ).prefetch_related(
-                                               "reaction_set")))))
+    return get_post_details_list(Post.objects.filter(posted_by_id=user_id))
+
+
+def iter_post_details_pages(pages):
+    """Serializes the (page of posts, next_cursor) pairs of pagination.iter_pages_after_cursor() as they are read."""
+    for page, next_cursor in pages:
+        yield {"posts": get_post_details_list(page), "next_cursor": next_cursor}
+
 
-    for post in posts:
-        user_posts_details.append((get_post_details_object(post)))
+def iter_user_posts(user_id, chunk_size=DEFAULT_CHUNK_SIZE, cursor=None):
+    """
+    get_user_posts() a chunk at a time, oldest first: yields {"posts": [...], "next_cursor": ...} for every
+    `chunk_size` posts, each chunk fetched and serialized on its own so memory is bounded by the chunk size.
+    Passing a next_cursor back in resumes after its chunk. Invalid arguments raise here, before iterating.
+    """
+    # The validators share a scope; it closes before the returned pages are iterated, which need none
+    with validation_scope():
+        raise_exception_if_invalid_user_id(user_id)
+        raise_exception_if_invalid_limit_value(chunk_size)
 
-    return user_posts_details
+    posts = Post.objects.filter(posted_by_id=user_id).select_related('posted_by', 'group')
+    return iter_post_details_pages(iter_pages_after_cursor(posts, chunk_size, cursor))
 
 
 # Task 15
+@validation_scope()
 def get_replies_for_comment(comment_id):
 
     raise_exception_if_invalid_comment_id_else_return_comment(comment_id)
@@ -1,11 +1,16 @@
 from .assignment_6_utils import raise_exception_if_invalid_user_id, raise_exception_if_invalid_group_name, \
     raise_exception_if_invalid_member_ids, raise_exception_if_invalid_group_id, raise_exception_if_user_not_in_group, \
-    raise_exception_if_user_not_admin, raise_exception_if_invalid_offset_value, raise_exception_if_invalid_limit_value, \
-    get_post_details_object
-from .models import Post, Comment, Reaction, User, Membership, Group
-from django.db.models import Count, F, Prefetch
+    raise_exception_if_invalid_offset_value, raise_exception_if_invalid_limit_value, \
+    get_group_memberships_of_users, raise_exception_if_user_not_in_group_else_return_membership, \
+    raise_exception_if_membership_not_admin
+from .models import Post, User, Membership, Group
+from .group_feed import is_materialized_group_feed_enabled, get_materialized_group_feed
+from .serializers import get_post_details_list
+from .validation_cache import validation_scope, forget
+from django.db.models import F
 
 # Task 2
+@validation_scope()
 def create_group(user_id, name, member_ids):
     raise_exception_if_invalid_user_id(user_id)
     raise_exception_if_invalid_group_name(name)
@@ -13,7 +18,7 @@ def create_group(user_id, name, member_ids):
 
     group = Group.objects.create(name=name)
 
-    member_ids = list(set(member_ids))  # unique member Ids
+    member_ids = set(member_ids) - {user_id}  # unique member Ids, the creator joins below as admin
     members_list = []
 
     for member_id in member_ids:
@@ -27,51 +32,60 @@ def create_group(user_id, name, member_ids):
 
 
 # Task 3
+@validation_scope()
 def add_member_to_group(user_id, new_member_id, group_id):
     raise_exception_if_invalid_user_id(user_id)
     raise_exception_if_invalid_member_ids([new_member_id])
     raise_exception_if_invalid_group_id(group_id)
-    raise_exception_if_user_not_in_group(user_id, group_id)
-    raise_exception_if_user_not_admin(user_id, group_id)
 
-    if Membership.objects.filter(group_id=group_id, member_id=new_member_id).exists():
-        pass
-    else:
-        Membership.objects.create(group_id=group_id, member_id=new_member_id)
+    memberships = get_group_memberships_of_users(group_id, [user_id, new_member_id])
+    user_membership = raise_exception_if_user_not_in_group_else_return_membership(user_id, memberships)
+    raise_exception_if_membership_not_admin(user_membership)
+
+    if new_member_id not in memberships:
+        # ignore_conflicts keeps a concurrent add of the same member from failing on the unique constraint
+        Membership.objects.bulk_create([Membership(group_id=group_id, member_id=new_member_id)],
+                                       ignore_conflicts=True)
 
 
 # Task 4
+@validation_scope()
 def remove_member_from_group(user_id, member_id, group_id):
     raise_exception_if_invalid_user_id(user_id)
     raise_exception_if_invalid_member_ids([member_id])
     raise_exception_if_invalid_group_id(group_id)
-    raise_exception_if_user_not_in_group(user_id, group_id)
-    raise_exception_if_user_not_in_group(member_id, group_id)
-    raise_exception_if_user_not_admin(user_id, group_id)
 
-    Membership.objects.get(group_id=group_id, member_id=member_id).delete()
+    memberships = get_group_memberships_of_users(group_id, [user_id, member_id])
+    user_membership = raise_exception_if_user_not_in_group_else_return_membership(user_id, memberships)
+    member_membership = raise_exception_if_user_not_in_group_else_return_membership(member_id, memberships)
+    raise_exception_if_membership_not_admin(user_membership)
+
+    member_membership.delete()
+    forget(Membership, (group_id, member_id))
 
 
 # Task 5
+@validation_scope()
 def make_member_as_admin(user_id, member_id, group_id):
     raise_exception_if_invalid_user_id(user_id)
     raise_exception_if_invalid_member_ids([member_id])
     raise_exception_if_invalid_group_id(group_id)
-    raise_exception_if_user_not_in_group(user_id, group_id)
-    raise_exception_if_user_not_in_group(member_id, group_id)
-    raise_exception_if_user_not_admin(user_id, group_id)
 
-    membership_obj = Membership.objects.get(group_id=group_id, member_id=member_id)
+    memberships = get_group_memberships_of_users(group_id, [user_id, member_id])
+    user_membership = raise_exception_if_user_not_in_group_else_return_membership(user_id, memberships)
+    member_membership = raise_exception_if_user_not_in_group_else_return_membership(member_id, memberships)
+    raise_exception_if_membership_not_admin(user_membership)
 
-    if membership_obj.is_admin is False:
-        membership_obj.is_admin = True
-        membership_obj.save()
+    if member_membership.is_admin is False:
+        member_membership.is_admin = True
+        member_membership.save(update_fields=["is_admin"])
 
 
 # Task 6
 # Added logic to existing create_post() function as specified
 
 # Task 7
+@validation_scope()
 def get_group_feed(user_id, group_id, offset, limit):
 
     raise_exception_if_invalid_user_id(user_id)
@@ -80,32 +94,19 @@ def get_group_feed(user_id, group_id, offset, limit):
     raise_exception_if_invalid_offset_value(offset)
     raise_exception_if_invalid_limit_value(limit)
 
-    posts = Post.objects.filter(group_id=group_id) \
-                .select_related('posted_by', 'group') \
-                .prefetch_related("reaction_set",
-                                  Prefetch("comments",
-                                           queryset=Comment.objects.select_related(
-                                               "commented_by").prefetch_related(
-                                               "reaction_set",
-                                               Prefetch(
-                                                   "replies",
-                                                   queryset=Comment.objects.select_related(
-                                                       "commented_by", ).prefetch_related(
-                                                       "reaction_set"))))) \
-                .order_by('-posted_by')[offset:offset + limit]
+    if is_materialized_group_feed_enabled():
+        group_feed = get_materialized_group_feed(group_id, offset, limit)
+        if group_feed is not None:
+            return group_feed
 
-    group_feed = []
-    for post in posts:
-        group_feed.append(get_post_details_object(post))
+    posts = Post.objects.filter(group_id=group_id).order_by('-posted_at', '-id')[offset:offset + limit]
 
-    return group_feed
+    return get_post_details_list(posts)
 
 
 # Task 8
 def get_posts_with_more_comments_than_reactions():
-    post_ids = Post.objects.annotate(number_of_comments=Count('comments', distinct=True),
-                                     number_of_reactions=Count('reaction', distinct=True)).filter(
-        number_of_comments__gt=F('number_of_reactions')).values_list('id', flat=True)
+    post_ids = Post.objects.filter(comment_count__gt=F('reaction_count')).values_list('id', flat=True)
 
     return list(post_ids)
 
@@ -114,6 +115,7 @@ def get_posts_with_more_comments_than_reactions():
 # Updated exiting get_user_posts function as specified
 
 # Task 10
+@validation_scope()
 def get_silent_group_members(group_id):
     raise_exception_if_invalid_group_id(group_id)
     return list(User.objects.exclude(posts__group_id=group_id).values_list('id', flat=True))
@@ -1,18 +1,31 @@
-from .models import Post, Comment, User
-from django.db.models import Prefetch
+from .group_feed import is_materialized_group_feed_enabled, get_materialized_group_feed
+from .models import Post
+from .pagination import DEFAULT_CHUNK_SIZE, get_posts_before_cursor, get_page_with_next_cursor, \
+    iter_pages_after_cursor
+from .serializers import get_post_details_list
+from .validation_cache import validation_scope
 from .assignment_6_utils import raise_exception_if_invalid_user_id, raise_exception_if_invalid_group_id, \
     raise_exception_if_user_not_in_group, \
-    raise_exception_if_invalid_offset_value, raise_exception_if_invalid_limit_value, \
-    get_post_details_object
+    raise_exception_if_invalid_offset_value, raise_exception_if_invalid_limit_value, iter_post_details_pages
 
 
 # Interactor
 
+@validation_scope()
 def get_user_post(user_id):
     raise_exception_if_invalid_user_id(user_id)
     users_posts_dict = get_user_post_dict(user_id)  # Call Storage function
     return users_posts_dict
 
+def iter_user_post(user_id, chunk_size=DEFAULT_CHUNK_SIZE, cursor=None):
+    # The validators share a scope; it closes before the returned pages are iterated, which need none
+    with validation_scope():
+        raise_exception_if_invalid_user_id(user_id)
+        raise_exception_if_invalid_limit_value(chunk_size)
+    user_post_pages = iter_user_post_dicts(user_id, chunk_size, cursor)  # Call Storage function
+    return user_post_pages
+
+@validation_scope()
 def get_group_feed(user_id, group_id, offset, limit):
 
     raise_exception_if_invalid_user_id(user_id)
@@ -24,101 +37,51 @@ def get_group_feed(user_id, group_id, offset, limit):
     group_feed_dict = get_group_feed_dict(group_id, offset, limit)  # Call Storage function
     return group_feed_dict
 
+@validation_scope()
+def get_group_feed_by_cursor(user_id, group_id, limit, cursor=None):
 
+    raise_exception_if_invalid_user_id(user_id)
+    raise_exception_if_invalid_group_id(group_id)
+    raise_exception_if_user_not_in_group(user_id, group_id)
+    raise_exception_if_invalid_limit_value(limit)
 
+    group_feed_page_dict = get_group_feed_page_dict(group_id, limit, cursor)  # Call Storage function
+    return group_feed_page_dict
 
-# Storage
-
-def get_comment_dict(comment):
-    comment_dict = {
-        "comment_id": comment.id,
-        "commenter": {
-            "user_id": comment.commented_by_id,
-            "name": comment.commented_by.name,
-            "profile_pic": comment.commented_by.profile_pic
-        },
-        "commented_at": str(comment.commented_at),
-        "comment_content": comment.content,
-        "reactions": {
-            "count": comment.reaction_set.count(),
-            "type": comment.reaction_set.values_list("reaction_type", flat=True)
-        }
-    }
-
-    return comment_dict
-
-
-def get_detailed_reply_objects(replies):
-    replies_list = []
-    for reply in replies:
-        reply_dict = get_comment_dict(reply)
-        replies_list.append(reply_dict)
-
-    return replies_list
-
-
-def get_detailed_comment_objects(comments):
-    comments_details_list = []
 
-    for comment in comments:
-        comment_dict = get_comment_dict(comment)
-        comment_dict["replies_count"] = comment.replies.count()
-        comment_dict["replies"] = get_detailed_reply_objects(comment.replies.all())
-        comments_details_list.append(comment_dict)
 
-    return comments_details_list
 
+# Storage
 
 def get_post_details_object(post):
-    post_details_dict = {
-        "post_id": post.id,
-        "posted_by": {
-            "name": post.posted_by.name,
-            "user_id": post.posted_by_id,
-            "profile_pic": post.posted_by.profile_pic
-        },
-        "posted_at": str(post.posted_at),
-        "posted_content": post.content,
-        "reactions": {
-            "count": post.reaction_set.count(),  # TODO: should add field to model: reaction_count
-            "type": post.reaction_set.values_list("reaction_type", flat=True)
-        }
-    }
-
-    if post.group == None:
-        post_details_dict["group"] = None
-    else:
-        post_details_dict["group"] = {
-            "group_id": post.group.id,
-            "name": post.group.name
-        }
+    return get_post_details_list([post])[0]
 
-    post_details_dict["comments"] = get_comments_on_post(post)
-    post_details_dict["comments_count"] = post.comments.count()  # TODO: should add field to model: comment_count
-
-    return post_details_dict
-
-def get_comments_on_post(post):
-    queryset = Comment.objects.prefetch_related("reaction_set", "commented_by")
-    comments = post.comments.prefetch_related("commented_by", "reaction_set", Prefetch("replies", queryset=queryset))
-    return get_detailed_comment_objects(comments)
 
 def get_user_post_dict(user_id):
-    user_posts_details = []
-    posts = Post.objects.filter(posted_by_id=user_id).prefetch_related("posted_by", "group", "reaction_set", "comments")
+    return get_post_details_list(Post.objects.filter(posted_by_id=user_id))
 
-    for post in posts:
-        user_posts_details.append(get_post_details_object(post))
 
-    return user_posts_details
+def iter_user_post_dicts(user_id, chunk_size, cursor):
+    posts = Post.objects.filter(posted_by_id=user_id).select_related('posted_by', 'group')
+    return iter_post_details_pages(iter_pages_after_cursor(posts, chunk_size, cursor))
 
 
 def get_group_feed_dict(group_id, offset, limit):
-    posts = Post.objects.filter(group_id=group_id).prefetch_related("posted_by", "group", "reaction_set", "comments")\
-                                                .order_by('-posted_by')[offset:offset + limit]
-    group_post_details = []
+    if is_materialized_group_feed_enabled():
+        group_feed = get_materialized_group_feed(group_id, offset, limit)
+        if group_feed is not None:
+            return group_feed
+
+    posts = Post.objects.filter(group_id=group_id).order_by('-posted_at', '-id')[offset:offset + limit]
+    return get_post_details_list(posts)
 
-    for post in posts:
-        group_post_details.append(get_post_details_object(post))
 
-    return group_post_details
+def get_group_feed_page_dict(group_id, limit, cursor):
+    posts = get_posts_before_cursor(Post.objects.filter(group_id=group_id).select_related('posted_by', 'group'),
+                                    cursor)
+    posts, next_cursor = get_page_with_next_cursor(posts, limit)
+
+    return {
+        "posts": get_post_details_list(posts),
+        "next_cursor": next_cursor
+    }
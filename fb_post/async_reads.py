@@ -0,0 +1,53 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from .assignment_6_utils import get_post, get_user_posts, get_reactions_to_post
+from .assignment_7_utils import get_group_feed
+
+
+# Async counterparts of the fb_post read APIs, for ASGI callers that must not hold a thread per request. Django
+# 3.0 has no async ORM, so each read runs as a whole in one thread of read_executor. Reads awaited at the same
+# time run side by side there instead of queuing for the one thread that serves sync views. Like at the start and
+# end of a request, connections past CONN_MAX_AGE are closed around every read.
+#
+# A read is not split into concurrently awaited queries: every hop to the executor costs a thread handoff and,
+# with the default CONN_MAX_AGE of 0, a connection of its own, which cost more than overlapping the queries of one
+# read saves. The pool is small because SQLite answers inside the process: more threads only contend for the GIL
+# and make the reads slower than the sync APIs, while a database server's round trips are already overlapped by a
+# few. The results and exceptions are those of the sync APIs.
+
+read_executor = ThreadPoolExecutor(getattr(settings, "FB_POST_ASYNC_READ_THREADS", 2),
+                                   thread_name_prefix="fb_post_async_read")
+
+
+def run_with_connection(function, *args):
+    close_old_connections()
+    try:
+        return function(*args)
+    finally:
+        close_old_connections()
+
+
+async def run_in_thread(function, *args):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(read_executor, partial(run_with_connection, function, *args))
+
+
+async def get_post_async(post_id):
+    return await run_in_thread(get_post, post_id)
+
+
+async def get_group_feed_async(user_id, group_id, offset, limit):
+    return await run_in_thread(get_group_feed, user_id, group_id, offset, limit)
+
+
+async def get_user_posts_async(user_id):
+    return await run_in_thread(get_user_posts, user_id)
+
+
+async def get_reactions_to_post_async(post_id):
+    return await run_in_thread(get_reactions_to_post, post_id)
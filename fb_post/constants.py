@@ -15,3 +15,7 @@ class ReactionTypeEnum(Enum):
     def choices(cls):
         return [(key.value, key.name) for key in cls]
 
+
+class ReactionTargetEnum(Enum):
+    POST = "post"
+    COMMENT = "comment"
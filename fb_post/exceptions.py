@@ -45,3 +45,9 @@ class InvalidOffSetValueException(Exception):
 
 class InvalidLimitSetValueException(Exception):
     pass
+
+class InvalidHoursValueException(Exception):
+    pass
+
+class InvalidCursorException(Exception):
+    pass
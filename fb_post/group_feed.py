@@ -0,0 +1,127 @@
+import json
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from .models import Post, Comment, GroupFeedEntry
+from .serializers import get_post_details_list
+
+REBUILD_BATCH_SIZE = 500
+
+
+# Fan-out on write: when FB_POST_MATERIALIZED_GROUP_FEED is on, every write that changes how a group post
+# renders (a new post, comment, reply or reaction) re-renders that post into its GroupFeedEntry, and group
+# feeds are then read as one indexed range of pre-rendered payloads instead of being assembled per request.
+# Posts written while it was off have no entries: run `python manage.py rebuild_group_feed` after switching it on.
+# Until then a group without any entry is read with the live query, but one that gained entries since shows
+# only those posts.
+
+def is_materialized_group_feed_enabled():
+    return getattr(settings, "FB_POST_MATERIALIZED_GROUP_FEED", False)
+
+
+def get_group_feed_entries(posts):
+    return [
+        GroupFeedEntry(post_id=post_details["post_id"], group_id=post_details["group"]["group_id"],
+                       posted_at=post.posted_at, payload=json.dumps(post_details))
+        for post, post_details in zip(posts, get_post_details_list(posts))
+    ]
+
+
+def write_group_feed_entries(post_ids):
+    posts = list(Post.objects.filter(id__in=post_ids, group__isnull=False).select_related('posted_by', 'group'))
+    entries = get_group_feed_entries(posts)
+
+    with transaction.atomic():
+        GroupFeedEntry.objects.filter(post_id__in=post_ids).delete()
+        GroupFeedEntry.objects.bulk_create(entries)
+
+
+def refresh_group_feed_entries(post_ids):
+    """Re-renders the feed entries of the given posts; posts outside a group are skipped."""
+    post_ids = set(post_ids)
+    if not is_materialized_group_feed_enabled() or not post_ids:
+        return
+
+    post_ids = list(post_ids)
+    for start in range(0, len(post_ids), REBUILD_BATCH_SIZE):
+        write_group_feed_entries(post_ids[start:start + REBUILD_BATCH_SIZE])
+
+
+def refresh_group_feed_entries_of_comments(comment_ids):
+    comment_ids = set(comment_ids)
+    if not is_materialized_group_feed_enabled() or not comment_ids:
+        return
+
+    refresh_group_feed_entries(Comment.objects.filter(id__in=comment_ids).values_list('post_id', flat=True))
+
+
+def get_materialized_group_feed(group_id, offset, limit):
+    """Returns the page of the group's feed entries, or None when the group has no entries to read from."""
+    entries = GroupFeedEntry.objects.filter(group_id=group_id)
+    payloads = list(entries.order_by('-posted_at', '-post_id').values_list('payload', flat=True)[offset:offset + limit])
+    if not payloads and not entries.exists():
+        return None
+
+    return [json.loads(payload) for payload in payloads]
+
+
+def get_group_posts(group_ids=None):
+    posts = Post.objects.filter(group__isnull=False)
+    if group_ids is not None:
+        posts = posts.filter(group_id__in=group_ids)
+    return posts
+
+
+def iter_post_id_batches(posts, batch_size):
+    post_ids = list(posts.order_by('id').values_list('id', flat=True))
+    for start in range(0, len(post_ids), batch_size):
+        yield post_ids[start:start + batch_size]
+
+
+def rebuild_group_feeds(group_ids=None, batch_size=REBUILD_BATCH_SIZE):
+    """Re-renders the feed entries of every group post, or of the posts of `group_ids`. Returns the entry count."""
+    entries = GroupFeedEntry.objects.all()
+    if group_ids is not None:
+        entries = entries.filter(group_id__in=group_ids)
+
+    entries_written = 0
+    with transaction.atomic():
+        entries.delete()
+        for post_ids in iter_post_id_batches(get_group_posts(group_ids), batch_size):
+            posts = list(Post.objects.filter(id__in=post_ids).select_related('posted_by', 'group').order_by('id'))
+            GroupFeedEntry.objects.bulk_create(get_group_feed_entries(posts))
+            entries_written += len(posts)
+
+    return entries_written
+
+
+def find_group_feed_inconsistencies(group_ids=None, batch_size=REBUILD_BATCH_SIZE):
+    """
+    Compares the feed entries against posts rendered by the live query. Returns (post_id, problem) pairs where
+    problem is "missing" (a group post without an entry), "stale" (an entry that renders differently) or
+    "unexpected" (an entry whose post is not in that group).
+    """
+    inconsistencies = []
+
+    for post_ids in iter_post_id_batches(get_group_posts(group_ids), batch_size):
+        posts = Post.objects.filter(id__in=post_ids).order_by('id')
+        payloads = dict(GroupFeedEntry.objects.filter(post_id__in=post_ids).values_list('post_id', 'payload'))
+
+        for post_details in get_post_details_list(posts):
+            post_id = post_details["post_id"]
+            if post_id not in payloads:
+                inconsistencies.append((post_id, "missing"))
+            # A JSON round trip gives the live rendering the same shape as a stored payload
+            elif json.loads(payloads[post_id]) != json.loads(json.dumps(post_details)):
+                inconsistencies.append((post_id, "stale"))
+
+    entries = GroupFeedEntry.objects.all()
+    if group_ids is not None:
+        entries = entries.filter(group_id__in=group_ids)
+    unexpected_post_ids = entries.exclude(post__group_id=F('group_id')) \
+        .values_list('post_id', flat=True)
+    inconsistencies.extend((post_id, "unexpected") for post_id in unexpected_post_ids)
+
+    return inconsistencies
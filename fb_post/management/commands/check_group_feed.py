@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from fb_post.group_feed import REBUILD_BATCH_SIZE, find_group_feed_inconsistencies, rebuild_group_feeds
+
+
+class Command(BaseCommand):
+    help = "Compares the materialized group feed against the live query and reports missing or stale entries"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--group", type=int, action="append", dest="group_ids",
+                            help="only check this group's feed; may be repeated")
+        parser.add_argument("--batch-size", type=int, default=REBUILD_BATCH_SIZE)
+        parser.add_argument("--repair", action="store_true", help="rebuild the checked feeds if they are off")
+
+    def handle(self, *args, **options):
+        inconsistencies = find_group_feed_inconsistencies(options["group_ids"], options["batch_size"])
+        if not inconsistencies:
+            self.stdout.write(self.style.SUCCESS("Group feed is consistent"))
+            return
+
+        for post_id, problem in inconsistencies:
+            self.stdout.write("post {}: {}".format(post_id, problem))
+
+        if options["repair"]:
+            entries_written = rebuild_group_feeds(options["group_ids"], options["batch_size"])
+            self.stdout.write(self.style.SUCCESS("Rebuilt {} group feed entries".format(entries_written)))
+        else:
+            raise CommandError("{} group feed entries are inconsistent".format(len(inconsistencies)))
@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, TruncHour
+
+from fb_post.models import Post, Comment, Reaction, ReactionRollup
+
+ROLLUP_BATCH_SIZE = 10000
+
+
+def count_of(queryset, field_name):
+    counts = queryset.filter(**{field_name: OuterRef('pk')}).values(field_name).annotate(count=Count('id'))
+    return Coalesce(Subquery(counts.values('count')), 0)
+
+
+def get_reaction_rollups(target_field):
+    rollups = Reaction.objects.filter(**{target_field + '__isnull': False}) \
+        .annotate(hour=TruncHour('reacted_at')).values(target_field, 'reaction_type', 'hour') \
+        .annotate(count=Count('id')).order_by()
+
+    for rollup in rollups.iterator():
+        yield ReactionRollup(**{target_field + '_id': rollup[target_field]}, reaction_type=rollup['reaction_type'],
+                             hour=rollup['hour'], count=rollup['count'])
+
+
+def rebuild_reaction_rollups():
+    ReactionRollup.objects.all().delete()
+
+    rollups_created = 0
+    for target_field in ('post', 'comment'):
+        batch = []
+        for rollup in get_reaction_rollups(target_field):
+            batch.append(rollup)
+            if len(batch) == ROLLUP_BATCH_SIZE:
+                ReactionRollup.objects.bulk_create(batch)
+                rollups_created += len(batch)
+                batch = []
+        ReactionRollup.objects.bulk_create(batch)
+        rollups_created += len(batch)
+
+    return rollups_created
+
+
+class Command(BaseCommand):
+    help = "Recomputes reaction_count, comment_count, reply_count and the hourly reaction rollups from the " \
+           "Reaction and Comment tables"
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            # Any post may render differently afterwards, so every version moves and no cached post details match
+            posts_updated = Post.objects.update(reaction_count=count_of(Reaction.objects.all(), 'post'),
+                                                comment_count=count_of(Comment.objects.all(), 'post'),
+                                                version=F('version') + 1)
+            comments_updated = Comment.objects.update(reaction_count=count_of(Reaction.objects.all(), 'comment'),
+                                                      reply_count=count_of(Comment.objects.all(), 'parent_comment'))
+            rollups_created = rebuild_reaction_rollups()
+
+        self.stdout.write(self.style.SUCCESS(
+            "Rebuilt counters for {} posts and {} comments, and {} reaction rollups".format(
+                posts_updated, comments_updated, rollups_created)))
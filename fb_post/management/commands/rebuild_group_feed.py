@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from fb_post.group_feed import REBUILD_BATCH_SIZE, rebuild_group_feeds
+
+
+class Command(BaseCommand):
+    help = "Re-renders the materialized group feed (GroupFeedEntry) from posts, comments and reactions"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--group", type=int, action="append", dest="group_ids",
+                            help="only rebuild this group's feed; may be repeated")
+        parser.add_argument("--batch-size", type=int, default=REBUILD_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        entries_written = rebuild_group_feeds(options["group_ids"], options["batch_size"])
+
+        self.stdout.write(self.style.SUCCESS("Rebuilt {} group feed entries".format(entries_written)))
@@ -0,0 +1,52 @@
+# Generated by Django 3.0.14 on 2026-10-18 10:29
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_of(queryset, field_name):
+    counts = queryset.filter(**{field_name: OuterRef('pk')}).values(field_name).annotate(count=Count('id'))
+    return Coalesce(Subquery(counts.values('count')), 0)
+
+
+def populate_counters(apps, schema_editor):
+    Post = apps.get_model('fb_post', 'Post')
+    Comment = apps.get_model('fb_post', 'Comment')
+    Reaction = apps.get_model('fb_post', 'Reaction')
+
+    Post.objects.update(reaction_count=count_of(Reaction.objects.all(), 'post'),
+                        comment_count=count_of(Comment.objects.all(), 'post'))
+    Comment.objects.update(reaction_count=count_of(Reaction.objects.all(), 'comment'),
+                           reply_count=count_of(Comment.objects.all(), 'parent_comment'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fb_post', '0003_auto_20230912_0619'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='reaction_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='reply_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='reaction_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
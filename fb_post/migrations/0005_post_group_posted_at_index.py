@@ -0,0 +1,17 @@
+# Generated by Django 3.0.14 on 2026-10-18 10:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fb_post', '0004_post_comment_counters'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['group', 'posted_at', 'id'], name='post_group_posted_at_idx'),
+        ),
+    ]
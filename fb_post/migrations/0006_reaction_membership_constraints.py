@@ -0,0 +1,64 @@
+# Generated by Django 3.0.14 on 2026-10-18 10:32
+
+from django.db import migrations, models
+from django.db.models import Count, F, Max
+
+
+def remove_duplicate_reactions(apps, schema_editor):
+    Post = apps.get_model('fb_post', 'Post')
+    Comment = apps.get_model('fb_post', 'Comment')
+    Reaction = apps.get_model('fb_post', 'Reaction')
+
+    # Keep the latest reaction of each user on each post/comment and take the rest off the counters
+    for target_field, target_model in (('post', Post), ('comment', Comment)):
+        duplicates = Reaction.objects.filter(**{target_field + '__isnull': False}) \
+            .values('reacted_by', target_field).annotate(count=Count('id'), latest_id=Max('id')).filter(count__gt=1)
+
+        for duplicate in duplicates:
+            Reaction.objects.filter(reacted_by=duplicate['reacted_by'], **{target_field: duplicate[target_field]}) \
+                .exclude(id=duplicate['latest_id']).delete()
+            target_model.objects.filter(id=duplicate[target_field]) \
+                .update(reaction_count=F('reaction_count') - (duplicate['count'] - 1))
+
+
+def remove_duplicate_memberships(apps, schema_editor):
+    Membership = apps.get_model('fb_post', 'Membership')
+
+    duplicates = Membership.objects.values('group', 'member').annotate(count=Count('id')).filter(count__gt=1)
+    for duplicate in duplicates:
+        # Admin rows sort first, so an admin membership is never the one dropped
+        memberships = Membership.objects.filter(group=duplicate['group'], member=duplicate['member']) \
+            .order_by('-is_admin', 'id')
+        Membership.objects.filter(id__in=[membership.id for membership in memberships[1:]]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fb_post', '0005_post_group_posted_at_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_reactions, migrations.RunPython.noop),
+        migrations.RunPython(remove_duplicate_memberships, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['posted_by', 'posted_at', 'id'], name='post_posted_by_posted_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reaction',
+            index=models.Index(fields=['post', 'reaction_type'], name='reaction_post_type_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='membership',
+            constraint=models.UniqueConstraint(fields=('group', 'member'), name='unique_group_member'),
+        ),
+        migrations.AddConstraint(
+            model_name='reaction',
+            constraint=models.UniqueConstraint(fields=('reacted_by', 'post'), name='unique_post_reaction_per_user'),
+        ),
+        migrations.AddConstraint(
+            model_name='reaction',
+            constraint=models.UniqueConstraint(fields=('reacted_by', 'comment'), name='unique_comment_reaction_per_user'),
+        ),
+    ]
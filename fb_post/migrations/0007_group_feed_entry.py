@@ -0,0 +1,27 @@
+# Generated by Django 3.0.14 on 2026-10-18 10:50
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fb_post', '0006_reaction_membership_constraints'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GroupFeedEntry',
+            fields=[
+                ('post', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to='fb_post.Post')),
+                ('posted_at', models.DateTimeField()),
+                ('payload', models.TextField()),
+                ('group', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='fb_post.Group')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='groupfeedentry',
+            index=models.Index(fields=['group', 'posted_at', 'post'], name='feed_entry_group_posted_at_idx'),
+        ),
+    ]
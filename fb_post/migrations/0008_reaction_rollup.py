@@ -0,0 +1,60 @@
+# Generated by Django 3.0.14 on 2026-10-18 10:52
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncHour
+import django.db.models.deletion
+
+
+def get_reaction_rollups(Reaction, ReactionRollup, target_field):
+    rollups = Reaction.objects.filter(**{target_field + '__isnull': False}) \
+        .annotate(hour=TruncHour('reacted_at')).values(target_field, 'reaction_type', 'hour') \
+        .annotate(count=Count('id')).order_by()
+
+    for rollup in rollups.iterator():
+        yield ReactionRollup(**{target_field + '_id': rollup[target_field]}, reaction_type=rollup['reaction_type'],
+                             hour=rollup['hour'], count=rollup['count'])
+
+
+def populate_reaction_rollups(apps, schema_editor):
+    Reaction = apps.get_model('fb_post', 'Reaction')
+    ReactionRollup = apps.get_model('fb_post', 'ReactionRollup')
+
+    for target_field in ('post', 'comment'):
+        batch = []
+        for rollup in get_reaction_rollups(Reaction, ReactionRollup, target_field):
+            batch.append(rollup)
+            if len(batch) == 10000:
+                ReactionRollup.objects.bulk_create(batch)
+                batch = []
+        ReactionRollup.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fb_post', '0007_group_feed_entry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReactionRollup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('reaction_type', models.CharField(choices=[(1, 'WOW'), (2, 'LIT'), (3, 'LOVE'), (4, 'HAHA'), (5, 'THUMBS_UP'), (6, 'THUMBS_DOWN'), (7, 'ANGRY'), (8, 'SAD')], max_length=100)),
+                ('hour', models.DateTimeField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('comment', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='fb_post.Comment')),
+                ('post', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='fb_post.Post')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='reactionrollup',
+            constraint=models.UniqueConstraint(fields=('post', 'reaction_type', 'hour'), name='unique_post_reaction_rollup'),
+        ),
+        migrations.AddConstraint(
+            model_name='reactionrollup',
+            constraint=models.UniqueConstraint(fields=('comment', 'reaction_type', 'hour'), name='unique_comment_reaction_rollup'),
+        ),
+        migrations.RunPython(populate_reaction_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,84 @@
+# Generated by Django 3.0.14 on 2026-10-18 13:05
+
+from django.db import migrations
+
+REACTION_TABLE = 'fb_post_reaction'
+ROLLUP_TABLE = 'fb_post_reactionrollup'
+POST_TABLE = 'fb_post_post'
+# target column of the reaction: (table of the target, statement bumping the version of the post it renders in)
+TARGETS = {
+    'post_id': (POST_TABLE, None),
+    'comment_id': ('fb_post_comment',
+                   "UPDATE {post_table} SET version = version + 1 "
+                   "WHERE id = (SELECT post_id FROM fb_post_comment WHERE id = {row}.comment_id);"),
+}
+OPERATIONS = ('insert', 'update', 'delete')
+
+
+# Every write of a reaction row keeps its target's reaction_count, the hourly rollups and the version of the post
+# it renders in up to date from triggers, so the reaction write path is one or two statements, and the derived
+# values move in the same statement as the row. Hours are bucketed from reacted_at as Django stores it on SQLite.
+
+def get_rollup_increment_sql(target_column, row):
+    return "INSERT INTO {rollups} (reaction_type, {target}, hour, count) " \
+           "VALUES ({row}.reaction_type, {row}.{target}, strftime('%Y-%m-%d %H:00:00', {row}.reacted_at), 1) " \
+           "ON CONFLICT ({target}, reaction_type, hour) DO UPDATE SET count = count + 1;".format(
+               rollups=ROLLUP_TABLE, target=target_column, row=row)
+
+
+def get_rollup_decrement_sql(target_column, row):
+    return "UPDATE {rollups} SET count = count - 1 WHERE reaction_type = {row}.reaction_type " \
+           "AND {target} = {row}.{target} AND hour = strftime('%Y-%m-%d %H:00:00', {row}.reacted_at);".format(
+               rollups=ROLLUP_TABLE, target=target_column, row=row)
+
+
+def get_target_update_sql(target_column, row, change):
+    target_table, post_version_sql = TARGETS[target_column]
+    if post_version_sql is None:
+        # The post's counter and version move in one statement
+        return "UPDATE {} SET reaction_count = reaction_count {}, version = version + 1 WHERE id = {}.{};".format(
+            target_table, change, row, target_column)
+    return "UPDATE {} SET reaction_count = reaction_count {} WHERE id = {}.{}; {}".format(
+        target_table, change, row, target_column, post_version_sql.format(post_table=POST_TABLE, row=row))
+
+
+def get_post_version_sql(target_column, row):
+    _, post_version_sql = TARGETS[target_column]
+    if post_version_sql is None:
+        return "UPDATE {} SET version = version + 1 WHERE id = {}.{};".format(POST_TABLE, row, target_column)
+    return post_version_sql.format(post_table=POST_TABLE, row=row)
+
+
+def get_create_trigger_sql():
+    statements = []
+    for target_column in TARGETS:
+        trigger_name = "{}_{}".format(REACTION_TABLE, target_column)
+        statements += [
+            "CREATE TRIGGER {}_insert AFTER INSERT ON {} WHEN new.{} IS NOT NULL BEGIN {} {} END".format(
+                trigger_name, REACTION_TABLE, target_column, get_target_update_sql(target_column, "new", "+ 1"),
+                get_rollup_increment_sql(target_column, "new")),
+            "CREATE TRIGGER {}_update AFTER UPDATE OF reaction_type, reacted_at ON {} WHEN new.{} IS NOT NULL "
+            "BEGIN {} {} {} END".format(
+                trigger_name, REACTION_TABLE, target_column, get_rollup_decrement_sql(target_column, "old"),
+                get_rollup_increment_sql(target_column, "new"), get_post_version_sql(target_column, "new")),
+            "CREATE TRIGGER {}_delete AFTER DELETE ON {} WHEN old.{} IS NOT NULL BEGIN {} {} END".format(
+                trigger_name, REACTION_TABLE, target_column, get_target_update_sql(target_column, "old", "- 1"),
+                get_rollup_decrement_sql(target_column, "old")),
+        ]
+    return statements
+
+
+def get_drop_trigger_sql():
+    return ["DROP TRIGGER {}_{}_{}".format(REACTION_TABLE, target_column, operation)
+            for target_column in TARGETS for operation in OPERATIONS]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fb_post', '0009_post_version'),
+    ]
+
+    operations = [
+        migrations.RunSQL(get_create_trigger_sql(), get_drop_trigger_sql()),
+    ]
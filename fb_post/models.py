@@ -16,11 +16,26 @@ class Membership(models.Model):
     member = models.ForeignKey(User, on_delete=models.CASCADE)
     is_admin = models.BooleanField(default=False)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["group", "member"], name="unique_group_member"),
+        ]
+
 class Post(models.Model):
     content = models.CharField(max_length=1000)
     posted_at = models.DateTimeField()
     posted_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name="posts")
     group = models.ForeignKey(Group, on_delete=models.CASCADE, null=True)
+    reaction_count = models.PositiveIntegerField(default=0)
+    comment_count = models.PositiveIntegerField(default=0)
+    # Bumped by every write that changes how the post renders, cached post details are keyed by it
+    version = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["group", "posted_at", "id"], name="post_group_posted_at_idx"),
+            models.Index(fields=["posted_by", "posted_at", "id"], name="post_posted_by_posted_at_idx"),
+        ]
 
 class Comment(models.Model):
     content = models.CharField(max_length=1000)
@@ -28,6 +43,8 @@ class Comment(models.Model):
     commented_by = models.ForeignKey(User, on_delete=models.CASCADE)
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="comments")
     parent_comment = models.ForeignKey("self", on_delete=models.CASCADE, null=True, related_name="replies")
+    reaction_count = models.PositiveIntegerField(default=0)
+    reply_count = models.PositiveIntegerField(default=0)
 
 
 class Reaction(models.Model):
@@ -37,3 +54,42 @@ class Reaction(models.Model):
     reacted_at = models.DateTimeField()
     reacted_by = models.ForeignKey(User, on_delete=models.CASCADE)
 
+    class Meta:
+        # NULLs never collide in a unique index, so a comment reaction (post NULL) leaves the post
+        # constraint alone and vice versa.
+        constraints = [
+            models.UniqueConstraint(fields=["reacted_by", "post"], name="unique_post_reaction_per_user"),
+            models.UniqueConstraint(fields=["reacted_by", "comment"], name="unique_comment_reaction_per_user"),
+        ]
+        indexes = [
+            models.Index(fields=["post", "reaction_type"], name="reaction_post_type_idx"),
+        ]
+
+
+class ReactionRollup(models.Model):
+    # Number of current reactions of one type on a post or comment whose reacted_at falls in `hour`
+    reaction_type = models.CharField(max_length=100, choices=ReactionTypeEnum.choices())
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, null=True)
+    comment = models.ForeignKey(Comment, on_delete=models.CASCADE, null=True)
+    hour = models.DateTimeField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["post", "reaction_type", "hour"], name="unique_post_reaction_rollup"),
+            models.UniqueConstraint(fields=["comment", "reaction_type", "hour"],
+                                    name="unique_comment_reaction_rollup"),
+        ]
+
+
+class GroupFeedEntry(models.Model):
+    # Pre-rendered post details of a group post, see fb_post/group_feed.py
+    post = models.OneToOneField(Post, on_delete=models.CASCADE, primary_key=True)
+    group = models.ForeignKey(Group, on_delete=models.CASCADE)
+    posted_at = models.DateTimeField()
+    payload = models.TextField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["group", "posted_at", "post"], name="feed_entry_group_posted_at_idx"),
+        ]
@@ -0,0 +1,77 @@
+import base64
+import binascii
+from datetime import datetime
+
+from .exceptions import InvalidCursorException
+
+DEFAULT_CHUNK_SIZE = 100
+
+# Cursors are opaque to callers: the url-safe base64 of the (posted_at, id) position of the last post on a page.
+
+def encode_cursor(post):
+    position = "{}|{}".format(post.posted_at.isoformat(), post.id)
+    return base64.urlsafe_b64encode(position.encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        posted_at, post_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(posted_at), int(post_id)
+    except (AttributeError, binascii.Error, UnicodeDecodeError, ValueError):
+        raise InvalidCursorException
+
+
+def get_posts_before_cursor(posts, cursor):
+    """Newest first: keeps the posts that come after `cursor` in (-posted_at, -id) order."""
+    if cursor is None:
+        return posts.order_by('-posted_at', '-id')
+
+    # Spelled as a posted_at range plus an exclusion so the (..., posted_at, id) index bounds the scan
+    posted_at, post_id = decode_cursor(cursor)
+    return posts.filter(posted_at__lte=posted_at).exclude(posted_at=posted_at, id__gte=post_id) \
+        .order_by('-posted_at', '-id')
+
+
+def get_page_with_next_cursor(posts, limit):
+    """
+    Fetches one extra row to learn whether another page exists, so callers get a next cursor only when
+    there is more to read.
+    """
+    posts = list(posts[:limit + 1])
+    if len(posts) <= limit:
+        return posts, None
+
+    posts = posts[:limit]
+    return posts, encode_cursor(posts[-1])
+
+
+def get_posts_after_cursor(posts, cursor):
+    """Oldest first: keeps the posts that come after `cursor` in (posted_at, id) order."""
+    if cursor is None:
+        return posts.order_by('posted_at', 'id')
+
+    posted_at, post_id = decode_cursor(cursor)
+    return posts.filter(posted_at__gte=posted_at).exclude(posted_at=posted_at, id__lte=post_id) \
+        .order_by('posted_at', 'id')
+
+
+def iter_pages_after_cursor(posts, limit, cursor=None):
+    """
+    Oldest first: the posts after `cursor` in pages of at most `limit`, each paired with the cursor of its last
+    post, so that only one page is loaded at a time. The last page has a cursor too, resuming from it later picks
+    up the posts added since. An invalid cursor raises here rather than on the first page.
+    """
+    first_page_posts = get_posts_after_cursor(posts, cursor)
+
+    def iter_pages(page_posts):
+        while True:
+            page = list(page_posts[:limit])
+            if not page:
+                return
+            next_cursor = encode_cursor(page[-1])
+            yield page, next_cursor
+            if len(page) < limit:
+                return
+            page_posts = get_posts_after_cursor(posts, next_cursor)
+
+    return iter_pages(first_page_posts)
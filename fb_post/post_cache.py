@@ -0,0 +1,166 @@
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection
+
+from .models import Post
+from .serializers import get_post_details_list, copy_post_details
+
+POST_DETAILS_KEY_FORMAT = "fb_post:post_details:{}:{}"
+
+
+# Rendered post details are cached per post under the post's version, which every write that changes how the
+# post renders bumps in the same transaction as the write: comments and replies in their counter UPDATE, reactions
+# through the triggers on the reaction table, rebuild_counters in its recount of the posts. Readers already load
+# the post row to validate it, so checking the version costs nothing: a cached payload is only used while its
+# version is the current one, and a write never has to find the entries it makes stale.
+#
+# Lookups go to a bounded in-process LRU first, then to the Django cache named by FB_POST_DETAILS_CACHE when it
+# is set, shared by every process, and only then render. Nothing is cached while a transaction is open: a
+# rolled back write takes its version bump along, and the version would be handed out again for other content.
+#
+# Both tiers hold the post details dicts themselves, which the Django cache pickles. Callers get a copy made by
+# serializers.copy_post_details(), so changing a returned dict never reaches the cache; for a post with many
+# comments the copy costs about half of what decoding a JSON payload would.
+
+class PostDetailsLRU:
+    """Post id -> (version, post details) for at most `max_size` posts, least recently used first."""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, post_id, version):
+        with self.lock:
+            entry = self.entries.get(post_id)
+            if entry is None or entry[0] != version:
+                return None
+            self.entries.move_to_end(post_id)
+            return entry[1]
+
+    def set(self, post_id, version, post_details):
+        with self.lock:
+            entry = self.entries.get(post_id)
+            # A slower reader must not replace what a reader of a later version stored
+            if entry is not None and entry[0] > version:
+                return
+            self.entries[post_id] = (version, post_details)
+            self.entries.move_to_end(post_id)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def discard(self, post_id):
+        with self.lock:
+            self.entries.pop(post_id, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+post_details_lru = PostDetailsLRU(getattr(settings, "FB_POST_DETAILS_LRU_SIZE", 1000))
+post_details_cache_stats = {"lru_hits": 0, "cache_hits": 0, "misses": 0}
+post_details_cache_stats_lock = threading.Lock()
+
+
+def get_post_details_cache():
+    cache_alias = getattr(settings, "FB_POST_DETAILS_CACHE", None)
+    return None if cache_alias is None else caches[cache_alias]
+
+
+def count_post_details_lookups(lru_hits, cache_hits, misses):
+    with post_details_cache_stats_lock:
+        post_details_cache_stats["lru_hits"] += lru_hits
+        post_details_cache_stats["cache_hits"] += cache_hits
+        post_details_cache_stats["misses"] += misses
+
+
+def get_post_details_cache_stats():
+    with post_details_cache_stats_lock:
+        return dict(post_details_cache_stats)
+
+
+def reset_post_details_cache():
+    """Empties the in-process tier and zeroes the counters; the Django cache tier is left alone."""
+    post_details_lru.clear()
+    with post_details_cache_stats_lock:
+        for name in post_details_cache_stats:
+            post_details_cache_stats[name] = 0
+
+
+def read_post_details_cache(posts):
+    """
+    Cached post details by post id of Post objects loaded with their version, None for the posts that missed.
+    They are shared with the cache: pass them through merge_post_details() before handing them out.
+    """
+    payloads = {post.id: post_details_lru.get(post.id, post.version) for post in posts}
+    lru_hits = sum(payload is not None for payload in payloads.values())
+
+    cache = get_post_details_cache()
+    keys = {post.id: POST_DETAILS_KEY_FORMAT.format(post.id, post.version) for post in posts
+            if payloads[post.id] is None}
+    cached_payloads = cache.get_many(list(keys.values())) if cache is not None and keys else {}
+    for post in posts:
+        if payloads[post.id] is None and keys[post.id] in cached_payloads:
+            payloads[post.id] = cached_payloads[keys[post.id]]
+            post_details_lru.set(post.id, post.version, payloads[post.id])
+
+    count_post_details_lookups(lru_hits, len(cached_payloads), len(keys) - len(cached_payloads))
+    return payloads
+
+
+def write_post_details_cache(posts, post_details_by_id):
+    """Caches the post details rendered for `posts`, unless a transaction is open."""
+    if connection.in_atomic_block:
+        return
+
+    rendered_payloads = {}
+    for post in posts:
+        # The rendered dicts go back to the caller, the cache keeps a copy of its own
+        payload = copy_post_details(post_details_by_id[post.id])
+        post_details_lru.set(post.id, post.version, payload)
+        rendered_payloads[POST_DETAILS_KEY_FORMAT.format(post.id, post.version)] = payload
+    cache = get_post_details_cache()
+    if cache is not None and rendered_payloads:
+        cache.set_many(rendered_payloads, getattr(settings, "FB_POST_DETAILS_CACHE_TIMEOUT", 60 * 60))
+
+
+def merge_post_details(posts, payloads, post_details_by_id):
+    # Every caller gets its own copy of a cached payload, so changing a returned dict never reaches the cache
+    return [post_details_by_id[post.id] if post.id in post_details_by_id else copy_post_details(payloads[post.id])
+            for post in posts]
+
+
+def get_cached_post_details_list(posts):
+    """
+    Like serializers.get_post_details_list(), for Post objects loaded with posted_by and group, reading and
+    filling the cache. The posts that miss both tiers are rendered together in one go.
+    """
+    posts = list(posts)
+    payloads = read_post_details_cache(posts)
+    missed_posts = [post for post in posts if payloads[post.id] is None]
+    if not missed_posts:
+        return merge_post_details(posts, payloads, {})
+
+    post_details_by_id = {post_details["post_id"]: post_details
+                          for post_details in get_post_details_list(missed_posts)}
+    write_post_details_cache(missed_posts, post_details_by_id)
+    return merge_post_details(posts, payloads, post_details_by_id)
+
+
+def get_cached_post_details(post):
+    return get_cached_post_details_list([post])[0]
+
+
+def warm_post_details(post_ids):
+    """Renders and caches the given posts ahead of their first read; returns how many of them exist."""
+    posts = list(Post.objects.filter(id__in=set(post_ids)).select_related('posted_by', 'group'))
+    get_cached_post_details_list(posts)
+    return len(posts)
+
+
+def forget_post_details(post_id):
+    post_details_lru.discard(post_id)
@@ -0,0 +1,212 @@
+from collections import defaultdict
+from datetime import datetime
+from itertools import islice
+
+from django.db import connection, transaction
+
+from .constants import ReactionTargetEnum, ReactionTypeEnum
+from .exceptions import InvalidUserException, InvalidPostException, InvalidCommentException, \
+    InvalidReactionTypeException
+from .group_feed import refresh_group_feed_entries, refresh_group_feed_entries_of_comments
+from .models import Post, Comment, Reaction, User
+from .validation_cache import forget_all
+
+BULK_CHUNK_SIZE = 10000
+# Two parameters per pair keeps each lookup under SQLite's historical limit of 999 bound parameters
+EXISTING_REACTIONS_LOOKUP_SIZE = 499
+REACTION_INSERT_COLUMNS = ("reaction_type", "post_id", "comment_id", "reacted_at", "reacted_by_id")
+
+
+def get_reaction_insert_sql(on_conflict=""):
+    return "INSERT INTO {} ({}) VALUES ({}) {}".format(
+        connection.ops.quote_name(Reaction._meta.db_table),
+        ", ".join(connection.ops.quote_name(column) for column in REACTION_INSERT_COLUMNS),
+        ", ".join(["%s"] * len(REACTION_INSERT_COLUMNS)),
+        on_conflict)
+
+
+def get_reaction_insert_row(user_id, reaction_type, reacted_at, post_id=None, comment_id=None):
+    """Values for REACTION_INSERT_COLUMNS; reaction types are stored as str(ReactionTypeEnum member)."""
+    return str(reaction_type), post_id, comment_id, connection.ops.adapt_datetimefield_value(reacted_at), user_id
+
+
+def get_hour_bucket(reacted_at):
+    return reacted_at.replace(minute=0, second=0, microsecond=0)
+
+
+def get_reaction_toggle_sql(target_field):
+    """
+    Inserts the reaction or, against the unique (reacted_by, post/comment) constraint, switches an existing reaction
+    of another type to it. Affects no row when the user already reacted with this type.
+    """
+    return get_reaction_insert_sql(
+        "ON CONFLICT (reacted_by_id, {0}) DO UPDATE SET reaction_type = excluded.reaction_type, "
+        "reacted_at = excluded.reacted_at WHERE reaction_type != excluded.reaction_type".format(target_field))
+
+
+def toggle_reaction(user_id, reaction_type, post_id=None, comment_id=None):
+    """
+    Adds the reaction, switches an existing reaction of another type to it, or removes it if the user already
+    reacted with this type, in at most two statements: the upsert, then a DELETE when it affected no row.
+    Concurrent clicks cannot create duplicates as the upsert relies on the unique constraints instead of a prior
+    read. The target's reaction_count, the hourly rollups and the post version are kept by the triggers of
+    migration 0010, in the same statements.
+    """
+    target_field, target_id = ('post_id', post_id) if post_id is not None else ('comment_id', comment_id)
+    row = get_reaction_insert_row(user_id, reaction_type, datetime.now(), post_id=post_id, comment_id=comment_id)
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(get_reaction_toggle_sql(target_field), row)
+        if cursor.rowcount == 0:
+            # The conflicting row cannot go away before the DELETE: on SQLite the upsert took the database write
+            # lock, held until commit, and other backends lock the conflicting row even when it is not updated
+            cursor.execute("DELETE FROM {} WHERE reacted_by_id = %s AND {} = %s AND reaction_type = %s".format(
+                connection.ops.quote_name(Reaction._meta.db_table), target_field),
+                [user_id, target_id, str(reaction_type)])
+
+
+# region Bulk ingestion
+
+def get_id_lookup_size(batch_size):
+    return min(batch_size, connection.features.max_query_params)
+
+
+def raise_exception_if_any_invalid_ids(model, ids, exception, batch_size):
+    ids = list(ids)
+    lookup_size = get_id_lookup_size(batch_size)
+    for start in range(0, len(ids), lookup_size):
+        batch = ids[start:start + lookup_size]
+        if len(batch) != model.objects.filter(id__in=batch).count():
+            raise exception
+
+
+def validate_reaction_events(events, batch_size):
+    user_ids = set()
+    target_ids = defaultdict(set)
+    for user_id, (target_type, target_id), reaction_type, _ in events:
+        if not isinstance(reaction_type, ReactionTypeEnum):
+            raise InvalidReactionTypeException
+        if target_type not in (ReactionTargetEnum.POST, ReactionTargetEnum.COMMENT):
+            raise InvalidPostException  # neither a post nor a comment
+        user_ids.add(user_id)
+        target_ids[target_type].add(target_id)
+
+    raise_exception_if_any_invalid_ids(User, user_ids, InvalidUserException, batch_size)
+    raise_exception_if_any_invalid_ids(Post, target_ids[ReactionTargetEnum.POST], InvalidPostException, batch_size)
+    raise_exception_if_any_invalid_ids(Comment, target_ids[ReactionTargetEnum.COMMENT], InvalidCommentException,
+                                       batch_size)
+
+
+def get_existing_reactions(keys):
+    """
+    Existing reactions keyed like the events: (user_id, (target_type, target_id)). The pairs are joined in as a
+    VALUES list, so each one is a single probe of the unique (reacted_by, post/comment) index.
+    """
+    existing_reactions = {}
+    table = connection.ops.quote_name(Reaction._meta.db_table)
+    pairs_per_query = EXISTING_REACTIONS_LOOKUP_SIZE
+
+    for target_type, target_field in ((ReactionTargetEnum.POST, 'post_id'),
+                                      (ReactionTargetEnum.COMMENT, 'comment_id')):
+        pairs = [(user_id, target_id) for user_id, (key_target_type, target_id) in keys
+                 if key_target_type == target_type]
+
+        for start in range(0, len(pairs), pairs_per_query):
+            batch = pairs[start:start + pairs_per_query]
+            sql = "WITH pairs (user_id, target_id) AS (VALUES {}) " \
+                  "SELECT reaction.* FROM {} AS reaction JOIN pairs " \
+                  "ON reaction.reacted_by_id = pairs.user_id AND reaction.{} = pairs.target_id".format(
+                      ", ".join(["(%s, %s)"] * len(batch)), table, target_field)
+            for reaction in Reaction.objects.raw(sql, [value for pair in batch for value in pair]):
+                existing_reactions[(reaction.reacted_by_id, (target_type, getattr(reaction, target_field)))] = reaction
+
+    return existing_reactions
+
+
+def collapse_reaction_events(events, existing_reactions):
+    """
+    Replays the toggle rules of toggle_reaction() per (user, target) in timestamp order and returns the final
+    (reaction_type, reacted_at) of every touched key, None where the user ends up not reacting.
+    """
+    final_states = {}
+    for user_id, target, reaction_type, reacted_at in sorted(events, key=lambda event: event[3]):
+        key = (user_id, target)
+        if key in final_states:
+            state = final_states[key]
+        else:
+            existing_reaction = existing_reactions.get(key)
+            state = None if existing_reaction is None \
+                else (existing_reaction.reaction_type, existing_reaction.reacted_at)
+
+        if state is not None and state[0] == str(reaction_type):
+            final_states[key] = None
+        else:
+            final_states[key] = (str(reaction_type), reacted_at)
+    return final_states
+
+
+def apply_reaction_events(events, batch_size):
+    validate_reaction_events(events, batch_size)
+    existing_reactions = get_existing_reactions({(user_id, target) for user_id, target, _, _ in events})
+
+    adapt_datetime = connection.ops.adapt_datetimefield_value
+    new_rows, changed_rows, removed_reaction_ids = [], [], []
+    for key, state in collapse_reaction_events(events, existing_reactions).items():
+        user_id, (target_type, target_id) = key
+        existing_reaction = existing_reactions.get(key)
+        existing_state = None if existing_reaction is None \
+            else (existing_reaction.reaction_type, existing_reaction.reacted_at)
+        if state == existing_state:
+            continue
+
+        if existing_reaction is None:
+            reaction_type, reacted_at = state
+            if target_type == ReactionTargetEnum.POST:
+                new_rows.append((reaction_type, target_id, None, adapt_datetime(reacted_at), user_id))
+            else:
+                new_rows.append((reaction_type, None, target_id, adapt_datetime(reacted_at), user_id))
+        elif state is None:
+            removed_reaction_ids.append(existing_reaction.id)
+        else:
+            reaction_type, reacted_at = state
+            changed_rows.append((reaction_type, adapt_datetime(reacted_at), existing_reaction.id))
+
+    lookup_size = get_id_lookup_size(batch_size)
+    for start in range(0, len(removed_reaction_ids), lookup_size):
+        Reaction.objects.filter(id__in=removed_reaction_ids[start:start + lookup_size]).delete()
+    # executemany of one prepared statement is far cheaper on SQLite than bulk_create's multi-row VALUES
+    # (capped at a few hundred rows each) or bulk_update's CASE expressions. Counters, rollups and post versions
+    # follow the rows through the reaction triggers
+    with connection.cursor() as cursor:
+        cursor.executemany("UPDATE {} SET reaction_type = %s, reacted_at = %s WHERE id = %s".format(
+            connection.ops.quote_name(Reaction._meta.db_table)), changed_rows)
+        cursor.executemany(get_reaction_insert_sql(), new_rows)
+
+
+def react_bulk(events, batch_size=BULK_CHUNK_SIZE):
+    """
+    Replays reaction events, e.g. from an event log, with the same toggle rules as react_to_post and
+    react_to_comment.
+
+    `events` is an iterable of (user_id, (ReactionTargetEnum, target_id), ReactionTypeEnum, reacted_at) tuples.
+    It is consumed in chunks of `batch_size` events. Each chunk is validated with id__in queries per model that
+    stay within the database's bound parameter limit (999 on SQLite), collapsed per (user, target) in memory and
+    written with bulk statements. An event whose target is neither a post nor a comment raises InvalidPostException.
+    Everything is applied in a single transaction, so an invalid event anywhere leaves the database untouched.
+    """
+    events = iter(events)
+    with transaction.atomic():
+        while True:
+            chunk = list(islice(events, batch_size))
+            if not chunk:
+                break
+            apply_reaction_events(chunk, batch_size)
+            post_ids = [target_id for _, (target_type, target_id), _, _ in chunk
+                        if target_type == ReactionTargetEnum.POST]
+            comment_ids = [target_id for _, (target_type, target_id), _, _ in chunk
+                           if target_type == ReactionTargetEnum.COMMENT]
+            refresh_group_feed_entries(post_ids)
+            refresh_group_feed_entries_of_comments(comment_ids)
+    forget_all()
+
+# endregion
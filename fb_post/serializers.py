@@ -0,0 +1,167 @@
+from collections import defaultdict
+
+from django.db.models import Q
+from django.db.models.query import QuerySet
+
+from .models import Comment, Reaction
+
+
+# Every page of posts is rendered from three queries, however many posts, comments or replies it holds:
+# the posts (with author and group joined), one flat query for all of their comments and replies, and one
+# query for the reactions on both. The comment tree is then assembled in Python.
+
+def get_user_dict(user):
+    return {
+        "user_id": user.id,
+        "name": user.name,
+        "profile_pic": user.profile_pic
+    }
+
+
+def get_comment_dict(comment, reaction_types):
+    return {
+        "comment_id": comment.id,
+        "commenter": get_user_dict(comment.commented_by),
+        "commented_at": str(comment.commented_at),
+        "comment_content": comment.content,
+        "reactions": {
+            "count": comment.reaction_count,
+            "type": reaction_types
+        }
+    }
+
+
+def copy_comment_dict(comment_dict):
+    copied_comment_dict = {
+        **comment_dict,
+        "commenter": dict(comment_dict["commenter"]),
+        "reactions": {**comment_dict["reactions"], "type": list(comment_dict["reactions"]["type"])}
+    }
+    if "replies" in comment_dict:
+        copied_comment_dict["replies"] = [copy_comment_dict(reply_dict) for reply_dict in comment_dict["replies"]]
+    return copied_comment_dict
+
+
+def copy_post_details(post_details):
+    """
+    A copy of a post details dict that shares no dict or list with it. Following the known shape, it is several
+    times cheaper than copy.deepcopy() or a JSON round trip of the dict.
+    """
+    return {
+        **post_details,
+        "posted_by": dict(post_details["posted_by"]),
+        "reactions": {**post_details["reactions"], "type": list(post_details["reactions"]["type"])},
+        "group": None if post_details["group"] is None else dict(post_details["group"]),
+        "comments": [copy_comment_dict(comment_dict) for comment_dict in post_details["comments"]]
+    }
+
+
+def get_reaction_types_by_target(post_ids):
+    post_reaction_types = defaultdict(list)
+    comment_reaction_types = defaultdict(list)
+
+    # comment_id IN (subquery) rather than a join on comment__post_id: with both sides of the OR on indexed
+    # reaction columns, SQLite looks each up through its index instead of scanning every reaction
+    comment_ids = Comment.objects.filter(post_id__in=post_ids).values('id')
+    reactions = Reaction.objects.filter(Q(post_id__in=post_ids) | Q(comment_id__in=comment_ids)) \
+        .order_by('id').values_list('post_id', 'comment_id', 'reaction_type')
+
+    for post_id, comment_id, reaction_type in reactions:
+        if post_id is not None:
+            post_reaction_types[post_id].append(reaction_type)
+        else:
+            comment_reaction_types[comment_id].append(reaction_type)
+
+    return post_reaction_types, comment_reaction_types
+
+
+def get_reaction_dict(reaction):
+    # reaction_type holds str(ReactionTypeEnum.X)
+    return {
+        "user_id": reaction.reacted_by_id,
+        "name": reaction.reacted_by.name,
+        "profile_pic": reaction.reacted_by.profile_pic,
+        "reaction": reaction.reaction_type.rpartition(".")[2]
+    }
+
+
+def get_comments_of_posts(post_ids):
+    return list(Comment.objects.filter(post_id__in=post_ids).select_related('commented_by').order_by('id'))
+
+
+def get_comment_trees_by_post(comments, comment_reaction_types):
+    top_level_comment_dicts = {}
+    top_level_comment_ids = {}
+    comments_by_post = defaultdict(list)
+    for comment in comments:
+        comment_dict = get_comment_dict(comment, comment_reaction_types[comment.id])
+
+        if comment.parent_comment_id is None:
+            comment_dict["replies_count"] = comment.reply_count
+            comment_dict["replies"] = []
+            top_level_comment_dicts[comment.id] = comment_dict
+            top_level_comment_ids[comment.id] = comment.id
+            comments_by_post[comment.post_id].append(comment_dict)
+            continue
+
+        # reply_to_comment() replies to the top-level comment, but a reply to a reply stored otherwise is listed
+        # under the top-level comment it descends from. Parents have smaller ids and are therefore seen first;
+        # replies whose parent is not among `comments` are left out.
+        top_level_comment_id = top_level_comment_ids.get(comment.parent_comment_id)
+        if top_level_comment_id is not None:
+            top_level_comment_ids[comment.id] = top_level_comment_id
+            top_level_comment_dicts[top_level_comment_id]["replies"].append(comment_dict)
+
+    return comments_by_post
+
+
+def get_post_details_list(posts):
+    """
+    Serializes posts into post details dicts.
+
+    `posts` may be a Post queryset, in which case author and group are joined in, or an iterable of Post
+    objects whose posted_by and group are already loaded.
+    """
+    if isinstance(posts, QuerySet):
+        posts = posts.select_related('posted_by', 'group')
+    posts = list(posts)
+
+    if not posts:
+        return []
+
+    post_ids = [post.id for post in posts]
+    post_reaction_types, comment_reaction_types = get_reaction_types_by_target(post_ids)
+    return build_post_details_list(posts, post_reaction_types, comment_reaction_types,
+                                   get_comments_of_posts(post_ids))
+
+
+def build_post_details_list(posts, post_reaction_types, comment_reaction_types, comments):
+    """Assembles post details from what get_reaction_types_by_target() and get_comments_of_posts() fetched."""
+    comments_by_post = get_comment_trees_by_post(comments, comment_reaction_types)
+
+    post_details_list = []
+    for post in posts:
+        post_details_dict = {
+            "post_id": post.id,
+            "posted_by": get_user_dict(post.posted_by),
+            "posted_at": str(post.posted_at),
+            "posted_content": post.content,
+            "reactions": {
+                "count": post.reaction_count,
+                "type": post_reaction_types[post.id]
+            }
+        }
+
+        if post.group_id is None:
+            post_details_dict["group"] = None
+        else:
+            post_details_dict["group"] = {
+                "group_id": post.group_id,
+                "name": post.group.name
+            }
+
+        post_details_dict["comments"] = comments_by_post[post.id]
+        post_details_dict["comments_count"] = post.comment_count
+        post_details_list.append(post_details_dict)
+
+    return post_details_list
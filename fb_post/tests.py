@@ -1,3 +1,828 @@
-from django.test import TestCase
+import asyncio
+import base64
+import json
+import tempfile
+import threading
+from datetime import datetime, timedelta
+from io import StringIO
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Count
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from .assignment_6_utils import create_post, create_comment, reply_to_comment, react_to_post, react_to_comment, \
+    get_post, get_user_posts, get_total_reaction_count, get_reaction_metrics, get_reaction_metrics_for_last_hours, \
+    get_posts_with_more_positive_reactions, delete_post, iter_user_posts, get_reactions_to_post
+from assignments.instrumentation import flush_metrics, instrument, is_instrumented_util, load_metrics, \
+    reset_metrics
+from . import assignment_6_utils
+
+from .assignment_7_utils import create_group, add_member_to_group, remove_member_from_group, make_member_as_admin, \
+    get_group_feed
+from .assignment_8_utils import get_group_feed_by_cursor, iter_user_post
+from .async_reads import get_post_async, get_group_feed_async, get_user_posts_async, get_reactions_to_post_async
+from .constants import ReactionTargetEnum, ReactionTypeEnum
+from .exceptions import InvalidPostException, InvalidCommentException, InvalidCursorException, \
+    InvalidLimitSetValueException, InvalidReactionTypeException, InvalidUserException, InvalidMemberException, \
+    InvalidGroupException, UserNotInGroupException, UserIsNotAdminException
+from .group_feed import find_group_feed_inconsistencies
+from .models import User, Post, Comment, Membership, Reaction, ReactionRollup, GroupFeedEntry
+from .post_cache import get_post_details_cache_stats, reset_post_details_cache, warm_post_details, \
+    post_details_lru
+from .reactions import react_bulk
+from .serializers import get_post_details_list
+from .validation_cache import get_remembered, validation_scope
+
+
+class FeedSerializerQueryCountTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(name="User 1", profile_pic="https://pics.example.com/1.png")
+        self.friend = User.objects.create(name="User 2", profile_pic="https://pics.example.com/2.png")
+        self.group_id = create_group(self.user.id, "Group 1", [self.friend.id])
+
+    def create_posts(self, number_of_posts):
+        post_ids = []
+        for index in range(number_of_posts):
+            post_id = create_post(self.user.id, "Post {}".format(index), self.group_id)
+            comment_id = create_comment(self.friend.id, post_id, "Comment")
+            reply_to_comment(self.user.id, comment_id, "Reply")
+            react_to_post(self.friend.id, post_id, ReactionTypeEnum.LOVE)
+            react_to_comment(self.user.id, comment_id, ReactionTypeEnum.HAHA)
+            post_ids.append(post_id)
+        return post_ids
+
+    def test_get_post_builds_comment_tree(self):
+        post_id = self.create_posts(1)[0]
+
+        with self.assertNumQueries(3):
+            post_details = get_post(post_id)
+
+        self.assertEqual(post_details["reactions"], {"count": 1, "type": [str(ReactionTypeEnum.LOVE)]})
+        self.assertEqual(post_details["comments_count"], 2)
+        self.assertEqual(len(post_details["comments"]), 1)
+        comment = post_details["comments"][0]
+        self.assertEqual(comment["reactions"], {"count": 1, "type": [str(ReactionTypeEnum.HAHA)]})
+        self.assertEqual(comment["replies_count"], 1)
+        self.assertEqual(comment["replies"][0]["comment_content"], "Reply")
+
+    def test_reply_to_reply_is_listed_under_its_top_level_comment(self):
+        post_id = self.create_posts(1)[0]
+        comment = Comment.objects.get(post_id=post_id, parent_comment__isnull=True)
+        reply = Comment.objects.get(parent_comment=comment)
+        Comment.objects.create(content="Reply to reply", commented_at=datetime.now(), commented_by=self.friend,
+                               post_id=post_id, parent_comment=reply)
+
+        post_details = get_post(post_id)
+
+        self.assertEqual(len(post_details["comments"]), 1)
+        self.assertEqual([reply["comment_content"] for reply in post_details["comments"][0]["replies"]],
+                         ["Reply", "Reply to reply"])
+
+    def test_user_posts_query_count_does_not_grow_with_posts(self):
+        self.create_posts(1)
+        with self.assertNumQueries(4):
+            self.assertEqual(len(get_user_posts(self.user.id)), 1)
+
+        self.create_posts(30)
+        with self.assertNumQueries(4):
+            self.assertEqual(len(get_user_posts(self.user.id)), 31)
+
+    def test_group_feed_query_count_does_not_grow_with_limit(self):
+        self.create_posts(30)
+
+        with self.assertNumQueries(6):
+            self.assertEqual(len(get_group_feed(self.user.id, self.group_id, 0, 1)), 1)
+        with self.assertNumQueries(6):
+            self.assertEqual(len(get_group_feed(self.user.id, self.group_id, 0, 30)), 30)
+
+
+class UserPostsIteratorTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(name="User 1", profile_pic="https://pics.example.com/1.png")
+        self.post_ids = []
+        for index in range(5):
+            post_id = create_post(self.user.id, "Post {}".format(index))
+            create_comment(self.user.id, post_id, "Comment")
+            self.post_ids.append(post_id)
+        # Posts sharing a posted_at are ordered by id
+        Post.objects.filter(id__in=self.post_ids[1:4]).update(posted_at=datetime(2023, 1, 1))
+        Post.objects.filter(id=self.post_ids[0]).update(posted_at=datetime(2022, 1, 1))
+
+    def test_chunks_are_fetched_one_at_a_time_and_resume_from_cursor(self):
+        pages = iter_user_posts(self.user.id, chunk_size=2)
+        with self.assertNumQueries(3):
+            first_page = next(pages)
+        self.assertEqual([post["post_id"] for post in first_page["posts"]], self.post_ids[:2])
+        self.assertEqual(first_page["posts"][0]["comments_count"], 1)
+        with self.assertNumQueries(6):
+            rest = list(pages)
+        self.assertEqual([[post["post_id"] for post in page["posts"]] for page in rest],
+                         [self.post_ids[2:4], self.post_ids[4:]])
+
+        resumed = list(iter_user_posts(self.user.id, chunk_size=2, cursor=first_page["next_cursor"]))
+        self.assertEqual([post["post_id"] for page in resumed for post in page["posts"]], self.post_ids[2:])
+
+        newer_post_id = create_post(self.user.id, "Newer post")
+        resumed = list(iter_user_posts(self.user.id, cursor=rest[-1]["next_cursor"]))
+        self.assertEqual([post["post_id"] for page in resumed for post in page["posts"]], [newer_post_id])
+
+    def test_invalid_arguments_raise_before_iterating(self):
+        with self.assertRaises(InvalidCursorException):
+            iter_user_posts(self.user.id, cursor="not a cursor")
+        with self.assertRaises(InvalidLimitSetValueException):
+            iter_user_posts(self.user.id, chunk_size=0)
+        with self.assertRaises(InvalidUserException):
+            iter_user_post(0)
+
+    def test_pages_are_read_after_the_validation_scope_closed(self):
+        for iterate in (iter_user_posts, iter_user_post):
+            pages = iterate(self.user.id, chunk_size=2)
+            # Only the posts, comments and reactions of the page; the user was validated by the call
+            with self.assertNumQueries(3):
+                next(pages)
+            self.assertIsNone(get_remembered(User, self.user.id))
+            self.assertEqual(len(list(pages)), 2)
+
+
+class GroupFeedCursorTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(name="User 1", profile_pic="https://pics.example.com/1.png")
+        self.group_id = create_group(self.user.id, "Group 1", [])
+        post_ids = [create_post(self.user.id, "Post {}".format(index), self.group_id) for index in range(5)]
+        # Posts sharing a posted_at are ordered by id, newest first
+        Post.objects.filter(id__in=post_ids[1:4]).update(posted_at=datetime(2023, 1, 1))
+        Post.objects.filter(id=post_ids[0]).update(posted_at=datetime(2022, 1, 1))
+        self.feed_post_ids = [post_ids[4], post_ids[3], post_ids[2], post_ids[1], post_ids[0]]
+
+    def read_feed(self, limit, cursor=None, between_pages=lambda: None):
+        post_ids, pages = [], []
+        while True:
+            page = get_group_feed_by_cursor(self.user.id, self.group_id, limit, cursor)
+            pages.append(page)
+            post_ids.extend(post["post_id"] for post in page["posts"])
+            cursor = page["next_cursor"]
+            if cursor is None:
+                return post_ids, pages
+            between_pages()
+
+    def test_pages_are_ordered_by_posted_at_then_id(self):
+        post_ids, pages = self.read_feed(limit=2)
+
+        self.assertEqual(post_ids, self.feed_post_ids)
+        self.assertEqual([len(page["posts"]) for page in pages], [2, 2, 1])
+
+    def test_last_page_has_no_cursor(self):
+        page = get_group_feed_by_cursor(self.user.id, self.group_id, 5)
+        self.assertEqual([post["post_id"] for post in page["posts"]], self.feed_post_ids)
+        self.assertIsNone(page["next_cursor"])
+
+        post_ids, pages = self.read_feed(limit=1)
+        self.assertEqual(post_ids, self.feed_post_ids)
+        self.assertIsNone(pages[-1]["next_cursor"])
+        self.assertEqual(len(pages[-1]["posts"]), 1)
+
+    def test_empty_group(self):
+        group_id = create_group(self.user.id, "Group 2", [])
+
+        self.assertEqual(get_group_feed_by_cursor(self.user.id, group_id, 10), {"posts": [], "next_cursor": None})
+
+    def test_invalid_or_tampered_cursor(self):
+        tampered_cursors = ["not a cursor", 123, base64.urlsafe_b64encode(b"2023-01-01T00:00:00").decode(),
+                            base64.urlsafe_b64encode(b"2023-01-01T00:00:00|not an id").decode(),
+                            base64.urlsafe_b64encode(b"not a date|1").decode(),
+                            base64.urlsafe_b64encode(b"\xff\xfe").decode()]
+        for cursor in tampered_cursors:
+            with self.assertRaises(InvalidCursorException):
+                get_group_feed_by_cursor(self.user.id, self.group_id, 2, cursor)
+
+    def test_posts_inserted_between_pages_are_neither_repeated_nor_skipped_below_the_cursor(self):
+        inserted_post_ids = []
+
+        def insert_posts():
+            newer_post_id = create_post(self.user.id, "Newer post", self.group_id)
+            older_post_id = create_post(self.user.id, "Older post", self.group_id)
+            Post.objects.filter(id=older_post_id).update(
+                posted_at=datetime(2021, 1, 1) - timedelta(days=len(inserted_post_ids)))
+            inserted_post_ids.append((newer_post_id, older_post_id))
+
+        post_ids, _ = self.read_feed(limit=2, between_pages=insert_posts)
+
+        # Posts newer than the cursor belong to pages already read; older ones are still ahead of it
+        self.assertEqual(post_ids, self.feed_post_ids + [older_post_id for _, older_post_id in inserted_post_ids])
+
+
+class UtilInstrumentationTests(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        settings_override = override_settings(UTIL_INSTRUMENTATION_DIRECTORY=self.directory.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.addCleanup(reset_metrics)
+        reset_metrics()
+        self.user = User.objects.create(name="User 1", profile_pic="https://pics.example.com/1.png")
+        self.post_id = create_post(self.user.id, "Post")
+        create_comment(self.user.id, self.post_id, "Comment")
+
+    def test_calls_are_recorded_and_dumped(self):
+        instrumented_get_post = instrument(get_post, "fb_post.get_post")
+        for _ in range(2):
+            self.assertEqual(instrumented_get_post(self.post_id)["comments_count"], 1)
+        with self.assertRaises(InvalidPostException):
+            instrumented_get_post(0)
+        flush_metrics()
+
+        out = StringIO()
+        call_command("dump_util_metrics", "--json", stdout=out)
+        metrics = json.loads(out.getvalue())["fb_post.get_post"]
+        self.assertEqual((metrics["calls"], metrics["errors"]), (3, 1))
+        # post with author and group, comments, reactions; the invalid id stops after the post lookup
+        self.assertEqual(metrics["queries"]["sum"], 7)
+        self.assertEqual(metrics["queries"]["max"], 3)
+        self.assertEqual(metrics["rows"]["sum"], 4)
+        self.assertGreater(metrics["wall_ms"]["sum"], metrics["sql_ms"]["sum"])
+
+        out = StringIO()
+        call_command("dump_util_metrics", stdout=out)
+        self.assertIn("fb_post.get_post", out.getvalue())
+
+    def test_generators_are_recorded_with_their_iteration(self):
+        instrumented_iter_user_posts = instrument(iter_user_posts, "fb_post.iter_user_posts")
+        for post_index in range(2):
+            create_post(self.user.id, "Post {}".format(post_index))
+        pages = instrumented_iter_user_posts(self.user.id, chunk_size=2)
+        next(pages)
+        pages.close()
+        list(instrumented_iter_user_posts(self.user.id, chunk_size=2))
+        flush_metrics()
+
+        metrics = load_metrics(0, self.directory.name)["fb_post.iter_user_posts"]
+        self.assertEqual((metrics["calls"], metrics["errors"]), (2, 0))
+        # per call the user, then posts, comments and reactions per page: one page, then both pages
+        self.assertEqual(metrics["queries"]["sum"], (1 + 3) + (1 + 3 + 3))
+
+    def test_validators_are_not_instrumented(self):
+        self.assertTrue(is_instrumented_util(assignment_6_utils, "get_post", assignment_6_utils.get_post))
+        self.assertFalse(is_instrumented_util(assignment_6_utils, "raise_exception_if_invalid_user_id",
+                                              assignment_6_utils.raise_exception_if_invalid_user_id))
+
+
+class ValidationScopeTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(name="User 1", profile_pic="https://pics.example.com/1.png")
+        self.friend = User.objects.create(name="User 2", profile_pic="https://pics.example.com/2.png")
+        self.group_id = create_group(self.user.id, "Group 1", [self.friend.id])
+        self.post_id = create_post(self.user.id, "Post", self.group_id)
+
+    def test_entities_are_validated_once_per_scope(self):
+        with validation_scope():
+            get_group_feed(self.user.id, self.group_id, 0, 10)
+            # user, group and membership are already known, only the feed itself is read
+            with self.assertNumQueries(3):
+                get_group_feed(self.user.id, self.group_id, 0, 10)
+
+    def test_writes_invalidate_remembered_posts(self):
+        with validation_scope():
+            self.assertEqual(get_post(self.post_id)["comments_count"], 0)
+            comment_id = create_comment(self.friend.id, self.post_id, "Comment")
+            reply_to_comment(self.user.id, comment_id, "Reply")
+            react_to_post(self.friend.id, self.post_id, ReactionTypeEnum.LOVE)
+
+            post_details = get_post(self.post_id)
+
+        self.assertEqual(post_details["comments_count"], 2)
+        self.assertEqual(post_details["reactions"]["count"], 1)
+        self.assertEqual(post_details["comments"][0]["replies_count"], 1)
+
+
+class GroupMembershipTests(TestCase):
+
+    def setUp(self):
+        self.admin, self.member, self.outsider = [
+            User.objects.create(name="User {}".format(index), profile_pic="https://pics.example.com/u.png")
+            for index in range(3)]
+        self.group_id = create_group(self.admin.id, "Group 1", [self.member.id, self.admin.id, self.member.id])
+
+    def get_memberships(self, group_id=None):
+        return list(Membership.objects.filter(group_id=group_id or self.group_id).order_by('member_id')
+                    .values_list('member_id', 'is_admin'))
+
+    def assert_rejects_invalid_arguments(self, function, member_id):
+        for arguments, exception in (((-1, member_id, self.group_id), InvalidUserException),
+                                     ((self.admin.id, -1, self.group_id), InvalidMemberException),
+                                     ((self.admin.id, member_id, -1), InvalidGroupException),
+                                     ((self.outsider.id, member_id, self.group_id), UserNotInGroupException)):
+            with self.assertRaises(exception):
+                function(*arguments)
+
+    def test_create_group_adds_creator_once_as_admin(self):
+        self.assertEqual(self.get_memberships(), [(self.admin.id, True), (self.member.id, False)])
+
+        # The creator, the members, the group and one insert of every membership
+        with self.assertNumQueries(4):
+            group_id = create_group(self.admin.id, "Group 2", [self.member.id, self.outsider.id])
+        self.assertEqual(self.get_memberships(group_id),
+                         [(self.admin.id, True), (self.member.id, False), (self.outsider.id, False)])
+
+    def test_add_member_to_group(self):
+        self.assert_rejects_invalid_arguments(add_member_to_group, self.outsider.id)
+        with self.assertRaises(UserIsNotAdminException):
+            add_member_to_group(self.member.id, self.outsider.id, self.group_id)
+
+        # The user, the new member, the group, both users' memberships in one query and the insert
+        with self.assertNumQueries(5):
+            add_member_to_group(self.admin.id, self.outsider.id, self.group_id)
+        with self.assertNumQueries(4):
+            add_member_to_group(self.admin.id, self.outsider.id, self.group_id)
+        self.assertEqual(self.get_memberships(),
+                         [(self.admin.id, True), (self.member.id, False), (self.outsider.id, False)])
+
+    def test_remove_member_from_group(self):
+        self.assert_rejects_invalid_arguments(remove_member_from_group, self.member.id)
+        with self.assertRaises(UserNotInGroupException):
+            remove_member_from_group(self.admin.id, self.outsider.id, self.group_id)
+        with self.assertRaises(UserIsNotAdminException):
+            remove_member_from_group(self.member.id, self.admin.id, self.group_id)
+
+        with self.assertNumQueries(5):
+            remove_member_from_group(self.admin.id, self.member.id, self.group_id)
+        self.assertEqual(self.get_memberships(), [(self.admin.id, True)])
+
+    def test_make_member_as_admin(self):
+        self.assert_rejects_invalid_arguments(make_member_as_admin, self.member.id)
+        with self.assertRaises(UserNotInGroupException):
+            make_member_as_admin(self.admin.id, self.outsider.id, self.group_id)
+        with self.assertRaises(UserIsNotAdminException):
+            make_member_as_admin(self.member.id, self.admin.id, self.group_id)
+
+        with self.assertNumQueries(5):
+            make_member_as_admin(self.admin.id, self.member.id, self.group_id)
+        with self.assertNumQueries(4):
+            make_member_as_admin(self.admin.id, self.member.id, self.group_id)
+        self.assertEqual(self.get_memberships(), [(self.admin.id, True), (self.member.id, True)])
+
+
+@override_settings(FB_POST_MATERIALIZED_GROUP_FEED=True)
+class MaterializedGroupFeedTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(name="User 1", profile_pic="https://pics.example.com/1.png")
+        self.friend = User.objects.create(name="User 2", profile_pic="https://pics.example.com/2.png")
+        self.group_id = create_group(self.user.id, "Group 1", [self.friend.id])
+
+    def get_live_group_feed(self, offset, limit):
+        with self.settings(FB_POST_MATERIALIZED_GROUP_FEED=False):
+            return get_group_feed(self.user.id, self.group_id, offset, limit)
+
+    def test_writes_keep_feed_in_step_with_live_query(self):
+        post_ids = [create_post(self.user.id, "Post {}".format(index), self.group_id) for index in range(3)]
+        create_post(self.user.id, "Not in a group")
+        comment_id = create_comment(self.friend.id, post_ids[0], "Comment")
+        reply_to_comment(self.user.id, comment_id, "Reply")
+        react_to_post(self.friend.id, post_ids[1], ReactionTypeEnum.LOVE)
+        react_to_comment(self.user.id, comment_id, ReactionTypeEnum.HAHA)
+        react_bulk([(self.user.id, (ReactionTargetEnum.POST, post_ids[2]), ReactionTypeEnum.WOW, datetime.now())])
+
+        self.assertEqual(GroupFeedEntry.objects.count(), 3)
+        self.assertEqual(find_group_feed_inconsistencies(), [])
+        with self.assertNumQueries(4):
+            materialized_feed = get_group_feed(self.user.id, self.group_id, 1, 2)
+        self.assertEqual(materialized_feed, self.get_live_group_feed(1, 2))
+
+    def test_groups_without_entries_are_read_live_until_rebuilt(self):
+        with self.settings(FB_POST_MATERIALIZED_GROUP_FEED=False):
+            for index in range(3):
+                create_post(self.user.id, "Post {}".format(index), self.group_id)
+
+        self.assertFalse(GroupFeedEntry.objects.exists())
+        self.assertEqual(get_group_feed(self.user.id, self.group_id, 1, 2), self.get_live_group_feed(1, 2))
+        self.assertEqual(get_group_feed(self.user.id, self.group_id, 5, 2), [])
+
+        call_command('rebuild_group_feed', stdout=StringIO())
+        with self.assertNumQueries(4):
+            materialized_feed = get_group_feed(self.user.id, self.group_id, 0, 10)
+        self.assertEqual(materialized_feed, self.get_live_group_feed(0, 10))
+
+    def test_checker_reports_and_rebuild_repairs_entries(self):
+        stale_post_id = create_post(self.user.id, "Post 1", self.group_id)
+        missing_post_id = create_post(self.user.id, "Post 2", self.group_id)
+        GroupFeedEntry.objects.filter(post_id=stale_post_id).update(payload="{}")
+        GroupFeedEntry.objects.filter(post_id=missing_post_id).delete()
+
+        self.assertEqual(find_group_feed_inconsistencies(), [(stale_post_id, "stale"), (missing_post_id, "missing")])
+
+        call_command('rebuild_group_feed', stdout=StringIO())
+        self.assertEqual(find_group_feed_inconsistencies(), [])
+        self.assertEqual(get_group_feed(self.user.id, self.group_id, 0, 10), self.get_live_group_feed(0, 10))
+
+
+class CounterTests(TestCase):
+
+    def setUp(self):
+        self.users = [User.objects.create(name="User {}".format(index), profile_pic="https://pics.example.com/u.png")
+                      for index in range(2)]
+        self.post_id = create_post(self.users[0].id, "Post")
+        self.other_post_id = create_post(self.users[1].id, "Other post")
+
+    def get_counters(self):
+        return (list(Post.objects.order_by('id').values_list('id', 'reaction_count', 'comment_count')),
+                list(Comment.objects.order_by('id').values_list('id', 'reaction_count', 'reply_count')))
+
+    def get_counts(self):
+        return (list(Post.objects.order_by('id').annotate(number_of_reactions=Count('reaction', distinct=True),
+                                                          number_of_comments=Count('comments', distinct=True))
+                     .values_list('id', 'number_of_reactions', 'number_of_comments')),
+                list(Comment.objects.order_by('id').annotate(number_of_reactions=Count('reaction', distinct=True),
+                                                             number_of_replies=Count('replies', distinct=True))
+                     .values_list('id', 'number_of_reactions', 'number_of_replies')))
+
+    def assert_counters_match_counts(self):
+        self.assertEqual(self.get_counters(), self.get_counts())
+
+    def test_counters_follow_every_write(self):
+        user_id, other_user_id = self.users[0].id, self.users[1].id
+        for write in (lambda: react_to_post(user_id, self.post_id, ReactionTypeEnum.LOVE),
+                      lambda: react_to_post(other_user_id, self.post_id, ReactionTypeEnum.LOVE),
+                      lambda: react_to_post(user_id, self.post_id, ReactionTypeEnum.WOW),
+                      lambda: react_to_post(other_user_id, self.post_id, ReactionTypeEnum.LOVE),
+                      lambda: create_comment(other_user_id, self.post_id, "Comment"),
+                      lambda: create_comment(user_id, self.other_post_id, "Other comment"),
+                      lambda: reply_to_comment(user_id, Comment.objects.earliest('id').id, "Reply"),
+                      lambda: react_to_comment(user_id, Comment.objects.earliest('id').id, ReactionTypeEnum.HAHA),
+                      lambda: react_to_comment(other_user_id, Comment.objects.latest('id').id, ReactionTypeEnum.SAD),
+                      lambda: react_to_comment(user_id, Comment.objects.earliest('id').id, ReactionTypeEnum.HAHA),
+                      lambda: delete_post(user_id, self.post_id)):
+            write()
+            self.assert_counters_match_counts()
+
+        self.assertEqual(self.get_counters(), ([(self.other_post_id, 0, 1)], [(Comment.objects.get().id, 0, 0)]))
+
+    def test_rebuild_counters_repairs_drift(self):
+        react_to_post(self.users[1].id, self.post_id, ReactionTypeEnum.LOVE)
+        comment_id = create_comment(self.users[1].id, self.post_id, "Comment")
+        reply_to_comment(self.users[0].id, comment_id, "Reply")
+        react_to_comment(self.users[0].id, comment_id, ReactionTypeEnum.HAHA)
+        counters = self.get_counters()
+        Post.objects.update(reaction_count=7, comment_count=0)
+        Comment.objects.update(reaction_count=5, reply_count=3)
+
+        call_command('rebuild_counters', stdout=StringIO())
+
+        self.assertEqual(self.get_counters(), counters)
+        self.assert_counters_match_counts()
+
+
+class ReactionRollupTests(TestCase):
+
+    def setUp(self):
+        self.users = [User.objects.create(name="User {}".format(index), profile_pic="https://pics.example.com/u.png")
+                      for index in range(3)]
+        self.post_id = create_post(self.users[0].id, "Post")
+        self.other_post_id = create_post(self.users[0].id, "Other post")
+
+    def test_metrics_follow_added_switched_and_removed_reactions(self):
+        react_to_post(self.users[0].id, self.post_id, ReactionTypeEnum.LOVE)
+        react_to_post(self.users[1].id, self.post_id, ReactionTypeEnum.SAD)
+        react_to_post(self.users[1].id, self.post_id, ReactionTypeEnum.WOW)
+        react_to_post(self.users[2].id, self.post_id, ReactionTypeEnum.SAD)
+        react_to_post(self.users[2].id, self.post_id, ReactionTypeEnum.SAD)
+        react_to_post(self.users[0].id, self.other_post_id, ReactionTypeEnum.ANGRY)
+
+        self.assertEqual(get_total_reaction_count(), {"count": 3})
+        self.assertEqual(get_reaction_metrics(self.post_id),
+                         {str(ReactionTypeEnum.LOVE): 1, str(ReactionTypeEnum.WOW): 1})
+        self.assertEqual(get_posts_with_more_positive_reactions(), [self.post_id])
+
+    def get_write_statements(self, captured_queries):
+        return [query['sql'] for query in captured_queries
+                if not query['sql'].startswith(('SELECT', 'SAVEPOINT', 'RELEASE SAVEPOINT'))]
+
+    def test_each_click_writes_at_most_two_statements(self):
+        user_id = self.users[1].id
+        # The upsert that adds the reaction
+        with CaptureQueriesContext(connection) as captured_queries:
+            react_to_post(user_id, self.post_id, ReactionTypeEnum.LOVE)
+        self.assertEqual(len(self.get_write_statements(captured_queries)), 1)
+        # The upsert that switches it
+        with CaptureQueriesContext(connection) as captured_queries:
+            react_to_post(user_id, self.post_id, ReactionTypeEnum.WOW)
+        self.assertEqual(len(self.get_write_statements(captured_queries)), 1)
+        self.assertEqual(get_reaction_metrics(self.post_id), {str(ReactionTypeEnum.WOW): 1})
+        # The upsert that affects no row and the delete
+        with CaptureQueriesContext(connection) as captured_queries:
+            react_to_post(user_id, self.post_id, ReactionTypeEnum.WOW)
+        self.assertEqual(len(self.get_write_statements(captured_queries)), 2)
+
+        post = Post.objects.get(id=self.post_id)
+        self.assertEqual((post.reaction_count, post.version), (0, 3))
+        self.assertEqual(get_reaction_metrics(self.post_id), {})
+
+    def test_comment_reactions_bump_the_post_version(self):
+        comment_id = create_comment(self.users[0].id, self.post_id, "First")
+        version = Post.objects.get(id=self.post_id).version
+
+        react_to_comment(self.users[1].id, comment_id, ReactionTypeEnum.HAHA)
+
+        self.assertEqual(Comment.objects.get(id=comment_id).reaction_count, 1)
+        self.assertEqual(Post.objects.get(id=self.post_id).version, version + 1)
+        rollups = ReactionRollup.objects.filter(comment_id=comment_id)
+        self.assertEqual(list(rollups.values_list('reaction_type', 'count')), [(str(ReactionTypeEnum.HAHA), 1)])
+
+    def test_windowed_metrics_only_count_recent_hours(self):
+        now = datetime.now()
+        react_bulk([(self.users[0].id, (ReactionTargetEnum.POST, self.post_id), ReactionTypeEnum.LIT, now),
+                    (self.users[1].id, (ReactionTargetEnum.POST, self.post_id), ReactionTypeEnum.LIT,
+                     now - timedelta(hours=3)),
+                    (self.users[2].id, (ReactionTargetEnum.POST, self.post_id), ReactionTypeEnum.SAD,
+                     now - timedelta(days=2))])
+
+        self.assertEqual(get_reaction_metrics_for_last_hours(self.post_id, 1), {str(ReactionTypeEnum.LIT): 1})
+        self.assertEqual(get_reaction_metrics_for_last_hours(self.post_id, 4), {str(ReactionTypeEnum.LIT): 2})
+        self.assertEqual(get_reaction_metrics(self.post_id),
+                         {str(ReactionTypeEnum.LIT): 2, str(ReactionTypeEnum.SAD): 1})
+        # the post's validation and one read of its rollups
+        with self.assertNumQueries(2):
+            get_reaction_metrics_for_last_hours(self.post_id, 24)
+
+    def test_rebuild_counters_recreates_rollups(self):
+        react_to_post(self.users[0].id, self.post_id, ReactionTypeEnum.LOVE)
+        react_to_post(self.users[1].id, self.post_id, ReactionTypeEnum.LOVE)
+        ReactionRollup.objects.all().delete()
+
+        call_command('rebuild_counters', stdout=StringIO())
+
+        self.assertEqual(get_reaction_metrics(self.post_id), {str(ReactionTypeEnum.LOVE): 2})
+
+
+class ReactBulkTests(TestCase):
+
+    def setUp(self):
+        self.users = [User.objects.create(name="User {}".format(index), profile_pic="https://pics.example.com/u.png")
+                      for index in range(3)]
+        self.post_id = create_post(self.users[0].id, "Post")
+        self.comment_id = create_comment(self.users[1].id, self.post_id, "Comment")
+        self.reacted_at = datetime(2023, 1, 1, 12)
+
+    def get_event(self, user, reaction_type, minutes=0, post_id=None, comment_id=None):
+        target = (ReactionTargetEnum.POST, post_id or self.post_id) if comment_id is None \
+            else (ReactionTargetEnum.COMMENT, comment_id)
+        return user.id, target, reaction_type, self.reacted_at + timedelta(minutes=minutes)
+
+    def get_counters(self):
+        return (list(Post.objects.order_by('id').values_list('id', 'reaction_count')),
+                list(Comment.objects.order_by('id').values_list('id', 'reaction_count')),
+                list(ReactionRollup.objects.filter(count__gt=0).order_by('post_id', 'comment_id', 'reaction_type')
+                     .values_list('post_id', 'comment_id', 'reaction_type', 'hour', 'count')))
+
+    def test_toggles_collapse_within_a_batch(self):
+        react_to_post(self.users[2].id, self.post_id, ReactionTypeEnum.SAD)
+
+        react_bulk([self.get_event(self.users[0], ReactionTypeEnum.LOVE),
+                    self.get_event(self.users[0], ReactionTypeEnum.LOVE, minutes=1),
+                    self.get_event(self.users[1], ReactionTypeEnum.LOVE, minutes=2),
+                    self.get_event(self.users[1], ReactionTypeEnum.WOW, minutes=3),
+                    self.get_event(self.users[2], ReactionTypeEnum.SAD, minutes=4),
+                    self.get_event(self.users[0], ReactionTypeEnum.HAHA, comment_id=self.comment_id)])
+
+        self.assertEqual(list(Reaction.objects.filter(post_id=self.post_id).values_list('reacted_by_id',
+                                                                                         'reaction_type')),
+                         [(self.users[1].id, str(ReactionTypeEnum.WOW))])
+        self.assertEqual(Post.objects.get(id=self.post_id).reaction_count, 1)
+        self.assertEqual(get_reaction_metrics(self.post_id), {str(ReactionTypeEnum.WOW): 1})
+        self.assertEqual(Comment.objects.get(id=self.comment_id).reaction_count, 1)
+
+    def test_invalid_event_rolls_back_the_whole_replay(self):
+        react_to_post(self.users[2].id, self.post_id, ReactionTypeEnum.SAD)
+        counters = self.get_counters()
+        valid_events = [self.get_event(self.users[0], ReactionTypeEnum.LOVE),
+                        self.get_event(self.users[2], ReactionTypeEnum.SAD, minutes=1)]
+
+        for invalid_event, exception in (
+                (self.get_event(self.users[1], ReactionTypeEnum.WOW, post_id=-1), InvalidPostException),
+                (self.get_event(self.users[1], ReactionTypeEnum.WOW, comment_id=-1), InvalidCommentException),
+                ((-1, (ReactionTargetEnum.POST, self.post_id), ReactionTypeEnum.WOW, self.reacted_at),
+                 InvalidUserException),
+                (self.get_event(self.users[1], "WOW"), InvalidReactionTypeException),
+                ((self.users[1].id, ("group", self.post_id), ReactionTypeEnum.WOW, self.reacted_at),
+                 InvalidPostException)):
+            # The valid events make up a first chunk that is written before the invalid one is seen
+            with self.assertRaises(exception):
+                react_bulk(valid_events + [invalid_event], batch_size=2)
+
+            self.assertEqual(list(Reaction.objects.filter(post_id=self.post_id).values_list('reacted_by_id',
+                                                                                             'reaction_type')),
+                             [(self.users[2].id, str(ReactionTypeEnum.SAD))])
+            self.assertEqual(self.get_counters(), counters)
+
+    def test_ids_are_validated_in_chunks_of_bound_parameters(self):
+        users = User.objects.bulk_create([User(name="Reader", profile_pic="https://pics.example.com/u.png")
+                                          for _ in range(connection.features.max_query_params + 1)])
+        events = [(user.id, (ReactionTargetEnum.POST, self.post_id), ReactionTypeEnum.LIT, self.reacted_at)
+                  for user in User.objects.filter(name="Reader")]
+
+        with CaptureQueriesContext(connection) as captured_queries:
+            react_bulk(events, batch_size=len(users))
+
+        user_lookups = [query['sql'] for query in captured_queries
+                        if query['sql'].startswith('SELECT COUNT(*) AS "__count" FROM "fb_post_user"')]
+        self.assertEqual(len(user_lookups), 2)
+        self.assertEqual(Post.objects.get(id=self.post_id).reaction_count, len(users))
+
+    def test_counters_and_rollups_match_rebuild_counters(self):
+        other_post_id = create_post(self.users[1].id, "Other post")
+        react_to_post(self.users[0].id, self.post_id, ReactionTypeEnum.LIT)
+        react_to_comment(self.users[2].id, self.comment_id, ReactionTypeEnum.ANGRY)
+        post_ids = [self.post_id, other_post_id]
+        reaction_types = [ReactionTypeEnum.LIT, ReactionTypeEnum.LOVE]
+        # Adds, toggles off and switches, spread over several hours
+        events = []
+        for index in range(60):
+            user, reaction_type = self.users[index % 3], reaction_types[index // 3 % 2]
+            events.append(self.get_event(user, reaction_type, minutes=index * 7, post_id=post_ids[index % 2]))
+            events.append(self.get_event(user, reaction_type, minutes=index * 7 + 1, comment_id=self.comment_id))
+
+        react_bulk(events, batch_size=25)
+        counters = self.get_counters()
+        call_command('rebuild_counters', stdout=StringIO())
+
+        self.assertEqual(counters, self.get_counters())
+
+
+class PostDetailsCacheTests(TransactionTestCase):
+    # Post details are only cached outside transactions, which TestCase wraps every test in
+
+    def setUp(self):
+        reset_post_details_cache()
+        self.user = User.objects.create(name="User 1", profile_pic="https://pics.example.com/1.png")
+        self.post_id = create_post(self.user.id, "Post")
+        self.comment_id = create_comment(self.user.id, self.post_id, "Comment")
+
+    def test_repeated_reads_are_served_from_the_lru(self):
+        with self.assertNumQueries(3):
+            post_details = get_post(self.post_id)
+        post_details["comments"].clear()
+        with self.assertNumQueries(1):
+            cached_post_details = get_post(self.post_id)
+        self.assertEqual(cached_post_details, get_post_details_list(Post.objects.filter(id=self.post_id))[0])
+        cached_post_details["comments"][0]["reactions"]["type"].append("changed by the caller")
+        cached_post_details["posted_by"]["name"] = "changed by the caller"
+        self.assertEqual(get_post(self.post_id), get_post_details_list(Post.objects.filter(id=self.post_id))[0])
+
+        self.assertEqual(get_post_details_cache_stats(), {"lru_hits": 2, "cache_hits": 0, "misses": 1})
+
+    def test_comment_reply_reaction_and_delete_paths_invalidate(self):
+        get_post(self.post_id)
+
+        reply_to_comment(self.user.id, self.comment_id, "Reply")
+        self.assertEqual(get_post(self.post_id)["comments"][0]["replies_count"], 1)
+        react_to_comment(self.user.id, self.comment_id, ReactionTypeEnum.WOW)
+        self.assertEqual(get_post(self.post_id)["comments"][0]["reactions"]["count"], 1)
+        react_to_post(self.user.id, self.post_id, ReactionTypeEnum.WOW)
+        react_to_post(self.user.id, self.post_id, ReactionTypeEnum.SAD)
+        self.assertEqual(get_post(self.post_id)["reactions"]["type"], [str(ReactionTypeEnum.SAD)])
+        react_bulk([(self.user.id, (ReactionTargetEnum.COMMENT, self.comment_id), ReactionTypeEnum.WOW,
+                     datetime.now())])
+        self.assertEqual(get_post(self.post_id)["comments"][0]["reactions"]["count"], 0)
+        self.assertEqual(get_post_details_cache_stats()["lru_hits"], 0)
+
+        delete_post(self.user.id, self.post_id)
+        self.assertNotIn(self.post_id, post_details_lru.entries)
+
+    @override_settings(FB_POST_DETAILS_CACHE='default')
+    def test_rebuild_counters_invalidates_both_tiers(self):
+        cache.clear()
+        get_post(self.post_id)
+        Comment.objects.filter(id=self.comment_id).update(reply_count=4)
+
+        call_command('rebuild_counters', stdout=StringIO())
+
+        self.assertEqual(get_post(self.post_id)["comments"][0]["replies_count"], 0)
+        post_details_lru.clear()
+        self.assertEqual(get_post(self.post_id)["comments"][0]["replies_count"], 0)
+        self.assertEqual(get_post_details_cache_stats(), {"lru_hits": 0, "cache_hits": 1, "misses": 2})
+
+    @override_settings(FB_POST_DETAILS_CACHE='default')
+    def test_warmed_posts_are_shared_through_the_cache_tier(self):
+        cache.clear()
+        second_post_id = create_post(self.user.id, "Second post")
+        self.assertEqual(warm_post_details([self.post_id, second_post_id, 0]), 2)
+        post_details_lru.clear()
+
+        with self.assertNumQueries(1):
+            self.assertEqual(get_post(second_post_id)["posted_content"], "Second post")
+        with self.assertNumQueries(1):
+            get_post(second_post_id)
+        self.assertEqual(get_post_details_cache_stats(), {"lru_hits": 1, "cache_hits": 1, "misses": 2})
+
+
+class AsyncReadTests(TransactionTestCase):
+    # The async reads query from executor threads, which only see committed rows
+
+    def setUp(self):
+        reset_post_details_cache()
+        self.user = User.objects.create(name="User 1", profile_pic="https://pics.example.com/1.png")
+        self.friend = User.objects.create(name="User 2", profile_pic="https://pics.example.com/2.png")
+        self.outsider = User.objects.create(name="User 3", profile_pic="https://pics.example.com/3.png")
+        self.group_id = create_group(self.user.id, "Group 1", [self.friend.id])
+        self.post_ids = []
+        for index in range(3):
+            post_id = create_post(self.user.id, "Post {}".format(index), self.group_id)
+            comment_id = create_comment(self.friend.id, post_id, "Comment")
+            reply_to_comment(self.user.id, comment_id, "Reply")
+            react_to_post(self.friend.id, post_id, ReactionTypeEnum.LOVE)
+            react_to_comment(self.user.id, comment_id, ReactionTypeEnum.HAHA)
+            self.post_ids.append(post_id)
+
+    def test_async_reads_match_the_sync_apis(self):
+        post_id = self.post_ids[0]
+        self.assertEqual(asyncio.run(get_post_async(post_id)), get_post(post_id))
+        self.assertEqual(asyncio.run(get_post_async(post_id)), get_post(post_id))
+        self.assertEqual(asyncio.run(get_group_feed_async(self.friend.id, self.group_id, 1, 2)),
+                         get_group_feed(self.friend.id, self.group_id, 1, 2))
+        self.assertEqual(asyncio.run(get_user_posts_async(self.user.id)), get_user_posts(self.user.id))
+        self.assertEqual(asyncio.run(get_reactions_to_post_async(post_id)),
+                         [{"user_id": self.friend.id, "name": "User 2", "profile_pic": "https://pics.example.com/2.png",
+                           "reaction": "LOVE"}])
+        self.assertEqual(get_reactions_to_post(post_id), asyncio.run(get_reactions_to_post_async(post_id)))
+
+    def test_async_reads_raise_what_the_sync_apis_check_first(self):
+        with self.assertRaises(InvalidPostException):
+            asyncio.run(get_post_async(0))
+        with self.assertRaises(InvalidPostException):
+            asyncio.run(get_reactions_to_post_async(0))
+        with self.assertRaises(InvalidUserException):
+            asyncio.run(get_user_posts_async(0))
+        with self.assertRaises(InvalidUserException):
+            asyncio.run(get_group_feed_async(0, 0, -1, 0))
+        with self.assertRaises(InvalidGroupException):
+            asyncio.run(get_group_feed_async(self.user.id, 0, -1, 0))
+        with self.assertRaises(UserNotInGroupException):
+            asyncio.run(get_group_feed_async(self.outsider.id, self.group_id, 0, 0))
+        with self.assertRaises(InvalidLimitSetValueException):
+            asyncio.run(get_group_feed_async(self.user.id, self.group_id, 0, 0))
+
+
+class ConcurrentReactionTests(TransactionTestCase):
+    number_of_threads = 16
+
+    def setUp(self):
+        self.author = User.objects.create(name="Author", profile_pic="https://pics.example.com/author.png")
+        self.post_id = create_post(self.author.id, "Post")
+        self.users = [User.objects.create(name="User {}".format(index), profile_pic="https://pics.example.com/u.png")
+                      for index in range(self.number_of_threads)]
+
+    def run_concurrently(self, calls):
+        errors = []
+        barrier = threading.Barrier(len(calls))
+
+        def run(function, *arguments):
+            try:
+                barrier.wait()
+                function(*arguments)
+            except Exception as exception:
+                errors.append(exception)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=run, args=call) for call in calls]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+    def assert_reactions_on_post(self, expected_count):
+        self.assertEqual(Reaction.objects.filter(post_id=self.post_id).count(), expected_count)
+        self.assertEqual(Post.objects.get(id=self.post_id).reaction_count, expected_count)
+        self.assertEqual(get_reaction_metrics(self.post_id),
+                         dict(Reaction.objects.filter(post_id=self.post_id).values_list('reaction_type')
+                              .annotate(Count('id')).order_by()))
+
+    def test_reactions_from_many_users(self):
+        self.run_concurrently([(react_to_post, user.id, self.post_id, ReactionTypeEnum.LOVE) for user in self.users])
+
+        self.assert_reactions_on_post(len(self.users))
+
+    def test_repeated_clicks_by_one_user_toggle(self):
+        user_id = self.users[0].id
+        number_of_clicks = self.number_of_threads - 1
+
+        self.run_concurrently([(react_to_post, user_id, self.post_id, ReactionTypeEnum.WOW)] * number_of_clicks)
+
+        self.assert_reactions_on_post(number_of_clicks % 2)
+
+    def test_switching_reaction_types_keeps_one_row(self):
+        user_id = self.users[0].id
+
+        self.run_concurrently([(react_to_post, user_id, self.post_id, reaction_type)
+                               for reaction_type in ReactionTypeEnum])
+
+        self.assert_reactions_on_post(1)
@@ -0,0 +1,74 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+
+# Identity map of the users, posts, comments, groups and memberships validated in the current scope, so that a
+# validator never fetches an entity twice and serializers can reuse what the validators loaded. Outside a scope
+# nothing is remembered and every lookup goes to the database.
+
+_identity_map = ContextVar("fb_post_validation_cache", default=None)
+
+
+@contextmanager
+def validation_scope():
+    """
+    Opens a scope for the duration of a request or interactor call. Nested scopes join the outer one, so
+    interactors calling each other share what was validated. Usable as a decorator: @validation_scope().
+    """
+    if _identity_map.get() is not None:
+        yield
+        return
+
+    token = _identity_map.set({})
+    try:
+        yield
+    finally:
+        _identity_map.reset(token)
+
+
+def get_or_fetch(model, key, fetch):
+    """Returns the remembered entity for (model, key), else the result of fetch(), remembered unless None."""
+    identity_map = _identity_map.get()
+    if identity_map is not None and (model, key) in identity_map:
+        return identity_map[(model, key)]
+
+    entity = fetch()
+    if identity_map is not None and entity is not None:
+        identity_map[(model, key)] = entity
+    return entity
+
+
+def get_remembered(model, key):
+    identity_map = _identity_map.get()
+    if identity_map is None:
+        return None
+    return identity_map.get((model, key))
+
+
+def remember(model, key, entity):
+    identity_map = _identity_map.get()
+    if identity_map is not None:
+        identity_map[(model, key)] = entity
+
+
+def forget(model, key):
+    identity_map = _identity_map.get()
+    if identity_map is not None:
+        identity_map.pop((model, key), None)
+
+
+def forget_all():
+    identity_map = _identity_map.get()
+    if identity_map is not None:
+        identity_map.clear()
+
+
+class ValidationScopeMiddleware:
+    """Shares one validation scope across everything a request calls."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with validation_scope():
+            return self.get_response(request)
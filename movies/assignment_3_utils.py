@@ -1,6 +1,13 @@
-from .models import Actor, Director, Movie, Rating
-from django.db.models import Q
-from .assignment_2_utils import get_average_rating_of_movie, get_total_number_of_ratings
+from .models import Cast, Director, Movie, Rating
+from django.db.models import Q, QuerySet, prefetch_related_objects
+from .assignment_2_utils import DEFAULT_BATCH_SIZE, get_average_rating_of_movie, get_total_number_of_ratings
+from .catalog_cache import bump_catalog_generation
+from .catalog_search import SUFFIX, get_matching_keys
+from .release_dates import get_release_date_range_q, get_release_months_q, \
+    get_wide_release_date_range_filters
+
+MOVIE_DETAILS_PREFETCHES = ("cast_set__actor",)
+MOVIE_DETAILS_RELATIONS = ("director", "rating")
 
 
 # Task 1
@@ -16,40 +23,72 @@ def get_cast_details_list(movie_obj):
     return cast_details_list
 
 
-def get_movies_by_given_movie_objs(movie_objs):
-    movie_details_list = []
-
-    for movie_obj in movie_objs:
-        movie_details_dict = {}
-        movie_details_dict["movie_id"] = movie_obj.movie_id
-        movie_details_dict["name"] = movie_obj.name
-        movie_details_dict["cast"] = get_cast_details_list(movie_obj)
-        movie_details_dict["box_office_collection_in_crores"] = movie_obj.box_office_collection_in_crores
-        movie_details_dict["release_date"] = movie_obj.release_date.strftime("%Y-%m-%d")
-        movie_details_dict["director_name"] = movie_obj.director.name
-        movie_details_dict["average_rating"] = get_average_rating_of_movie(movie_obj)
-        movie_details_dict["total_number_of_ratings"] = get_total_number_of_ratings(movie_obj)
-        movie_details_list.append(movie_details_dict)
-
-    return movie_details_list
+def get_movie_objs_with_details(movie_objs, cast_prefetch=None):
+    """
+    Loads everything the movie details need in a fixed number of queries: the movies with their director and
+    rating, the cast and the cast's actors. `cast_prefetch` replaces the cast prefetch, e.g. with a Prefetch of a
+    filtered cast.
+    """
+    cast_prefetches = MOVIE_DETAILS_PREFETCHES if cast_prefetch is None else (cast_prefetch,)
+    if isinstance(movie_objs, QuerySet):
+        return movie_objs.select_related(*MOVIE_DETAILS_RELATIONS).prefetch_related(*cast_prefetches)
+
+    movie_objs = list(movie_objs)
+    prefetch_related_objects(movie_objs, *MOVIE_DETAILS_RELATIONS, *cast_prefetches)
+    return movie_objs
+
+
+def get_movie_details_dict(movie_obj):
+    return {
+        "movie_id": movie_obj.movie_id,
+        "name": movie_obj.name,
+        "cast": get_cast_details_list(movie_obj),
+        "box_office_collection_in_crores": movie_obj.box_office_collection_in_crores,
+        "release_date": movie_obj.release_date.strftime("%Y-%m-%d"),
+        "director_name": movie_obj.director.name,
+        "average_rating": get_average_rating_of_movie(movie_obj),
+        "total_number_of_ratings": get_total_number_of_ratings(movie_obj),
+    }
+
+
+def get_movies_by_given_movie_objs(movie_objs, cast_prefetch=None):
+    return [get_movie_details_dict(movie_obj) for movie_obj in get_movie_objs_with_details(movie_objs, cast_prefetch)]
+
+
+def iter_movies_by_given_movie_objs(movie_objs, chunk_size=DEFAULT_BATCH_SIZE, cast_prefetch=None):
+    """
+    Yields the details of a Movie queryset one movie at a time, in movie_id order, loading `chunk_size` movies
+    per round of queries so memory stays bounded however many movies match. Chunks continue after the last
+    movie_id seen rather than at an offset, so later chunks cost the same as the first. A list of movies is
+    turned into a queryset of their ids first.
+    """
+    if not isinstance(movie_objs, QuerySet):
+        movie_objs = Movie.objects.filter(movie_id__in=[movie_obj.movie_id for movie_obj in movie_objs])
+    movie_objs = get_movie_objs_with_details(movie_objs, cast_prefetch).order_by("movie_id")
+    last_movie_id = None
+    while True:
+        chunk = movie_objs if last_movie_id is None else movie_objs.filter(movie_id__gt=last_movie_id)
+        chunk = list(chunk[:chunk_size])
+        for movie_obj in chunk:
+            yield get_movie_details_dict(movie_obj)
+        if len(chunk) < chunk_size:
+            return
+        last_movie_id = chunk[-1].movie_id
 
 
 def get_movies_by_given_movie_names(movie_names):
-    movie_objs = Movie.objects.filter(name__in=movie_names).prefetch_related("cast_set__actor").select_related(
-        "director", "rating")
-    return get_movies_by_given_movie_objs(movie_objs)
+    return get_movies_by_given_movie_objs(Movie.objects.filter(name__in=movie_names))
 
 
 # Task 2
 def get_movies_released_in_summer_in_given_years():
-    return get_movies_by_given_movie_objs(
-        Movie.objects.all().filter(release_date__year__range=[2005, 2010], release_date__month__in=[5, 6, 7]))
+    return get_movies_by_given_movie_objs(Movie.objects.filter(get_release_months_q(2005, 2010, [5, 6, 7])))
 
 
 # Task 3
 def get_movie_names_with_actor_name_ending_with_smith():
     movie_names = Movie.objects.filter(
-        actors__name__iendswith='smith'
+        actors__actor_id__in=get_matching_keys("smith", "actor", SUFFIX)
     ).distinct().values_list('name', flat=True)
 
     return list(movie_names)
@@ -65,39 +104,44 @@ def get_movie_names_with_ratings_above_given_minimum():
     movie_names = Movie.objects.filter(
         Q(rating__rating_five_count__gte=500) | Q(rating__rating_four_count__gt=1000) | Q(
             rating__rating_three_count__gt=2000) | Q(rating__rating_two_count__gt=4000) | Q(
-            rating__rating_one_count__gt=8000), release_date__year__gt=2000).value_list('name', flat=True)
+            rating__rating_one_count__gt=8000), get_release_date_range_q(from_year=2001)) \
+        .values_list('name', flat=True)
     return list(movie_names)
 
 
 # Task 6
 def get_movie_directors_in_given_year():
-    director_names = Director.objects.filter(movie__release_date__year=2000).value_list('name', flat=True)
+    director_names = Director.objects.filter(get_release_date_range_q(2000, 2000, prefix="movie__")) \
+        .values_list('name', flat=True)
     return list(director_names)
 
 
 # Task 7
 def get_actor_names_debuted_in_21st_century():
-    actor_names = Actor.objects.filter(cast__is_debut_movie=True,
-                                       movie__release_date__year__range=[2001, 2100]).value_list('name', flat=True)
+    # Starts from the debut cast rows, over their partial index, so each one is matched against the release date
+    # of its own movie. The century spans too much of the catalog for the release date index to pay off
+    actor_names = Cast.objects.filter(*get_wide_release_date_range_filters(2001, 2100, prefix="movie__"),
+                                      is_debut_movie=True).values_list('actor__name', flat=True)
     return list(actor_names)
 
 
 # Task 8
 def get_director_names_containing_big_as_well_as_movie_in_may():
-    director_names = Director.objects.filter(movie__name__contains="big").filter(
+    director_names = Director.objects.filter(movie__movie_id__in=get_matching_keys("big", "movie")).filter(
         movie__release_date__year=5).values_list('name', flat=True)
     return list(director_names)
 
 
 # Task 9
 def get_director_names_containing_big_and_movie_in_may():
-    director_names = Director.objects.filter(movie__name__contains="big", movie__release_date__year=5).values_list(
-        'name', flat=True)
+    director_names = Director.objects.filter(movie__movie_id__in=get_matching_keys("big", "movie"),
+                                             movie__release_date__year=5).values_list('name', flat=True)
     return list(director_names)
 
 
 # Task 10
 def reset_ratings_for_movies_in_this_year():
-    Rating.objects.filter(movie__release_date__year=2000).update(rating_one_count=0, rating_two_count=0,
-                                                                 rating_three_count=0, rating_four_count=0,
-                                                                 rating_five_count=0)
+    Rating.objects.filter(get_release_date_range_q(2000, 2000, prefix="movie__")).update(
+        rating_one_count=0, rating_two_count=0, rating_three_count=0, rating_four_count=0, rating_five_count=0,
+        total_ratings=0, average_rating=0)
+    bump_catalog_generation()
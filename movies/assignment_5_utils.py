@@ -2,6 +2,9 @@ from .models import Actor, Director, Movie, Cast, Rating
 from django.db.models import Q, Count, Prefetch
 from .assignment_3_utils import get_movies_by_given_movie_objs
 from .assignment_2_utils import get_average_rating_of_movie, get_total_number_of_ratings
+from .catalog_cache import bump_catalog_generation
+from .exceptions import InvalidYearRangeException
+from .release_dates import get_release_date_range_q
 
 
 # Task 1
@@ -9,7 +12,8 @@ from .assignment_2_utils import get_average_rating_of_movie, get_total_number_of
 
 # Task 2
 def remove_all_actors_from_given_movie(movie_object):
-    Movie.objects.filter(movie=movie_object).actors.clear()
+    movie_object.actors.clear()
+    bump_catalog_generation()
 
 
 # Task 3
@@ -28,11 +32,10 @@ def get_all_actor_objects_acted_in_given_movies(movie_objs):
 # Task 6
 def get_female_cast_details_from_movies_having_more_than_five_female_cast():
     movie_objs = Movie.objects.annotate(female_actor_count=Count('actors', filter=Q(actors__gender="FEMALE"))).filter(
-        female_actor_count__gt=5).prefetch_related(
-        Prefetch("cast_set__actor", queryset=Cast.objects.filter(actor__gender="FEMALE"))).select_related(
-        "director", "rating")
+        female_actor_count__gt=5)
     # Doubt (prefetch_related(Prefetch("cast_set__actor") -Related actor object doesn't exist
-    return get_movies_by_given_movie_objs(movie_objs)
+    return get_movies_by_given_movie_objs(
+        movie_objs, Prefetch("cast_set__actor", queryset=Cast.objects.filter(actor__gender="FEMALE")))
 
 
 # Task 7
@@ -55,6 +58,7 @@ def get_movie_details_dict(movie_obj):
     movie_dict["director_name"] = movie_obj.director.name
     movie_dict["average_rating"] = get_average_rating_of_movie(movie_obj)
     movie_dict["total_number_of_ratings"] = get_total_number_of_ratings(movie_obj)
+    return movie_dict
 
 
 def get_actor_details_by_given_actor_objs(actor_objs):
@@ -76,15 +80,33 @@ def get_actor_details_by_given_actor_objs(actor_objs):
     return actor_details_list
 
 
+def raise_exception_if_invalid_year_range(from_year, to_year):
+    if from_year is not None and to_year is not None and from_year > to_year:
+        raise InvalidYearRangeException
+
+
+def get_actor_filmography(from_year=None, to_year=None):
+    """
+    Actors with a movie released from `from_year` to `to_year` (both included, either may be left open), each
+    once, with those movies and their cast, director and rating. Three queries however many actors and movies
+    match: the actors, their movies with director and rating, and the cast of those movies.
+    """
+    raise_exception_if_invalid_year_range(from_year, to_year)
+
+    movie_objs = Movie.objects.filter(get_release_date_range_q(from_year, to_year)) \
+        .select_related("director", "rating").prefetch_related("cast_set").order_by("release_date", "movie_id")
+    actor_objs = Actor.objects.filter(get_release_date_range_q(from_year, to_year, prefix="movie__")).distinct() \
+        .order_by("actor_id").prefetch_related(Prefetch("movie_set", queryset=movie_objs))
+    return get_actor_details_by_given_actor_objs(actor_objs)
+
+
 def get_actor_movies_released_in_year_greater_than_or_equal_to_2000():
-    return get_actor_details_by_given_actor_objs(
-        Actor.objects.filter(movie__release_date__year__gte=2000) \
-            .prefetch_related(Prefetch("movie_set", queryset=Movie.objects.filter(release_date__year__gte=2000) \
-                                       .select_related("director", "rating"))))
+    return get_actor_filmography(from_year=2000)
 
 
 # Task 8
 def reset_ratings_for_movies_in_given_year(year):
-    Rating.objects.filter(movie__release_date__year=year).update(rating_one_count=0, rating_two_count=0,
-                                                                 rating_three_count=0, rating_four_count=0,
-                                                                 rating_five_count=0)
+    Rating.objects.filter(get_release_date_range_q(year, year, prefix="movie__")).update(
+        rating_one_count=0, rating_two_count=0, rating_three_count=0, rating_four_count=0, rating_five_count=0,
+        total_ratings=0, average_rating=0)
+    bump_catalog_generation()
@@ -0,0 +1,65 @@
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+CATALOG_GENERATION_KEY = "movies:catalog_generation"
+ANALYTICS_KEY_FORMAT = "movies:analytics:{}:{}"
+
+
+# Catalog analytics are cached under the current catalog generation, a counter in the cache that every write
+# to the catalog bumps. A write never has to find the entries it makes stale: reads after it look under the
+# new generation, miss once and recompute, and entries of old generations are left to expire. For processes
+# to see each other's writes, MOVIES_ANALYTICS_CACHE must name a cache they share.
+
+def get_analytics_cache():
+    return caches[getattr(settings, "MOVIES_ANALYTICS_CACHE", "default")]
+
+
+def start_catalog_generation(cache):
+    # The counter starts at the current time in nanoseconds rather than at 0, so that a counter started again
+    # after an eviction never lands on a generation whose entries are still cached
+    cache.add(CATALOG_GENERATION_KEY, time.time_ns(), timeout=None)
+
+
+def get_catalog_generation():
+    cache = get_analytics_cache()
+    generation = cache.get(CATALOG_GENERATION_KEY)
+    if generation is None:
+        start_catalog_generation(cache)
+        generation = cache.get(CATALOG_GENERATION_KEY)
+    return generation
+
+
+def increment_catalog_generation():
+    cache = get_analytics_cache()
+    try:
+        cache.incr(CATALOG_GENERATION_KEY)
+    except ValueError:
+        start_catalog_generation(cache)
+
+
+def bump_catalog_generation():
+    """
+    Called by every catalog write. The generation moves on right away and once more when the transaction
+    commits, so analytics that other connections recomputed from the data before the write, while its transaction
+    was still open, are dropped as well.
+    """
+    increment_catalog_generation()
+    transaction.on_commit(increment_catalog_generation)
+
+
+def cached_catalog_analytics(function):
+    @wraps(function)
+    def get_cached_analytics():
+        cache = get_analytics_cache()
+        key = ANALYTICS_KEY_FORMAT.format(function.__name__, get_catalog_generation())
+        analytics = cache.get(key)
+        if analytics is None:
+            analytics = function()
+            cache.set(key, analytics, getattr(settings, "MOVIES_ANALYTICS_CACHE_TIMEOUT", 60 * 60 * 24))
+        return analytics
+
+    return get_cached_analytics
@@ -0,0 +1,165 @@
+import csv
+import hashlib
+import json
+import os
+from datetime import datetime
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import F
+
+from .assignment_2_utils import DEFAULT_BATCH_SIZE, get_batches, get_director_ids_by_name
+from .catalog_cache import bump_catalog_generation
+from .models import Actor, Director, Movie, Rating, Cast, CatalogImportCheckpoint, get_rating_aggregates
+
+# Files are imported in this order so that every row's foreign keys are already in place
+CATALOG_ENTITIES = ("actors", "directors", "movies", "cast", "ratings")
+RATING_COUNT_FIELDS = ("rating_one_count", "rating_two_count", "rating_three_count", "rating_four_count",
+                       "rating_five_count")
+FIXTURE_CATALOG_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "catalog")
+CONTENT_HASH_BLOCK_SIZE = 1024 * 1024
+
+
+# Catalog files are read one row at a time and written in chunks of `batch_size` rows, each chunk in its own
+# transaction together with the checkpoint of how far the file got. Memory stays bounded by one chunk, and an
+# interrupted import picks up after the last committed chunk. Checkpoints are kept per file, identified by a hash of
+# its content, so a copied or touched file resumes where the import stopped, while another file, or the same file
+# changed, starts from its first row. Rows that are already in the database are skipped rather than rejected, so
+# importing a file again, e.g. after --restart, leaves the rows an earlier run committed as they are.
+
+class CatalogImportError(Exception):
+    pass
+
+
+def read_jsonl_rows(path):
+    with open(path) as catalog_file:
+        for line in catalog_file:
+            if line.strip():
+                yield json.loads(line)
+
+
+def read_csv_rows(path):
+    with open(path, newline="") as catalog_file:
+        yield from csv.DictReader(catalog_file)
+
+
+def read_catalog_rows(path):
+    if path.endswith(".jsonl"):
+        return read_jsonl_rows(path)
+    if path.endswith(".csv"):
+        return read_csv_rows(path)
+    raise CatalogImportError("{} is neither a .jsonl nor a .csv file".format(path))
+
+
+def parse_bool(value):
+    # CSV hands every value over as text
+    if isinstance(value, str):
+        return value.strip().lower() in ("true", "t", "yes", "1")
+    return bool(value)
+
+
+def get_actor_values(rows):
+    return [{"actor_id": row["actor_id"], "name": row["name"], "gender": row.get("gender") or None} for row in rows]
+
+
+def get_director_values(rows):
+    return [{"name": row["name"]} for row in rows]
+
+
+def get_movie_values(rows):
+    director_ids_by_name = get_director_ids_by_name(row["director_name"] for row in rows)
+
+    movie_values = []
+    for row in rows:
+        if row["director_name"] not in director_ids_by_name:
+            raise CatalogImportError("Movie {} has unknown director {}".format(row["movie_id"],
+                                                                            row["director_name"]))
+        movie_values.append({
+            "movie_id": row["movie_id"],
+            "name": row["name"],
+            "box_office_collection_in_crores": float(row["box_office_collection_in_crores"]),
+            "release_date": datetime.strptime(row["release_date"], "%Y-%m-%d").date(),
+            "director_id": director_ids_by_name[row["director_name"]]})
+    return movie_values
+
+
+def get_cast_values(rows):
+    return [{"movie_id": row["movie_id"], "actor_id": row["actor_id"], "role": row["role"],
+             "is_debut_movie": parse_bool(row["is_debut_movie"])} for row in rows]
+
+
+def get_rating_values(rows):
+    rating_values = []
+    for row in rows:
+        counts = [int(row[count_field]) for count_field in RATING_COUNT_FIELDS]
+        total_ratings, average_rating = get_rating_aggregates(*counts)
+        rating_values.append({"movie_id": row["movie_id"], **dict(zip(RATING_COUNT_FIELDS, counts)),
+                              "total_ratings": total_ratings, "average_rating": average_rating})
+    return rating_values
+
+
+# entity: (model, parser turning a batch of catalog rows into field values of that model)
+ROW_PARSERS = {
+    "actors": (Actor, get_actor_values),
+    "directors": (Director, get_director_values),
+    "movies": (Movie, get_movie_values),
+    "cast": (Cast, get_cast_values),
+    "ratings": (Rating, get_rating_values),
+}
+
+
+def get_content_hash(path):
+    content_hash = hashlib.sha1()
+    with open(path, "rb") as catalog_file:
+        for block in iter(lambda: catalog_file.read(CONTENT_HASH_BLOCK_SIZE), b""):
+            content_hash.update(block)
+    return content_hash.hexdigest()
+
+
+def get_checkpoint_source(checkpoint_name, entity, path):
+    return "{}:{}:{}".format(checkpoint_name, entity, get_content_hash(path))
+
+
+def import_catalog_file(entity, path, batch_size=DEFAULT_BATCH_SIZE, checkpoint_name=None):
+    """
+    Imports one catalog file of `entity` (one of CATALOG_ENTITIES) and returns the number of rows read.
+    With a `checkpoint_name`, rows of the same file committed by an earlier run under that name are skipped.
+    Rows whose key is already taken, such as an actor_id or a movie's cast entry, are left out.
+    """
+    model, parse_rows = ROW_PARSERS[entity]
+    rows = read_catalog_rows(path)
+
+    checkpoint = None
+    if checkpoint_name is not None:
+        checkpoint, _ = CatalogImportCheckpoint.objects.get_or_create(
+            source=get_checkpoint_source(checkpoint_name, entity, path))
+        rows = islice(rows, checkpoint.rows_imported, None)
+
+    rows_imported = 0
+    for batch in get_batches(rows, batch_size):
+        with transaction.atomic():
+            model.objects.bulk_create([model(**values) for values in parse_rows(batch)], ignore_conflicts=True)
+            if checkpoint is not None:
+                CatalogImportCheckpoint.objects.filter(id=checkpoint.id) \
+                    .update(rows_imported=F('rows_imported') + len(batch))
+            bump_catalog_generation()
+        rows_imported += len(batch)
+
+    return rows_imported
+
+
+def import_catalog(paths, batch_size=DEFAULT_BATCH_SIZE, checkpoint_name=None):
+    """`paths` maps entities to their files; returns the number of rows read per entity."""
+    rows_imported = {}
+    for entity in CATALOG_ENTITIES:
+        if entity in paths:
+            rows_imported[entity] = import_catalog_file(entity, paths[entity], batch_size, checkpoint_name)
+    return rows_imported
+
+
+def reset_catalog_checkpoints(checkpoint_name):
+    CatalogImportCheckpoint.objects.filter(source__startswith="{}:".format(checkpoint_name)).delete()
+
+
+def get_fixture_catalog_paths():
+    return {entity: os.path.join(FIXTURE_CATALOG_DIRECTORY, "{}.jsonl".format(entity)) for entity in CATALOG_ENTITIES}
@@ -0,0 +1,64 @@
+from django.db import connection
+from django.db.models.expressions import RawSQL
+
+from .exceptions import InvalidSearchQueryException
+from .models import CatalogSearchEntry
+
+SEARCH_INDEX_TABLE = "movies_catalog_search"
+SEARCH_KINDS = ("movie", "actor", "director")
+PREFIX, SUFFIX, SUBSTRING = "prefix", "suffix", "substring"
+SEARCH_MODES = (PREFIX, SUFFIX, SUBSTRING)
+# The trigram tokenizer indexes every three characters of a name, so shorter queries cannot use the index
+MIN_SEARCH_QUERY_LENGTH = 3
+DEFAULT_SEARCH_LIMIT = 20
+
+
+# Names are searched through the FTS5 trigram index of migration 0006_catalog_search. A MATCH on the query as a
+# phrase finds the names containing it through the index; prefix and suffix searches check where in the name
+# the match sits on those candidates only. Matching is case insensitive, like Django's contains and iendswith
+# lookups on SQLite.
+
+def raise_exception_if_invalid_search_query(query, mode):
+    if mode not in SEARCH_MODES or len(query) < MIN_SEARCH_QUERY_LENGTH:
+        raise InvalidSearchQueryException
+
+
+def get_search_condition(query, mode):
+    """WHERE condition on the search index and its parameters."""
+    condition = "{} MATCH %s".format(SEARCH_INDEX_TABLE)
+    params = ['"{}"'.format(query.replace('"', '""'))]
+    if mode == PREFIX:
+        condition += " AND lower(substr({}.name, 1, %s)) = lower(%s)".format(SEARCH_INDEX_TABLE)
+        params += [len(query), query]
+    elif mode == SUFFIX:
+        condition += " AND lower(substr({}.name, -%s)) = lower(%s)".format(SEARCH_INDEX_TABLE)
+        params += [len(query), query]
+    return condition, params
+
+
+def search_catalog(query, limit=DEFAULT_SEARCH_LIMIT, mode=SUBSTRING, kinds=SEARCH_KINDS):
+    """
+    Movie, actor and director names matching `query`, as dicts of kind, key and name, at most `limit` of them.
+    The key is the movie_id, the actor_id or the director's id.
+    """
+    raise_exception_if_invalid_search_query(query, mode)
+
+    condition, params = get_search_condition(query, mode)
+    sql = "SELECT entry.kind, entry.key, entry.name FROM {index} " \
+          "INNER JOIN {entries} AS entry ON entry.id = {index}.rowid " \
+          "WHERE {condition} AND entry.kind IN ({kinds}) ORDER BY {index}.rowid LIMIT %s" \
+        .format(index=SEARCH_INDEX_TABLE, entries=CatalogSearchEntry._meta.db_table, condition=condition,
+                kinds=", ".join(["%s"] * len(kinds)))
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params + list(kinds) + [limit])
+        return [{"kind": kind, "key": key, "name": name} for kind, key, name in cursor.fetchall()]
+
+
+def get_matching_keys(query, kind, mode=SUBSTRING):
+    """Subquery of the keys of every `kind` whose name matches, for filters like actor_id__in."""
+    raise_exception_if_invalid_search_query(query, mode)
+
+    condition, params = get_search_condition(query, mode)
+    matching_ids = RawSQL("SELECT rowid FROM {} WHERE {}".format(SEARCH_INDEX_TABLE, condition), params)
+    return CatalogSearchEntry.objects.filter(kind=kind, id__in=matching_ids).values('key')
@@ -0,0 +1,160 @@
+from collections import defaultdict
+
+from django.db import transaction
+
+from .assignment_2_utils import DEFAULT_BATCH_SIZE, get_batches
+from .catalog_cache import bump_catalog_generation
+from .catalog_import import CATALOG_ENTITIES, RATING_COUNT_FIELDS, ROW_PARSERS, read_catalog_rows
+from .models import Actor, Director, Movie, Rating, Cast
+
+# entity: (model, key field the catalog identifies rows by, fields compared and updated)
+SYNCED_FIELDS = {
+    "actors": (Actor, "actor_id", ("name", "gender")),
+    "directors": (Director, "name", ()),
+    "movies": (Movie, "movie_id", ("name", "release_date", "box_office_collection_in_crores", "director_id")),
+    "ratings": (Rating, "movie_id", RATING_COUNT_FIELDS + ("total_ratings", "average_rating")),
+}
+CAST_FIELDS = ("movie_id", "actor_id", "role", "is_debut_movie")
+
+
+# Sync treats the catalog as the full, current state: rows are matched to existing ones by key, only rows whose
+# compared fields differ are written, and rows missing from the catalog are deleted. Running the same catalog
+# twice changes nothing the second time. Existing rows are compared by their current column values rather than
+# by anything stored at the last sync, so rows edited outside the sync are still noticed. Incoming rows stay plain
+# dicts of parsed values, model instances are only built for the rows that get written.
+
+def get_existing_values(model, key_field, fields, keys):
+    existing_rows = model.objects.filter(**{key_field + '__in': keys}).values_list(key_field, 'pk', *fields)
+    return {row[0]: (row[1], row[2:]) for row in existing_rows}
+
+
+def upsert_rows(entity, rows, batch_size):
+    """Creates and updates the rows of `entity` that differ; returns the counts and every key seen."""
+    model, key_field, fields = SYNCED_FIELDS[entity]
+    _, parse_rows = ROW_PARSERS[entity]
+    counts = {"created": 0, "updated": 0, "deleted": 0}
+    seen_keys = set()
+
+    for batch in get_batches(rows, batch_size):
+        values_by_key = {values[key_field]: values for values in parse_rows(batch)}
+        existing_values = get_existing_values(model, key_field, fields, list(values_by_key))
+
+        new_objects, changed_objects = [], []
+        for key, values in values_by_key.items():
+            if key not in existing_values:
+                new_objects.append(model(**values))
+                continue
+
+            pk, existing_field_values = existing_values[key]
+            if existing_field_values != tuple(values[field_name] for field_name in fields):
+                obj = model(**values)
+                obj.pk = pk
+                changed_objects.append(obj)
+
+        if new_objects or changed_objects:
+            with transaction.atomic():
+                model.objects.bulk_create(new_objects)
+                if changed_objects:
+                    model.objects.bulk_update(changed_objects, fields)
+                bump_catalog_generation()
+
+        counts["created"] += len(new_objects)
+        counts["updated"] += len(changed_objects)
+        seen_keys.update(values_by_key)
+
+    return counts, seen_keys
+
+
+def delete_absent_rows(entity, seen_keys, batch_size):
+    model, key_field, _ = SYNCED_FIELDS[entity]
+    absent_keys = [key for key in model.objects.values_list(key_field, flat=True).iterator()
+                   if key not in seen_keys]
+
+    deleted = 0
+    for keys in get_batches(absent_keys, batch_size):
+        rows = model.objects.filter(**{key_field + '__in': keys})
+        if model is Director:
+            # A director still credited on a movie stays, deleting it would take the movie along
+            rows = rows.filter(movie__isnull=True)
+        deleted += rows.delete()[1].get(model._meta.label, 0)
+    if deleted:
+        bump_catalog_generation()
+    return deleted
+
+
+def reconcile_cast(rows, batch_size):
+    """
+    Diffs the cast as sets of (movie_id, actor_id, role, is_debut_movie) and writes only the difference, one
+    chunk of `batch_size` movies at a time. The catalog need not list a movie's cast together, so the incoming
+    entries are grouped by movie first; existing entries are only read for the chunk being reconciled.
+    """
+    _, parse_rows = ROW_PARSERS["cast"]
+    incoming_cast_by_movie = defaultdict(set)
+    for batch in get_batches(rows, batch_size):
+        for values in parse_rows(batch):
+            incoming_cast_by_movie[values["movie_id"]].add(tuple(values[field_name] for field_name in CAST_FIELDS))
+
+    movie_ids = set(incoming_cast_by_movie)
+    movie_ids.update(Cast.objects.values_list('movie_id', flat=True).distinct().iterator())
+
+    counts = {"created": 0, "updated": 0, "deleted": 0}
+    for movie_ids_batch in get_batches(sorted(movie_ids), batch_size):
+        existing_cast_ids = defaultdict(list)
+        for cast_id, *cast in Cast.objects.filter(movie_id__in=movie_ids_batch).values_list('id', *CAST_FIELDS):
+            existing_cast_ids[tuple(cast)].append(cast_id)
+        incoming_cast = set().union(*(incoming_cast_by_movie.get(movie_id, ()) for movie_id in movie_ids_batch))
+
+        # Duplicates of a cast entry that is kept go as well, the catalog lists each entry once
+        removed_cast_ids = [cast_id for cast, cast_ids in existing_cast_ids.items()
+                            for cast_id in (cast_ids if cast not in incoming_cast else cast_ids[1:])]
+        new_cast = [Cast(**dict(zip(CAST_FIELDS, cast))) for cast in incoming_cast - set(existing_cast_ids)]
+
+        if removed_cast_ids or new_cast:
+            with transaction.atomic():
+                for cast_ids in get_batches(removed_cast_ids, batch_size):
+                    Cast.objects.filter(id__in=cast_ids).delete()
+                Cast.objects.bulk_create(new_cast, batch_size=batch_size)
+                bump_catalog_generation()
+
+        counts["created"] += len(new_cast)
+        counts["deleted"] += len(removed_cast_ids)
+
+    return counts
+
+
+def sync_catalog_rows(rows_by_entity, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Syncs the entities in `rows_by_entity` (entity -> iterable of catalog rows) and returns created, updated and
+    deleted counts per entity. Entities left out are not touched.
+    """
+    counts, seen_keys = {}, {}
+    for entity in CATALOG_ENTITIES:
+        if entity not in rows_by_entity:
+            continue
+        if entity == "cast":
+            counts[entity] = reconcile_cast(rows_by_entity[entity], batch_size)
+        else:
+            counts[entity], seen_keys[entity] = upsert_rows(entity, rows_by_entity[entity], batch_size)
+
+    # Deletes run against the dependency order, so movies are gone before their directors are looked at
+    for entity in reversed(CATALOG_ENTITIES):
+        if entity in seen_keys:
+            counts[entity]["deleted"] = delete_absent_rows(entity, seen_keys[entity], batch_size)
+
+    return counts
+
+
+def sync_catalog(paths, batch_size=DEFAULT_BATCH_SIZE):
+    """Like import_catalog(), for catalog files that hold the full current catalog."""
+    return sync_catalog_rows({entity: read_catalog_rows(path) for entity, path in paths.items()}, batch_size)
+
+
+def sync_database(actors_list, movies_list, directors_list, movie_rating_list, batch_size=DEFAULT_BATCH_SIZE):
+    """Upsert counterpart of populate_database(), taking the same lists."""
+    return sync_catalog_rows({
+        "actors": actors_list,
+        "directors": [{"name": director_name} for director_name in directors_list],
+        "movies": movies_list,
+        "cast": [dict(actor, movie_id=movie["movie_id"]) for movie in movies_list for actor in movie["actors"]],
+        "ratings": movie_rating_list,
+    }, batch_size)
@@ -0,0 +1,11 @@
+class InvalidMovieException(Exception):
+    pass
+
+class InvalidRatingException(Exception):
+    pass
+
+class InvalidYearRangeException(Exception):
+    pass
+
+class InvalidSearchQueryException(Exception):
+    pass
@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from movies.assignment_2_utils import DEFAULT_BATCH_SIZE
+from movies.catalog_import import CATALOG_ENTITIES, CatalogImportError, import_catalog, reset_catalog_checkpoints
+from movies.catalog_sync import sync_catalog
+
+
+class Command(BaseCommand):
+    help = "Streams actors, directors, movies, cast and ratings from JSON Lines (.jsonl) or CSV (.csv) files " \
+           "into the database in chunks, resuming after the last committed chunk of an interrupted run"
+
+    def add_arguments(self, parser):
+        for entity in CATALOG_ENTITIES:
+            parser.add_argument("--{}".format(entity), metavar="PATH", help="{} file".format(entity))
+        parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                            help="rows per insert and transaction")
+        parser.add_argument("--checkpoint", default="catalog",
+                            help="name under which progress is recorded per file; reuse it to resume an import "
+                                 "of the same, unchanged files")
+        parser.add_argument("--restart", action="store_true",
+                            help="forget the progress recorded under --checkpoint and import from the start")
+        parser.add_argument("--sync", action="store_true",
+                            help="treat the files as the full catalog: create, update and delete only the rows "
+                                 "that differ; safe to rerun, so no checkpoint is kept")
+
+    def handle(self, *args, **options):
+        paths = {entity: options[entity] for entity in CATALOG_ENTITIES if options[entity]}
+        if not paths:
+            raise CommandError("Pass at least one of {}".format(
+                ", ".join("--{}".format(entity) for entity in CATALOG_ENTITIES)))
+
+        if options["sync"]:
+            self.sync(paths, options["batch_size"])
+            return
+
+        if options["restart"]:
+            reset_catalog_checkpoints(options["checkpoint"])
+
+        try:
+            rows_imported = import_catalog(paths, options["batch_size"], options["checkpoint"])
+        except CatalogImportError as error:
+            raise CommandError(error)
+
+        for entity, count in rows_imported.items():
+            self.stdout.write(self.style.SUCCESS("Imported {} {} rows".format(count, entity)))
+
+    def sync(self, paths, batch_size):
+        try:
+            counts = sync_catalog(paths, batch_size)
+        except CatalogImportError as error:
+            raise CommandError(error)
+
+        for entity, entity_counts in counts.items():
+            self.stdout.write(self.style.SUCCESS("Synced {}: {created} created, {updated} updated, {deleted} deleted"
+                                                 .format(entity, **entity_counts)))
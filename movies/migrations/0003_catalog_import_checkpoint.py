@@ -0,0 +1,21 @@
+# Generated by Django 3.0.14 on 2026-10-18 10:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0002_actor_gender'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogImportCheckpoint',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=200, unique=True)),
+                ('rows_imported', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 3.0.14 on 2026-10-18 11:00
+
+from django.db import migrations, models
+from django.db.models import F, FloatField
+from django.db.models.functions import Cast, Coalesce, NullIf
+
+
+def populate_rating_aggregates(apps, schema_editor):
+    Rating = apps.get_model('movies', 'Rating')
+
+    total_ratings = F('rating_one_count') + F('rating_two_count') + F('rating_three_count') + \
+        F('rating_four_count') + F('rating_five_count')
+    sum_of_ratings = F('rating_one_count') + F('rating_two_count') * 2 + F('rating_three_count') * 3 + \
+        F('rating_four_count') * 4 + F('rating_five_count') * 5
+    Rating.objects.update(total_ratings=total_ratings,
+                          average_rating=Coalesce(Cast(sum_of_ratings, FloatField()) / NullIf(total_ratings, 0), 0.0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0003_catalog_import_checkpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rating',
+            name='average_rating',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='rating',
+            name='total_ratings',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(populate_rating_aggregates, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='rating',
+            index=models.Index(fields=['average_rating', 'movie'], name='rating_average_rating_idx'),
+        ),
+    ]
@@ -0,0 +1,81 @@
+# Generated by Django 3.0.14 on 2026-10-18 11:19
+
+from django.db import migrations, models
+
+SEARCH_INDEX_TABLE = 'movies_catalog_search'
+ENTRY_TABLE = 'movies_catalogsearchentry'
+# kind: (table, key column)
+SOURCE_TABLES = {
+    'movie': ('movies_movie', 'movie_id'),
+    'actor': ('movies_actor', 'actor_id'),
+    'director': ('movies_director', 'id'),
+}
+
+
+def get_entry_trigger_sql():
+    # External content FTS5 tables are told about changed rows with the old values, see "External Content
+    # Tables" in the FTS5 documentation
+    insert_sql = "INSERT INTO {0}(rowid, name) VALUES (new.id, new.name);".format(SEARCH_INDEX_TABLE)
+    delete_sql = "INSERT INTO {0}({0}, rowid, name) VALUES ('delete', old.id, old.name);".format(SEARCH_INDEX_TABLE)
+    return [
+        "CREATE TRIGGER {0}_insert AFTER INSERT ON {0} BEGIN {1} END".format(ENTRY_TABLE, insert_sql),
+        "CREATE TRIGGER {0}_delete AFTER DELETE ON {0} BEGIN {1} END".format(ENTRY_TABLE, delete_sql),
+        "CREATE TRIGGER {0}_update AFTER UPDATE ON {0} BEGIN {1} {2} END".format(ENTRY_TABLE, delete_sql, insert_sql),
+    ]
+
+
+def get_source_trigger_sql(kind, table, key_column):
+    statements = [
+        "CREATE TRIGGER {table}_search_insert AFTER INSERT ON {table} BEGIN "
+        "INSERT INTO {entries}(kind, key, name) VALUES ('{kind}', new.{key}, new.name); END",
+        "CREATE TRIGGER {table}_search_update AFTER UPDATE OF {key}, name ON {table} BEGIN "
+        "UPDATE {entries} SET key = new.{key}, name = new.name WHERE kind = '{kind}' AND key = old.{key}; END",
+        "CREATE TRIGGER {table}_search_delete AFTER DELETE ON {table} BEGIN "
+        "DELETE FROM {entries} WHERE kind = '{kind}' AND key = old.{key}; END",
+    ]
+    return [sql.format(table=table, entries=ENTRY_TABLE, kind=kind, key=key_column) for sql in statements]
+
+
+def get_create_search_index_sql():
+    statements = ["CREATE VIRTUAL TABLE {} USING fts5(name, content='{}', content_rowid='id', tokenize='trigram')"
+                  .format(SEARCH_INDEX_TABLE, ENTRY_TABLE)]
+    statements += get_entry_trigger_sql()
+    for kind, (table, key_column) in SOURCE_TABLES.items():
+        statements.append("INSERT INTO {}(kind, key, name) SELECT '{}', {}, name FROM {}"
+                          .format(ENTRY_TABLE, kind, key_column, table))
+        statements += get_source_trigger_sql(kind, table, key_column)
+    return statements
+
+
+def get_drop_search_index_sql():
+    statements = []
+    for table, _ in SOURCE_TABLES.values():
+        statements += ["DROP TRIGGER {}_search_{}".format(table, operation)
+                       for operation in ("insert", "update", "delete")]
+    statements += ["DROP TRIGGER {}_{}".format(ENTRY_TABLE, operation) for operation in ("insert", "update", "delete")]
+    statements.append("DROP TABLE {}".format(SEARCH_INDEX_TABLE))
+    return statements
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0005_movie_release_date_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogSearchEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=20)),
+                ('key', models.CharField(max_length=100)),
+                ('name', models.CharField(max_length=100)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='catalogsearchentry',
+            constraint=models.UniqueConstraint(fields=('kind', 'key'), name='unique_catalog_search_entry'),
+        ),
+        migrations.RunSQL(get_create_search_index_sql(), get_drop_search_index_sql()),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.0.14 on 2026-10-18 12:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0006_catalog_search'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cast',
+            index=models.Index(condition=models.Q(is_debut_movie=True), fields=['movie', 'actor'],
+                               name='cast_debut_movie_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.0.14 on 2026-10-18 13:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0007_cast_debut_movie_index'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='cast',
+            constraint=models.UniqueConstraint(fields=('movie', 'actor', 'role'), name='unique_cast_role'),
+        ),
+    ]
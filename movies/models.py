@@ -10,6 +10,7 @@ class Actor(models.Model):
     name = models.CharField(max_length=100)
     gender = models.CharField(max_length=50, null=True)
 
+
 class Movie(models.Model):
     movie_id = models.CharField(max_length=100, primary_key=True)
     name = models.CharField(max_length=100)
@@ -18,6 +19,11 @@ class Movie(models.Model):
     director = models.ForeignKey(Director, on_delete=models.CASCADE)
     actors = models.ManyToManyField(Actor, through="Cast")
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["release_date"], name="movie_release_date_idx"),
+        ]
+
 
 class Cast(models.Model):
     actor = models.ForeignKey(Actor, on_delete=models.CASCADE)
@@ -25,6 +31,26 @@ class Cast(models.Model):
     role = models.CharField(max_length=50)
     is_debut_movie = models.BooleanField(default=False)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["movie", "actor", "role"], name="unique_cast_role"),
+        ]
+        indexes = [
+            models.Index(fields=["movie", "actor"], condition=models.Q(is_debut_movie=True),
+                         name="cast_debut_movie_idx"),
+        ]
+
+
+def get_rating_aggregates(rating_one_count, rating_two_count, rating_three_count, rating_four_count,
+                          rating_five_count):
+    """(total_ratings, average_rating) of the given star counts; a movie nobody rated averages 0."""
+    total_ratings = rating_one_count + rating_two_count + rating_three_count + rating_four_count + rating_five_count
+    if total_ratings == 0:
+        return 0, 0
+    sum_of_ratings = rating_one_count + rating_two_count * 2 + rating_three_count * 3 + rating_four_count * 4 + \
+        rating_five_count * 5
+    return total_ratings, sum_of_ratings / total_ratings
+
 
 class Rating(models.Model):
     movie = models.OneToOneField(Movie, on_delete=models.CASCADE)
@@ -33,4 +59,41 @@ class Rating(models.Model):
     rating_three_count = models.IntegerField(default=0)
     rating_four_count = models.IntegerField(default=0)
     rating_five_count = models.IntegerField(default=0)
+    # Derived from the counts above; save() refreshes them, bulk writes and queryset updates must set them too
+    total_ratings = models.IntegerField(default=0)
+    average_rating = models.FloatField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["average_rating", "movie"], name="rating_average_rating_idx"),
+        ]
+
+    def update_aggregates(self):
+        self.total_ratings, self.average_rating = get_rating_aggregates(
+            self.rating_one_count, self.rating_two_count, self.rating_three_count, self.rating_four_count,
+            self.rating_five_count)
+
+    def save(self, *args, **kwargs):
+        self.update_aggregates()
+        if kwargs.get("update_fields") is not None:
+            kwargs["update_fields"] = set(kwargs["update_fields"]) | {"total_ratings", "average_rating"}
+        super().save(*args, **kwargs)
+
+
+class CatalogImportCheckpoint(models.Model):
+    # Rows of one catalog file committed so far by `manage.py import_catalog`
+    source = models.CharField(max_length=200, unique=True)
+    rows_imported = models.PositiveIntegerField(default=0)
+
+
+class CatalogSearchEntry(models.Model):
+    # One row per movie, actor and director name, kept in step with those tables by the triggers of migration
+    # 0006_catalog_search, which also index `name` in the movies_catalog_search FTS5 table; never written directly
+    kind = models.CharField(max_length=20)
+    key = models.CharField(max_length=100)
+    name = models.CharField(max_length=100)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["kind", "key"], name="unique_catalog_search_entry"),
+        ]
@@ -0,0 +1,84 @@
+from collections import defaultdict
+from itertools import islice
+
+from django.db import connection, transaction
+
+from .exceptions import InvalidMovieException, InvalidRatingException
+from .models import Movie, Rating
+
+VOTE_BATCH_SIZE = 10000
+STAR_COUNT_FIELDS = ("rating_one_count", "rating_two_count", "rating_three_count", "rating_four_count",
+                     "rating_five_count")
+
+
+def get_rating_increment_sql():
+    """
+    One UPDATE that adds a movie's coalesced votes to its counters in place and recomputes total_ratings and
+    average_rating from the new counts, so concurrent writers never overwrite each other's votes.
+    """
+    increments = ", ".join("{0} = {0} + %s".format(field_name) for field_name in STAR_COUNT_FIELDS)
+    sum_of_ratings = " + ".join("({} + %s) * {}".format(field_name, stars)
+                                for stars, field_name in enumerate(STAR_COUNT_FIELDS, start=1))
+    return "UPDATE {} SET {}, total_ratings = total_ratings + %s, " \
+           "average_rating = COALESCE(CAST({} AS REAL) / NULLIF(total_ratings + %s, 0), 0) " \
+           "WHERE movie_id = %s".format(connection.ops.quote_name(Rating._meta.db_table), increments, sum_of_ratings)
+
+
+def coalesce_votes(votes):
+    """Star counts per movie, {movie_id: [one, two, three, four, five]}."""
+    star_counts = defaultdict(lambda: [0] * len(STAR_COUNT_FIELDS))
+    for movie_id, stars in votes:
+        if stars not in (1, 2, 3, 4, 5):
+            raise InvalidRatingException
+        star_counts[movie_id][stars - 1] += 1
+    return star_counts
+
+
+def create_missing_ratings(movie_ids):
+    """
+    Creates empty Rating rows for those of `movie_ids` without one and returns their ids; raises if any of them
+    is not a movie.
+    """
+    movie_ids_with_rating = set(Rating.objects.filter(movie_id__in=movie_ids).values_list('movie_id', flat=True))
+    missing_movie_ids = [movie_id for movie_id in movie_ids if movie_id not in movie_ids_with_rating]
+    if Movie.objects.filter(movie_id__in=missing_movie_ids).count() != len(missing_movie_ids):
+        raise InvalidMovieException
+
+    # ignore_conflicts lets a concurrent batch create the same missing row first
+    Rating.objects.bulk_create([Rating(movie_id=movie_id) for movie_id in missing_movie_ids], ignore_conflicts=True)
+    return set(missing_movie_ids)
+
+
+def apply_votes(star_counts):
+    rows = []
+    # In key order, consecutive updates mostly land on pages the previous ones already brought in
+    for movie_id in sorted(star_counts):
+        counts = star_counts[movie_id]
+        total_votes = sum(counts)
+        rows.append((*counts, total_votes, *counts, total_votes, movie_id))
+
+    increment_sql = get_rating_increment_sql()
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.executemany(increment_sql, rows)
+        # Every movie normally has its Rating row already, so the batch is done in one statement; otherwise the
+        # movies that updated nothing are checked, given a row and updated again
+        if cursor.rowcount != len(rows):
+            created_movie_ids = create_missing_ratings([row[-1] for row in rows])
+            cursor.executemany(increment_sql, [row for row in rows if row[-1] in created_movie_ids])
+
+
+def record_ratings(votes, batch_size=VOTE_BATCH_SIZE):
+    """
+    Records (movie_id, stars) votes, stars being 1 to 5. The votes are read in batches of `batch_size`,
+    coalesced per movie and applied with one in-place increment per movie, each batch in its own
+    transaction. A batch with an unknown movie or an invalid star count is rejected as a whole. Returns the
+    number of votes recorded.
+    """
+    votes = iter(votes)
+    votes_recorded = 0
+    while True:
+        batch = list(islice(votes, batch_size))
+        if not batch:
+            return votes_recorded
+        apply_votes(coalesce_votes(batch))
+        votes_recorded += len(batch)
@@ -0,0 +1,63 @@
+from datetime import date
+
+from django.db.models import BooleanField, Func, Q
+
+
+# Release dates are filtered as plain ranges of the column. __year__range and __month lookups compile to a
+# function call on release_date, which the index on it cannot serve.
+
+class Likely(Func):
+    """
+    SQLite's likely(): tells the planner that a condition holds for most rows. Without histogram statistics it
+    takes every range for a narrow one, and would otherwise drive a join from the release date index even for a
+    range that covers a large part of the catalog.
+    """
+    function = 'likely'
+    output_field = BooleanField()
+
+
+def get_release_date_bounds(from_year=None, to_year=None, prefix=""):
+    bounds = []
+    if from_year is not None:
+        bounds.append(Q(**{prefix + "release_date__gte": date(from_year, 1, 1)}))
+    if to_year is not None:
+        bounds.append(Q(**{prefix + "release_date__lt": date(to_year + 1, 1, 1)}))
+    return bounds
+
+
+def get_release_date_range_q(from_year=None, to_year=None, prefix=""):
+    """Release dates from the first day of `from_year` to the last day of `to_year`; either end may be open."""
+    release_date_q = Q()
+    for bound in get_release_date_bounds(from_year, to_year, prefix):
+        release_date_q &= bound
+    return release_date_q
+
+
+def get_wide_release_date_range_filters(from_year=None, to_year=None, prefix=""):
+    """
+    The bounds of get_release_date_range_q() as filter() arguments marked as likely, for a range that covers a
+    large part of the catalog, so the query is driven from its other filters.
+    """
+    return [Likely(bound) for bound in get_release_date_bounds(from_year, to_year, prefix)]
+
+
+def get_month_runs(months):
+    """Consecutive months grouped into (first, last) runs, [5, 6, 7, 12] -> [(5, 7), (12, 12)]."""
+    month_runs = []
+    for month in sorted(set(months)):
+        if month_runs and month_runs[-1][1] == month - 1:
+            month_runs[-1] = (month_runs[-1][0], month)
+        else:
+            month_runs.append((month, month))
+    return month_runs
+
+
+def get_release_months_q(from_year, to_year, months, prefix=""):
+    """Release dates in one of `months` of the years `from_year` to `to_year`, as one date range per year and run."""
+    release_months_q = Q(**{prefix + "pk__in": []})
+    for year in range(from_year, to_year + 1):
+        for first_month, last_month in get_month_runs(months):
+            starts_on = date(year, first_month, 1)
+            ends_before = date(year + 1, 1, 1) if last_month == 12 else date(year, last_month + 1, 1)
+            release_months_q |= Q(**{prefix + "release_date__gte": starts_on, prefix + "release_date__lt": ends_before})
+    return release_months_q
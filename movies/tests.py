@@ -1,3 +1,389 @@
-from django.test import TestCase
+import csv
+import os
+import shutil
+import tempfile
+import threading
+from io import StringIO
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import Prefetch
+from django.test import TestCase, TransactionTestCase
+
+from .assignment_2_utils import populate_database, populate_database_with_fixture_data, get_average_rating_of_movie, \
+    get_total_number_of_ratings, get_top_rated_movies, remove_all_actors_from_given_movie
+from .assignment_3_utils import get_movies_by_given_movie_objs, iter_movies_by_given_movie_objs, \
+    get_actor_names_debuted_in_21st_century, get_movie_names_with_actor_name_ending_with_smith
+from .assignment_4_utils import get_average_box_office_collections, get_movies_with_distinct_actors_count
+from . import assignment_5_utils
+from .assignment_5_utils import reset_ratings_for_movies_in_given_year, get_actor_filmography
+from .catalog_search import PREFIX, SUFFIX, search_catalog
+from .catalog_sync import sync_catalog_rows, sync_database
+from .exceptions import InvalidMovieException, InvalidRatingException, InvalidYearRangeException, \
+    InvalidSearchQueryException
+from .ratings import record_ratings
+from .release_dates import get_month_runs, get_release_months_q
+from .models import Actor, Cast, Director, Movie, Rating
+
+
+class PopulateDatabaseTests(TestCase):
+
+    def test_fixture_data_resolves_every_foreign_key(self):
+        populate_database_with_fixture_data()
+
+        self.assertEqual(dict(Movie.objects.values_list('movie_id', 'director__name')), {
+            "movie_1": "Director 1", "movie_2": "Director 2", "movie_3": "Director 1", "movie_4": "Director 3"})
+        self.assertEqual(Rating.objects.get(movie_id="movie_3").rating_one_count, 14)
+        self.assertEqual(sorted(Cast.objects.filter(movie_id="movie_4").values_list('actor_id', 'role')),
+                         [("actor_1", "villain"), ("actor_2", "heroine"), ("actor_4", "hero")])
+        self.assertEqual(list(Cast.objects.filter(is_debut_movie=True).order_by('actor_id')
+                              .values_list('actor_id', 'movie_id')),
+                         [("actor_1", "movie_4"), ("actor_2", "movie_1"), ("actor_3", "movie_3")])
+
+    def test_movies_can_be_given_as_a_generator(self):
+        movies_list = [{"movie_id": "movie_1", "name": "Movie 1", "box_office_collection_in_crores": 12.3,
+                        "release_date": "2020-03-03", "director_name": "Director 1",
+                        "actors": [{"actor_id": "actor_1", "role": "hero", "is_debut_movie": True}]}]
+
+        populate_database([{"actor_id": "actor_1", "name": "Actor 1", "gender": "MALE"}],
+                          (movie for movie in movies_list), ["Director 1"], [])
+
+        self.assertEqual(list(Movie.objects.values_list('movie_id', 'director__name')), [("movie_1", "Director 1")])
+        self.assertEqual(list(Cast.objects.values_list('actor_id', 'movie_id')), [("actor_1", "movie_1")])
+
+
+class RatingAggregatesTests(TestCase):
+
+    def setUp(self):
+        populate_database_with_fixture_data()
+
+    def test_loaded_ratings_store_aggregates(self):
+        movie_obj = Movie.objects.select_related('rating').get(movie_id="movie_1")
+
+        self.assertEqual(get_total_number_of_ratings(movie_obj), 25)
+        self.assertAlmostEqual(get_average_rating_of_movie(movie_obj), 78 / 25)
+        self.assertEqual([movie.movie_id for movie in get_top_rated_movies(2)], ["movie_2", "movie_1"])
+
+    def test_aggregates_follow_saves_and_resets(self):
+        rating_obj = Rating.objects.get(movie_id="movie_3")
+        rating_obj.rating_five_count = 100
+        rating_obj.save(update_fields=["rating_five_count"])
+        self.assertEqual([movie.movie_id for movie in get_top_rated_movies(1)], ["movie_3"])
+
+        reset_ratings_for_movies_in_given_year(2022)
+        rating_obj.refresh_from_db()
+        self.assertEqual((rating_obj.total_ratings, rating_obj.average_rating), (0, 0))
+
+
+class MovieDetailsTests(TestCase):
+
+    def setUp(self):
+        populate_database_with_fixture_data()
+        Rating.objects.filter(movie_id="movie_4").delete()
+
+    def test_details_take_a_fixed_number_of_queries(self):
+        with self.assertNumQueries(3):
+            movie_details_list = get_movies_by_given_movie_objs(Movie.objects.order_by('movie_id'))
+
+        self.assertEqual([movie_details["movie_id"] for movie_details in movie_details_list],
+                         ["movie_1", "movie_2", "movie_3", "movie_4"])
+        self.assertEqual(movie_details_list[3]["director_name"], "Director 3")
+        self.assertEqual(sorted(cast["actor"]["actor_id"] for cast in movie_details_list[3]["cast"]),
+                         ["actor_1", "actor_2", "actor_4"])
+        self.assertEqual((movie_details_list[0]["total_number_of_ratings"],
+                          movie_details_list[3]["total_number_of_ratings"]), (25, 0))
+
+    def test_iterator_yields_the_same_details_in_chunks(self):
+        movie_details_list = get_movies_by_given_movie_objs(Movie.objects.order_by('movie_id'))
+
+        movie_details_iterator = iter_movies_by_given_movie_objs(Movie.objects.all(), chunk_size=3)
+        with self.assertNumQueries(6):
+            self.assertEqual(list(movie_details_iterator), movie_details_list)
+
+        self.assertEqual(list(iter_movies_by_given_movie_objs(list(Movie.objects.all()), chunk_size=3)),
+                         movie_details_list)
+
+    def test_cast_prefetch_can_be_replaced(self):
+        movie_objs = Movie.objects.filter(movie_id="movie_4")
+        female_cast = Prefetch("cast_set", queryset=Cast.objects.filter(actor__gender="FEMALE"))
+
+        for movie_details_list in (get_movies_by_given_movie_objs(movie_objs, female_cast),
+                                   get_movies_by_given_movie_objs(list(movie_objs), female_cast),
+                                   list(iter_movies_by_given_movie_objs(movie_objs, cast_prefetch=female_cast))):
+            self.assertEqual([cast["actor"]["actor_id"] for cast in movie_details_list[0]["cast"]],
+                             list(Cast.objects.filter(movie_id="movie_4", actor__gender="FEMALE")
+                                  .values_list('actor_id', flat=True)))
+
+
+class ActorFilmographyTests(TestCase):
+
+    def setUp(self):
+        populate_database_with_fixture_data()
+
+    def test_filmography_lists_each_actor_once_in_a_fixed_number_of_queries(self):
+        with self.assertNumQueries(3):
+            actor_details_list = get_actor_filmography(from_year=2019, to_year=2020)
+
+        self.assertEqual([(actor_details["actor_id"], [movie["movie_id"] for movie in actor_details["movies"]])
+                          for actor_details in actor_details_list],
+                         [("actor_1", ["movie_4", "movie_2"]), ("actor_2", ["movie_4"]), ("actor_4", ["movie_4"])])
+        movie_details = actor_details_list[0]["movies"][0]
+        self.assertEqual((movie_details["director_name"], len(movie_details["cast"])), ("Director 3", 3))
+        self.assertEqual(movie_details["total_number_of_ratings"],
+                         Rating.objects.get(movie_id="movie_4").total_ratings)
+
+    def test_open_and_invalid_year_ranges(self):
+        self.assertEqual([actor_details["actor_id"] for actor_details in get_actor_filmography(from_year=2021)],
+                         ["actor_2", "actor_3"])
+        with self.assertRaises(InvalidYearRangeException):
+            get_actor_filmography(from_year=2021, to_year=2020)
+
+
+class ReleaseDateFilterTests(TestCase):
+
+    def setUp(self):
+        populate_database_with_fixture_data()
+
+    def test_months_of_years_become_date_ranges(self):
+        self.assertEqual(get_month_runs([12, 5, 7, 6, 1]), [(1, 1), (5, 7), (12, 12)])
+
+        movie_objs = Movie.objects.filter(get_release_months_q(2018, 2021, [12, 1, 2, 3])).order_by('movie_id')
+        self.assertNotIn("django_date_extract", str(movie_objs.query))
+        self.assertEqual([movie_obj.movie_id for movie_obj in movie_objs], ["movie_1", "movie_2", "movie_4"])
+        self.assertFalse(Movie.objects.filter(get_release_months_q(2018, 2022, [])).exists())
+
+    def test_debut_is_matched_against_the_debut_movie(self):
+        Movie.objects.filter(movie_id="movie_3").update(release_date="1999-03-03")
+
+        self.assertEqual(sorted(get_actor_names_debuted_in_21st_century()), ["Actor 1", "Actor 2"])
+
+
+class CatalogSearchTests(TestCase):
+
+    def setUp(self):
+        populate_database_with_fixture_data()
+        Actor.objects.filter(actor_id="actor_1").update(name="John Smith")
+        Actor.objects.create(actor_id="actor_5", name="Smithers")
+        Movie.objects.filter(movie_id="movie_3").update(name="The Big Smith")
+
+    def search(self, query, **kwargs):
+        return [(match["kind"], match["key"]) for match in search_catalog(query, **kwargs)]
+
+    def test_prefix_suffix_and_substring_matches(self):
+        self.assertEqual(self.search("smith"), [("actor", "actor_1"), ("movie", "movie_3"), ("actor", "actor_5")])
+        self.assertEqual(self.search("SMI", mode=PREFIX), [("actor", "actor_5")])
+        self.assertEqual(self.search("smith", mode=SUFFIX, kinds=["actor"]), [("actor", "actor_1")])
+        self.assertEqual(self.search("ctor", limit=2), [("actor", "actor_2"), ("actor", "actor_3")])
+        with self.assertRaises(InvalidSearchQueryException):
+            search_catalog("sm")
+
+    def test_index_follows_writes(self):
+        Actor.objects.filter(actor_id="actor_5").delete()
+        Director.objects.filter(name="Director 3").update(name="Smith Jr")
+
+        self.assertEqual(self.search("smith"), [("actor", "actor_1"), ("director", "3"), ("movie", "movie_3")])
+        self.assertEqual(sorted(get_movie_names_with_actor_name_ending_with_smith()), ["Movie 2", "Movie 4"])
+
+
+class CatalogAnalyticsCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        populate_database_with_fixture_data()
+
+    def get_actors_count_by_movie(self):
+        return {movie_obj.movie_id: movie_obj.actors_count for movie_obj in get_movies_with_distinct_actors_count()}
+
+    def test_analytics_are_computed_once_per_catalog_generation(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(get_average_box_office_collections(), 40.8)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_average_box_office_collections(), 40.8)
+            self.assertEqual(get_average_box_office_collections(), 40.8)
+
+    def test_catalog_writes_invalidate_cached_analytics(self):
+        self.assertEqual(self.get_actors_count_by_movie()["movie_4"], 3)
+
+        remove_all_actors_from_given_movie(Movie.objects.get(movie_id="movie_4"))
+
+        with self.assertNumQueries(1):
+            self.assertEqual(self.get_actors_count_by_movie()["movie_4"], 0)
+
+    def test_removing_all_actors_of_a_movie_invalidates_cached_analytics(self):
+        self.assertEqual(self.get_actors_count_by_movie()["movie_2"], 1)
+
+        assignment_5_utils.remove_all_actors_from_given_movie(Movie.objects.get(movie_id="movie_2"))
+
+        self.assertFalse(Cast.objects.filter(movie__movie_id="movie_2").exists())
+        with self.assertNumQueries(1):
+            self.assertEqual(self.get_actors_count_by_movie()["movie_2"], 0)
+
+
+class ImportCatalogTests(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        Director.objects.create(name="Director 1")
+
+    def write_movies_csv(self, director_names, file_name="movies.csv", first_index=0):
+        path = os.path.join(self.directory.name, file_name)
+        with open(path, "w", newline="") as movies_file:
+            writer = csv.writer(movies_file)
+            writer.writerow(["movie_id", "name", "release_date", "box_office_collection_in_crores", "director_name"])
+            for index, director_name in enumerate(director_names, start=first_index):
+                writer.writerow(["movie_{}".format(index), "Movie {}".format(index), "2020-1-1", "1.5", director_name])
+        return path
+
+    def import_movies(self, path):
+        call_command('import_catalog', movies=path, batch_size=2, stdout=StringIO())
+
+    def test_interrupted_import_resumes_after_last_committed_chunk(self):
+        path = self.write_movies_csv(["Director 1"] * 3 + ["Director 2"] + ["Director 1"])
+        with self.assertRaises(CommandError):
+            self.import_movies(path)
+        self.assertEqual(Movie.objects.count(), 2)
+
+        Director.objects.create(name="Director 2")
+        self.import_movies(path)
+        self.assertEqual(sorted(Movie.objects.values_list('movie_id', flat=True)),
+                         ["movie_{}".format(index) for index in range(5)])
+
+        self.import_movies(path)
+        self.assertEqual(Movie.objects.count(), 5)
+
+    def test_copied_file_resumes_and_reimported_rows_are_skipped(self):
+        path = self.write_movies_csv(["Director 1"] * 3 + ["Director 2"] + ["Director 1"])
+        with self.assertRaises(CommandError):
+            self.import_movies(path)
+        Director.objects.create(name="Director 2")
+        copied_path = os.path.join(self.directory.name, "copied.csv")
+        shutil.copy(path, copied_path)
+
+        self.import_movies(copied_path)
+        self.assertEqual(Movie.objects.count(), 5)
+
+        call_command('import_catalog', movies=copied_path, batch_size=2, restart=True, stdout=StringIO())
+        self.assertEqual(Movie.objects.count(), 5)
+
+    def test_checkpoint_of_one_file_does_not_skip_rows_of_another(self):
+        self.import_movies(self.write_movies_csv(["Director 1"] * 3, "first.csv"))
+        self.import_movies(self.write_movies_csv(["Director 1"] * 4, "second.csv", first_index=3))
+
+        self.assertEqual(sorted(Movie.objects.values_list('movie_id', flat=True)),
+                         ["movie_{}".format(index) for index in range(7)])
+
+
+class SyncDatabaseTests(TestCase):
+
+    def setUp(self):
+        populate_database_with_fixture_data()
+        self.actors_list = [{"actor_id": "actor_1", "name": "Actor One", "gender": "FEMALE"},
+                            {"actor_id": "actor_2", "name": "Actor 2", "gender": "MALE"}]
+        self.movies_list = [{"movie_id": "movie_1", "name": "Movie 1", "box_office_collection_in_crores": "21.3",
+                             "release_date": "2018-3-3", "director_name": "Director 1",
+                             "actors": [{"actor_id": "actor_2", "role": "hero", "is_debut_movie": True},
+                                        {"actor_id": "actor_1", "role": "villain", "is_debut_movie": False}]}]
+        self.ratings_list = [{"movie_id": "movie_1", "rating_one_count": 3, "rating_two_count": 4,
+                              "rating_three_count": 7, "rating_four_count": 9, "rating_five_count": 20}]
+
+    def sync(self):
+        return sync_database(self.actors_list, self.movies_list, ["Director 1"], self.ratings_list)
+
+    def test_only_differences_are_written(self):
+        counts = self.sync()
+
+        self.assertEqual(counts["actors"], {"created": 0, "updated": 1, "deleted": 2})
+        self.assertEqual(counts["movies"], {"created": 0, "updated": 0, "deleted": 3})
+        self.assertEqual(counts["cast"], {"created": 1, "updated": 0, "deleted": 6})
+        self.assertEqual(counts["ratings"], {"created": 0, "updated": 1, "deleted": 3})
+        self.assertEqual(Actor.objects.get(actor_id="actor_1").name, "Actor One")
+        self.assertEqual(sorted(Cast.objects.values_list('actor_id', 'role')), [("actor_1", "villain"),
+                                                                                ("actor_2", "hero")])
+        self.assertEqual(list(Director.objects.values_list('name', flat=True)), ["Director 1"])
+        self.assertEqual(Rating.objects.get(movie_id="movie_1").rating_five_count, 20)
+
+    def test_rerunning_the_same_catalog_changes_nothing(self):
+        self.sync()
+
+        # one read per entity and chunk, the director lookup of the movies, the movies with a cast, and one key
+        # scan per entity
+        with self.assertNumQueries(11):
+            counts = self.sync()
+        self.assertTrue(all(entity_counts == {"created": 0, "updated": 0, "deleted": 0}
+                            for entity_counts in counts.values()))
+
+
+    def test_cast_is_reconciled_one_chunk_of_movies_at_a_time(self):
+        cast_list = [{"movie_id": "movie_2", "actor_id": "actor_1", "role": "hero", "is_debut_movie": False},
+                     {"movie_id": "movie_1", "actor_id": "actor_2", "role": "hero", "is_debut_movie": True},
+                     {"movie_id": "movie_2", "actor_id": "actor_2", "role": "villain", "is_debut_movie": False}]
+
+        # The catalog lists the cast of movie_2 in two places, on both sides of movie_1
+        sync_catalog_rows({"cast": cast_list}, batch_size=1)
+
+        self.assertEqual(sorted(Cast.objects.values_list('movie_id', 'actor_id', 'role')),
+                         [("movie_1", "actor_2", "hero"), ("movie_2", "actor_1", "hero"),
+                          ("movie_2", "actor_2", "villain")])
+        self.assertEqual(sync_catalog_rows({"cast": cast_list}, batch_size=2)["cast"],
+                         {"created": 0, "updated": 0, "deleted": 0})
+
+
+class RecordRatingsTests(TestCase):
+
+    def setUp(self):
+        populate_database_with_fixture_data()
+        Rating.objects.filter(movie_id="movie_4").delete()
+
+    def test_votes_are_added_to_counts_and_aggregates(self):
+        self.assertEqual(record_ratings([("movie_1", 5), ("movie_4", 1), ("movie_1", 5), ("movie_4", 3)],
+                                        batch_size=3), 4)
+
+        rating_obj = Rating.objects.get(movie_id="movie_1")
+        self.assertEqual((rating_obj.rating_five_count, rating_obj.total_ratings), (4, 27))
+        self.assertAlmostEqual(rating_obj.average_rating, 88 / 27)
+        created_rating_obj = Rating.objects.get(movie_id="movie_4")
+        self.assertEqual((created_rating_obj.rating_one_count, created_rating_obj.rating_three_count,
+                          created_rating_obj.total_ratings, created_rating_obj.average_rating), (1, 1, 2, 2))
+
+    def test_invalid_votes_reject_their_batch(self):
+        with self.assertRaises(InvalidRatingException):
+            record_ratings([("movie_1", 5), ("movie_1", 6)])
+        with self.assertRaises(InvalidMovieException):
+            record_ratings([("movie_1", 5), ("movie_404", 4)])
+
+        self.assertEqual(Rating.objects.get(movie_id="movie_1").rating_five_count, 2)
+
+
+class ConcurrentRecordRatingsTests(TransactionTestCase):
+    number_of_threads = 8
+    votes_per_thread = 500
+
+    def test_concurrent_writers_lose_no_votes(self):
+        populate_database_with_fixture_data()
+        Rating.objects.filter(movie_id="movie_4").delete()
+        votes = [("movie_{}".format(index % 4 + 1), index % 5 + 1) for index in range(self.votes_per_thread)]
+        errors = []
+        barrier = threading.Barrier(self.number_of_threads)
+
+        def record():
+            try:
+                barrier.wait()
+                record_ratings(votes, batch_size=50)
+            except Exception as exception:
+                errors.append(exception)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=record) for _ in range(self.number_of_threads)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(Rating.objects.get(movie_id="movie_4").total_ratings,
+                         self.number_of_threads * self.votes_per_thread // 4)
+        self.assertEqual(Rating.objects.get(movie_id="movie_1").total_ratings,
+                         25 + self.number_of_threads * self.votes_per_thread // 4)